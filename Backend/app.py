@@ -1,5 +1,7 @@
-from flask import Flask, request, current_app, render_template, jsonify
-from sqlalchemy import extract, func
+from flask import Flask, Response, request, current_app, render_template, jsonify, stream_with_context
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_restful import Api, Resource, reqparse
@@ -7,121 +9,143 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
 from dotenv import load_dotenv
 from config import Config
-from auth import bcrypt, check_password, hash_password
-from models import db,Client, Admin, Expense, Subscription, Payment
+import database
+from auth import HashingBusy, check_password, hash_password, hasher, needs_rehash
+from models import db,Client, Admin, Expense, Subscription, Payment, JobRun, SchedulerLock
 from datetime import datetime, timedelta
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import os
-from flask_apscheduler import APScheduler
-from mpesa import lipa_na_mpesa
-import secrets
-import string
+import click
+import signal
+from mpesa import breaker as mpesa_breaker
+from mailer import mailer
+from blocklist import blocklist
+from cache import response_cache
+from metrics import metrics
+from budgets import query_budget, query_budgets
+from scheduling import job_scheduler
+from replicas import replica, replica_reads, replica_session
+from principals import admin_required, client_required, current_principal, identity_claims, principal_cache
+from stk import stk_push
+from callbacks import InvalidCallback, callback_processor
+from periods import check_period, in_period
+import ledger
+import rollups
+import serializers
+from serializers import JSONProvider, UnknownField, output_json
+from exports import FORMATS as EXPORT_FORMATS, InvalidExport, build_export, stream_export
+from onboarding import ClientImport, InvalidImport, generate_password, read_rows, send_welcome_email
+from search import include_object as search_include_object, search_clients
+from pagination import InvalidCursor, clamp_limit, decode_cursor, encode_cursor, keyset_after
 
 
 load_dotenv()
-blacklist = set()
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.json = JSONProvider(app)
 
 db.init_app(app)
-migrate = Migrate(app, db)  
+database.init_app(app)
+replica.init_app(app, db)
+metrics.init_app(app, db)
+query_budgets.init_app(app)
+migrate = Migrate(app, db, include_object=search_include_object)  
 api = Api(app)
+api.representations["application/json"] = output_json
 jwt = JWTManager(app)
+hasher.init_app(app)
+mailer.init_app(app)
+blocklist.init_app(app)
+response_cache.init_app(app)
+principal_cache.init_app(app)
+stk_push.init_app(app)
+callback_processor.init_app(app)
 
 CORS(app, 
      origins="http://localhost:3000",
      supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
+     expose_headers=["X-Next-Cursor", "Retry-After"],
      methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    return jti in blacklist
+    return blocklist.is_revoked(jwt_payload["jti"], jwt_payload["exp"])
 
 def send_email(to_email, subject, message):
     """
-    Simple plaintext email sender (Gmail SMTP).
+    Queue a plaintext email for the background mail dispatcher.
     Expects MAIL_USERNAME and MAIL_PASSWORD in env.
     """
-    sender_email = os.environ.get("MAIL_USERNAME")
-    sender_password = os.environ.get("MAIL_PASSWORD")
-    if not sender_email or not sender_password:
-        current_app.logger.warning("Email creds missing; skipping email send.")
-        return False
+    return mailer.enqueue(to_email, subject, message)
 
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
+# Jobs only run in the process started with `flask --app app run-scheduler`
+job_scheduler.init_app(app)
 
-    msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(message, "plain"))
+EXPIRY_NOTICE_CHUNK = 500
 
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, to_email, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Email failed: {e}")
-        return False
-
-def generate_password(length=10):
-    chars = string.ascii_letters + string.digits + "!@#$%^&*"
-    return ''.join(secrets.choice(chars) for _ in range(length))
-
-class ConfigWithScheduler(Config):
-    SCHEDULER_API_ENABLED = True
-
-app.config.from_object(ConfigWithScheduler)
-scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
-
-@scheduler.task('cron', id='check_expired_subscriptions', hour=0)  # Runs daily at midnight
+def mark_expiry_notified(client_id, expiry):
+    """Mailer delivery callback: record the notice only once the server has taken it."""
+    def on_sent():
+        with app.app_context():
+            Client.query.filter_by(id=client_id).update({"expiry_notified_for": expiry})
+            db.session.commit()
+    return on_sent
+
+@job_scheduler.task('cron', id='check_expired_subscriptions', hour=0)  # Runs daily at midnight
 def check_expired_subscriptions():
+    # Unsent notices (SMTP gave up, process exited with mail queued) stay unmarked for the next run
     with app.app_context():
         today = datetime.utcnow().date()
-        expired_clients = Client.query.filter(Client.subscription_expiry <= today).all()
-
-        for client in expired_clients:
-            send_email(
-                client.email,
-                "Subscription Expired",
-                f"Hi {client.first_name}, your subscription has expired. Please renew to continue accessing the gym."
+        last_id = 0
+
+        # Walk expired, not-yet-notified clients in id order, one chunk at a time
+        while True:
+            rows = (
+                db.session.query(Client.id, Client.email, Client.first_name, Client.subscription_expiry)
+                .filter(
+                    Client.id > last_id,
+                    Client.subscription_expiry <= today,
+                    db.or_(
+                        Client.expiry_notified_for.is_(None),
+                        Client.expiry_notified_for != Client.subscription_expiry
+                    )
+                )
+                .order_by(Client.id)
+                .limit(EXPIRY_NOTICE_CHUNK)
+                .all()
             )
+            if not rows:
+                break
 
-@scheduler.task('cron', id='send_monthly_report', day=1, hour=6)  # every 1st of the month at 6 AM
-def send_monthly_report():
+            # Release the read transaction so delivery callbacks can write meanwhile
+            db.session.commit()
+            for row in rows:
+                # Block for queue room so the mailer workers set the pace
+                mailer.enqueue(
+                    row.email,
+                    "Subscription Expired",
+                    f"Hi {row.first_name}, your subscription has expired. Please renew to continue accessing the gym.",
+                    block=True,
+                    on_sent=mark_expiry_notified(row.id, row.subscription_expiry)
+                )
+            last_id = rows[-1].id
+
+@job_scheduler.task('interval', id='apply_mpesa_callbacks', minutes=1)
+def apply_mpesa_callbacks():
+    # Safety net for callbacks stored before a restart or missed by the worker thread
     with app.app_context():
+        callback_processor.drain()
+
+@job_scheduler.task('cron', id='send_monthly_report', day=1, hour=6)  # every 1st of the month at 6 AM
+def send_monthly_report():
+    with app.app_context(), replica_session(), query_budgets.guard("send_monthly_report", 3):
         now = datetime.utcnow()
         month = now.month
         year = now.year
 
-        # Total expenses for the current month
-        monthly_expenses = db.session.query(
-            db.func.sum(Expense.cost)
-        ).filter(
-            extract('month', Expense.created_at) == month,
-            extract('year', Expense.created_at) == year
-        ).scalar() or 0
-
-        # Total earnings from subscriptions renewed or bought this month
-        clients = Client.query.filter(
-            extract('month', Client.subscription_expiry) == month,
-            extract('year', Client.subscription_expiry) == year
-        ).all()
-
-        total_earnings = 0
-        for client in clients:
-            if client.subscription:
-                total_earnings += client.subscription.price
+        # Expenses and successful payments for the current month, from the rollups
+        totals = rollups.month_totals(year, month)
+        monthly_expenses = totals.get((rollups.EXPENSES, ""), 0)
+        total_earnings = totals.get((rollups.EARNINGS, ""), 0)
 
         # Email all admins
         admins = Admin.query.all()
@@ -143,12 +167,14 @@ FitFlow Gym Management System                """
             )
 
 class ClientResource(Resource):
+    @admin_required()
     def patch(self, client_id):
         client = Client.query.get(client_id)
         if not client:
             return {"message": "Client not found"}, 404
 
         data = request.get_json()
+        old_email = client.email
 
         client.first_name = data.get("first_name", client.first_name)
         client.last_name = data.get("last_name", client.last_name)
@@ -160,21 +186,28 @@ class ClientResource(Resource):
         new_password = data.get("new_password")
 
         if old_password and new_password:
-            if not check_password(client.password_hash, old_password):
+            if not check_password(old_password, client.password_hash):
                 return {"message": "Incorrect password! Failed to update."}, 400
 
             client.password_hash = hash_password(new_password)
 
         db.session.commit()
+        # After the commit, so a request in between cannot re-cache the old row
+        principal_cache.invalidate("client", old_email)
+        response_cache.invalidate("clients")
         return {"message": "Client updated successfully", "client": client.to_dict()}, 200
 
+    @admin_required()
     def delete(self, client_id):
         client = Client.query.get(client_id)
         if not client:
             return {"message": "Client not found"}, 404
         
+        email = client.email
         db.session.delete(client)
         db.session.commit()
+        principal_cache.invalidate("client", email)
+        response_cache.invalidate("clients")
         return {"message": "Client deleted successfully"}, 200
 
 
@@ -186,8 +219,14 @@ class ClientLogin(Resource):
 
         user = Client.query.filter_by(email = email).first()
         if user and check_password(password, user.password_hash):
+            # Upgrade hashes made with an older cost factor while we have the plaintext
+            if needs_rehash(user.password_hash):
+                user.password_hash = hash_password(password)
+                db.session.commit()
+
             token = create_access_token(
                 identity=user.email,
+                additional_claims=identity_claims("client", user),
                 expires_delta=timedelta(days=7)  # Extend expiry to 7 days
             ) 
             return {
@@ -242,8 +281,13 @@ class AdminLogin(Resource):
 
         user = Admin.query.filter_by(email=email).first()
         if user and check_password(password, user.password_hash):
+            if needs_rehash(user.password_hash):
+                user.password_hash = hash_password(password)
+                db.session.commit()
+
             token = create_access_token(
                 identity=user.email,
+                additional_claims=identity_claims("admin", user),
                 expires_delta=timedelta(days=7)  # Extend expiry to 7 days
             )            
             return {
@@ -265,21 +309,15 @@ class Logout(Resource):
         parser.parse_args()
         _ = request.get_json(force=True, silent=True)
 
-        jti = get_jwt()["jti"]
-        blacklist.add(jti)
+        claims = get_jwt()
+        blocklist.revoke(claims["jti"], claims["exp"])
         return {"message": "Logged out successfully"}, 200
     
 
 class AddClient(Resource):
-    @jwt_required()
+    @admin_required()
     def post(self):
         try:
-            # Get current admin user
-            current_user_email = get_jwt_identity()
-            admin = Admin.query.filter_by(email=current_user_email).first()
-            if not admin:
-                return {"error": "Unauthorized, admin access required"}, 403
-            
             # Parse request data
             data = request.get_json()
             if not data:
@@ -324,7 +362,7 @@ class AddClient(Resource):
                 last_name=data['last_name'],
                 email=data['email'],
                 phone=data['phone'],
-                password_hash=bcrypt.generate_password_hash(random_password).decode('utf-8'),
+                password_hash=hash_password(random_password),
                 status=data.get('status', 'Active'),
                 subscription=subscription,
                 subscription_expiry=subscription_expiry
@@ -332,44 +370,55 @@ class AddClient(Resource):
 
             db.session.add(new_client)
             db.session.commit()
+            response_cache.invalidate("clients")
 
-            # Create reset token and link
-            reset_token = create_access_token(identity=new_client.email, expires_delta=timedelta(hours=1))
-            reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
-
-            # Send welcome email
-            send_email(
-                to_email=new_client.email,
-                subject="Welcome to FitFlow - Set Your Password",
-                message=f"""
-                Hi {new_client.first_name},
-
-                🎉 Welcome to FitFlow! Your account has been created.
-
-                👉 Temporary password: {random_password}
-
-                Please use this temporary password to log in.  
-                For security, we recommend you set your own password using the link below (expires in 1 hour):
-
-                {reset_link}
-
-                Thank you for joining us!
-
-                Kind regards,
-                FitFlow Management
-                """
-            )
+            send_welcome_email(new_client.id, new_client.email, new_client.first_name, random_password)
 
             return {
                 "message": "Client added successfully",
                 "client": new_client.to_dict(),
             }, 201
 
+        except HashingBusy:
+            db.session.rollback()
+            raise
         except Exception as e:
             db.session.rollback()
             return {"error": str(e)}, 500
 
 
+class BulkAddClients(Resource):
+    # Content types accepted as the raw request body
+    FORMATS = {"text/csv": "csv", "application/json": "json", "application/x-ndjson": "ndjson"}
+
+    @admin_required()
+    @query_budget(allow_repeats=True)
+    def post(self):
+        upload = request.files.get("file")
+        if upload is not None:
+            stream, fmt = upload.stream, upload.filename.rsplit(".", 1)[-1].lower()
+        else:
+            stream, fmt = request.stream, self.FORMATS.get(request.mimetype)
+        if fmt is None:
+            return {"error": "Send text/csv, application/json or application/x-ndjson"}, 415
+
+        importer = ClientImport(
+            chunk_size=app.config["CLIENT_IMPORT_CHUNK_SIZE"],
+            send_welcome=request.args.get("welcome", "true").lower() != "false"
+        )
+        try:
+            importer.run(read_rows(stream, fmt))
+        except InvalidImport as e:
+            db.session.rollback()
+            # Chunks before the bad input are already committed
+            return {"error": str(e), **importer.summary(), "results": importer.results}, 400
+        finally:
+            if importer.summary()["created"]:
+                response_cache.invalidate("clients")
+
+        return {**importer.summary(), "results": importer.results}, 200
+
+
 class ResetPassword(Resource):
     @jwt_required()
     def post(self):
@@ -383,24 +432,15 @@ class ResetPassword(Resource):
         if not new_password:
             return {"error": "New password required"}, 400
 
-        user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        user.password_hash = hash_password(new_password)
         db.session.commit()
 
         return {"message": "Password updated successfully"}, 200
 
 class AddExpense(Resource):
-    @jwt_required()
+    @admin_required()
     def post(self):
-        current_user = get_jwt_identity()
-        print("JWT Identity:", current_user) 
-
-        admin = Admin.query.filter_by(email=current_user).first()
-        if not admin:
-            print("Unauthorized attempt by:", current_user)
-            return {"error": "Unauthorized, admin access required"}, 403
-
         data = request.get_json()
-        print("Incoming expense data:", data)  # 👈 Debug what React sends
 
         try:
             new_expense = Expense(
@@ -409,14 +449,15 @@ class AddExpense(Resource):
             )
 
             db.session.add(new_expense)
+            rollups.record_expense(new_expense)
             db.session.commit()
+            response_cache.invalidate("expenses")
 
-            print("✅ Expense added:", new_expense.expense, new_expense.cost)
             return {"message": "Expense added successfully!"}, 201
 
         except Exception as e:
             db.session.rollback()
-            print("❌ Error adding expense:", str(e))
+            current_app.logger.error(f"Error adding expense: {e}")
             return {"error": "Failed to add expense"}, 500
         
 class ChooseSubscription(Resource):
@@ -442,6 +483,7 @@ class ChooseSubscription(Resource):
         client.subscription_expiry = expiry_date
 
         db.session.commit()
+        response_cache.invalidate("clients")
 
         return {
             "message": f"Subscribed to {subscription.name} until {expiry_date.date()}",
@@ -459,6 +501,8 @@ class UpdateClient(Resource):
         if not client:
             return {"message": "Client not found"}, 404
 
+        old_email = client.email
+
         # Update only provided fields
         if "first_name" in data:
             client.first_name = data["first_name"]
@@ -471,35 +515,28 @@ class UpdateClient(Resource):
 
         try:
             db.session.commit()
+            principal_cache.invalidate("client", old_email)
+            response_cache.invalidate("clients")
             return {
                 "message": "Client updated successfully",
-                "client": {
-                    "id": client.id,
-                    "first_name": client.first_name,
-                    "last_name":client.last_name,
-                    "email": client.email,
-                    "phone": client.phone
-                }
+                "client": serializers.client.dump(client, serializers.CLIENT_CONTACT_FIELDS)
             }, 200
         except Exception as e:
             db.session.rollback()
             return {"message": "Error updating client", "error": str(e)}, 500
 
 class Subscriptions(Resource):
+    @query_budget(2)
+    @response_cache.cached("subscriptions", depends_on=("plans",))
     def get(self):
         subs = Subscription.query.all()
-        return [plan.to_dict() for plan in subs]
+        return serializers.subscription.dump_many(subs)
 
 class MarkCashPayment(Resource):
-    @jwt_required()
+    @admin_required()
     def post(self):
 
         try:
-            current_user = get_jwt_identity()
-            admin = Admin.query.filter_by(email=current_user).first()
-            if not admin:
-                return {"error": "Unauthorized, admin access required"}, 403
-
             data = request.get_json() 
             phone = data.get("phone")
             subscription_name = data.get("subscription")
@@ -545,6 +582,7 @@ class MarkCashPayment(Resource):
             )
 
             db.session.add(payment)
+            rollups.record_payment(payment)
 
             response_payload = {
                 "client": f"{client.first_name} {client.last_name}",
@@ -554,23 +592,7 @@ class MarkCashPayment(Resource):
                 "payment_date": effective_date.strftime("%Y-%m-%d")
             }
             if payment_status == "success":
-                # Determine base date to extend from
-                today = effective_date.date()
-                current_expiry = client.subscription_expiry.date() if client.subscription_expiry else None
-
-                if current_expiry and current_expiry >= today:
-                    base_dt = client.subscription_expiry
-                else:
-                    base_dt = datetime.combine(today, datetime.min.time())
-
-                new_expiry = base_dt + timedelta(days=subscription.duration_days)
-
-                # Update client
-                client.subscription = subscription
-                client.subscription_expiry = new_expiry
-                client.status = "Active"
-                client.last_payment_date = effective_date
-                client.last_payment_amount = amount_to_record
+                new_expiry = client.apply_payment(subscription, effective_date, amount_to_record)
 
                 response_payload.update({
                     "new_expiry": new_expiry.strftime("%Y-%m-%d"),
@@ -595,6 +617,7 @@ class MarkCashPayment(Resource):
                     "note": "Payment recorded without subscription update."
                 })
             db.session.commit()
+            response_cache.invalidate("clients", "payments")
             return {"message": "Payment processed", **response_payload}, 200
 
         except Exception as e:
@@ -625,6 +648,7 @@ class SelectSubscription(Resource):
         client.subscription_expiry = datetime.utcnow() + timedelta(days=subscription.duration_days)
 
         db.session.commit()
+        response_cache.invalidate("clients")
 
         return {
             "message": f"Successfully subscribed to {subscription.name}.",
@@ -647,7 +671,7 @@ class AddAdmin(Resource):
         if existing:
             return{"error": "Admin already exists."}
         
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
 
         new = Admin(
             email = email,
@@ -661,81 +685,93 @@ class AddAdmin(Resource):
         return {"message": "Admin successfully created"}, 201
     
 class GetClients(Resource):
-    @jwt_required()
+    @admin_required()
+    @replica_reads()
+    @query_budget(4)
     def get(self):
         try:
-            current_user = get_jwt_identity()
-            admin = Admin.query.filter_by(email=current_user).first()
-
-            if not admin:
-                return {"error": "Unauthorized, admin access required"}, 403
-
             search_term = request.args.get('search', default='', type=str)
             status_filter = request.args.get('status', default=None, type=str)
 
             query = Client.query
 
-            # Apply search filter
+            # Apply search filter (ranked, served by the client search index)
             if search_term:
-                search = f"%{search_term}%"
-                query = query.filter(
-                    db.or_(
-                        Client.first_name.ilike(search),
-                        Client.last_name.ilike(search),
-                        Client.email.ilike(search),
-                        Client.phone.ilike(search)
-                    )
-                )
+                query = search_clients(query, search_term)
 
             # Apply status filter
             if status_filter:
                 query = query.filter(Client.status.ilike(status_filter))
 
-            clients = query.order_by(Client.first_name.asc()).all()
+            fields = request.args.get('fields', default='', type=str)
+            fields = [f.strip() for f in fields.split(',') if f.strip()] or serializers.CLIENT_LIST_FIELDS
+            try:
+                serializers.client.check(fields)
+            except UnknownField as e:
+                return {"error": str(e)}, 400
 
-  
-            return {
-                "clients": [{
-                    "id": c.id,
-                    "first_name": c.first_name,
-                    "last_name": c.last_name,
-                    "email": c.email,
-                    "phone": c.phone,
-                    "status": c.status,
-                    "subscription": c.subscription.name if c.subscription else None,  # Fixed
-                    "subscription_id": c.subscription.id if c.subscription else None,  # Added if needed
-                    "subscription_expiry": c.subscription_expiry.isoformat() if c.subscription_expiry else None,
-                    "created_at": c.created_at.isoformat() if c.created_at else None  # Added for completeness
-                } for c in clients]
-            }, 200
+            # Subscription name comes from one joined load rather than a query per row
+            if serializers.CLIENT_PLAN_FIELDS.intersection(fields):
+                query = query.options(joinedload(Client.subscription))
+
+            # Pagination is opt-in so existing callers still get the full list
+            limit = request.args.get('limit', type=int)
+            cursor = request.args.get('cursor', type=str)
+            paginate = bool(limit or cursor)
+
+            if search_term:
+                # Ranked results have no stable keyset; `limit` just caps the top matches
+                if cursor:
+                    return {"error": "cursor cannot be combined with search"}, 400
+            else:
+                query = query.order_by(Client.first_name.asc(), Client.id.asc())
+
+            if cursor:
+                try:
+                    first_name, last_id = decode_cursor(cursor, 2)
+                    if not isinstance(first_name, str):
+                        raise InvalidCursor("Invalid cursor")
+                    after = [first_name, int(last_id)]
+                except (InvalidCursor, TypeError, ValueError):
+                    return {"error": "Invalid cursor"}, 400
+                query = query.filter(keyset_after([Client.first_name, Client.id], after))
+
+            if paginate:
+                limit = clamp_limit(limit)
+                clients = query.limit(limit + 1).all()
+                has_more = len(clients) > limit
+                clients = clients[:limit]
+            else:
+                clients = query.all()
+                has_more = False
+
+            # Only evaluate the requested fields, so a projection never touches c.subscription
+            rows = serializers.client.dump_many(clients, fields)
+
+            next_cursor = None
+            if has_more and not search_term:
+                last = clients[-1]
+                next_cursor = encode_cursor(last.first_name, last.id)
+
+            return {"clients": rows, "next_cursor": next_cursor}, 200
 
         except Exception as e:
             current_app.logger.error(f"Error fetching clients: {str(e)}")
             return {"error": "Failed to fetch clients"}, 500
         
 class GetExpense(Resource):
-    @jwt_required()
+    @admin_required()
     def get(self):
-        current_user = get_jwt_identity()
-        admin = Admin.query.filter_by(email=current_user).first()
-
-        if not admin:
-            return {"error": "Unauthorized."}, 403
-        
         expense_name = request.args.get("expense")
         expense = Expense.query.filter_by(expense=expense_name).first()
         if not expense:
             return {"error": "Expense is not found"}, 404
     
-        return {
-            "id": expense.id,
-            "expense": expense.expense,
-            "cost": expense.cost,
-            "created_at": expense.created_at.isoformat()
-        }, 200  
+        return serializers.expense.dump(expense), 200  
 
 class ClientDashboard(Resource):
     @jwt_required()
+    @query_budget(3)
     def get(self):
         current_user_email = get_jwt_identity()
         client = Client.query.filter_by(email=current_user_email).first()
@@ -744,99 +780,164 @@ class ClientDashboard(Resource):
             return {"error": "Client not found"}, 404
 
         return {
-            "client": {
-                "id": client.id,
-                "first_name": client.first_name,
-                "last_name": client.last_name,
-                "email": client.email,
-                "phone": client.phone,
-                "subscription": client.subscription.name if client.subscription else None,
-                "subscription_price": client.subscription.price if client.subscription else None,
-                "subscription_expiry": client.subscription_expiry.isoformat() if client.subscription_expiry else None,
-                "created_at": client.created_at.isoformat() if client.created_at else None,
-            },
+            "client": serializers.client.dump(client, serializers.CLIENT_PROFILE_FIELDS),
             "payment_instructions": "To renew your subscription, please go to the payment section and use M-PESA. This feature is coming soon."
         }, 200
 
 
 class GetAllExpenses(Resource):
-    @jwt_required()
+    @admin_required()
+    @replica_reads()
+    @query_budget(4)
     def get(self):
         try:
-            current_user = get_jwt_identity()
-            admin = Admin.query.filter_by(email=current_user).first()
-
-            if not admin:
-                return {"error": "Unauthorized, admin access required"}, 403
-
             # Get optional month/year filters from query params
             month = request.args.get('month', type=int)
             year = request.args.get('year', type=int, default=datetime.utcnow().year)
-            
-            # Base query
-            query = Expense.query.order_by(Expense.created_at.desc())
-            
-            # Apply filters if provided
-            if month:
-                query = query.filter(
-                    extract('month', Expense.created_at) == month,
-                    extract('year', Expense.created_at) == year
-                )
+            try:
+                check_period(year, month or None)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            # Totals cover the whole period, whichever page is returned
+            total, count = ledger.expense_totals(year, month or None)
+
+            # Filter by month if provided, otherwise by the whole year
+            query = (
+                Expense.query
+                .filter(in_period(Expense.created_at, year, month or None))
+                .order_by(Expense.created_at.desc(), Expense.id.desc())
+            )
+
+            # Pagination is opt-in so existing callers still get the full list
+            limit = request.args.get('limit', type=int)
+            cursor = request.args.get('cursor', type=str)
+
+            if cursor:
+                try:
+                    query = query.filter(ledger.newest_first_after(cursor, Expense.created_at, Expense.id))
+                except InvalidCursor as e:
+                    return {"error": str(e)}, 400
+
+            if limit or cursor:
+                limit = clamp_limit(limit)
+                expenses = query.limit(limit + 1).all()
+                has_more = len(expenses) > limit
+                expenses = expenses[:limit]
             else:
-                # Filter by year only if no month specified
-                query = query.filter(
-                    extract('year', Expense.created_at) == year
-                )
+                expenses = query.all()
+                has_more = False
+
+            next_cursor = None
+            if has_more:
+                last = expenses[-1]
+                next_cursor = encode_cursor(last.created_at, last.id)
 
-            expenses = query.all()
-            
-            # Calculate total
-            total = sum(exp.cost for exp in expenses)
-            
             return {
-                "expenses": [
-                    {
-                        "id": e.id,
-                        "expense": e.expense,
-                        "cost": e.cost,
-                        "created_at": e.created_at.isoformat(),
-                    }
-                    for e in expenses
-                ],
+                "expenses": serializers.expense.dump_many(expenses),
                 "total": total,
-                "count": len(expenses),
+                "count": count,
                 "month": month,
-                "year": year
+                "year": year,
+                "next_cursor": next_cursor
             }, 200
             
         except Exception as e:
             current_app.logger.error(f"Error fetching expenses: {str(e)}")
-            return {"error": "Failed to fetch expenses"}, 
+            return {"error": "Failed to fetch expenses"}, 500
+
+
+class ExpenseSummary(Resource):
+    @admin_required()
+    @replica_reads()
+    # Totals plus one query per group, for all three groups
+    @query_budget(6)
+    def get(self):
+        month = request.args.get('month', type=int)
+        year = request.args.get('year', type=int, default=datetime.utcnow().year)
+        try:
+            check_period(year, month or None)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        groups = [g for g in request.args.get('group', ','.join(ledger.EXPENSE_GROUPS)).split(',') if g]
+        unknown = [g for g in groups if g not in ledger.EXPENSE_GROUPS]
+        if unknown:
+            return {"error": f"Unknown group: {', '.join(unknown)}"}, 400
+
+        total, count = ledger.expense_totals(year, month or None)
+        summary = {"year": year, "month": month, "total": total, "count": count}
+        for group in groups:
+            summary[f"by_{group}"] = ledger.expenses_by(group, year, month or None)
+        return summary, 200
 
 
 class GetPayments(Resource):
-    @jwt_required()
+    @client_required()
+    @query_budget(4)
     def get(self):
-        client_email = get_jwt_identity()
-        client = Client.query.filter_by(email=client_email).first()
-        if not client:
-            return {"error": "Client not found"}, 404
+        # Newest first, one page at a time; the cursor for the next page is in X-Next-Cursor
+        stmt = ledger.payment_rows().where(Payment.client_id == current_principal().id)
+        try:
+            rows, next_cursor = ledger.newest_first_page(
+                stmt, request.args.get("limit", type=int), request.args.get("cursor")
+            )
+        except InvalidCursor as e:
+            return {"error": str(e)}, 400
+
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return serializers.payment.dump_many(rows, serializers.PAYMENT_HISTORY_FIELDS), 200, headers
+
+
+class PaymentLedger(Resource):
+    @admin_required()
+    @replica_reads()
+    @query_budget(3)
+    def get(self):
+        args = request.args
+        try:
+            stmt = ledger.filter_payments(
+                ledger.payment_rows(),
+                statuses=[v for v in args.get("status", "").split(",") if v],
+                methods=[v for v in args.get("method", "").split(",") if v],
+                plan=args.get("plan"),
+                start=args.get("start"),
+                end=args.get("end")
+            )
+            if args.get("client_id", type=int):
+                stmt = stmt.where(Payment.client_id == args.get("client_id", type=int))
+            rows, next_cursor = ledger.newest_first_page(stmt, args.get("limit", type=int), args.get("cursor"))
+        except ValueError as e:
+            # InvalidCursor and bad dates
+            return {"error": str(e)}, 400
+
+        return {
+            "payments": serializers.payment.dump_many(rows, serializers.PAYMENT_LEDGER_FIELDS),
+            "next_cursor": next_cursor
+        }, 200
+
 
-        payments = Payment.query.filter_by(client_id=client.id).all()
-        return [payment.to_dict() for payment in payments], 200
+STATUS_POLL_INTERVAL = 2  # seconds, sent as Retry-After while a payment is pending
+
+
+def _push_accepted(payment, message="STK push sent. Check your phone."):
+    return {"message": message, "payment_id": payment.id, "status": payment.status}, 202
 
 
 class MpesaInitiate(Resource):
-    @jwt_required()
+    @client_required()
     def post(self):
         data = request.json
         plan_name = data.get("plan_name")  
         phone = data.get("phone_number")
-        user_email = data.get("email")
+        # Reused by the client for every retry of the same payment attempt
+        key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
 
         # Validate input
         if not plan_name or not phone:
             return {"error": "Plan name and phone number required"}, 400
+        if not key or len(key) > 64:
+            return {"error": "An Idempotency-Key of up to 64 characters is required"}, 400
 
         if phone.startswith("0"):
             phone = "254" + phone[1:]
@@ -848,15 +949,25 @@ class MpesaInitiate(Resource):
         if not plan:
             return {"error": "Invalid subscription plan"}, 400
 
-        # Initiate Mpesa STK push
-        response = lipa_na_mpesa(phone, plan.price)
-        print("DEBUG: STK push response:", response)
+        client = current_principal()
 
-        client = Client.query.filter_by(email=user_email).first()
-        if not client:
-            return {"error": "Client not found"}, 404
-        
-        # Save pending payment
+        def replay():
+            existing = Payment.query.filter_by(client_id=client.id, idempotency_key=key).first()
+            if not existing:
+                return None
+            if existing.subscription_id != plan.id or existing.phone_number != phone:
+                return {"error": "Idempotency-Key was already used for a different payment"}, 422
+            return _push_accepted(existing, "STK push already sent. Check your phone.")
+
+        # A double-click or retry reuses the push that is already in flight
+        replayed = replay()
+        if replayed:
+            return replayed
+
+        if not mpesa_breaker.available:
+            return {"error": "M-PESA is temporarily unavailable, please try again shortly"}, 503
+
+        # Save pending payment, then push from the background pool
         payment = Payment(
             client_id=client.id,
             subscription_id=plan.id,
@@ -864,15 +975,48 @@ class MpesaInitiate(Resource):
             status="Pending",
             method="M-PESA",
             phone_number=phone,
-            checkout_request_id=response["CheckoutRequestID"],
+            idempotency_key=key
+        )
+        try:
+            db.session.add(payment)
+            rollups.record_payment(payment)
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request with the same key won the insert; answer with its payment
+            db.session.rollback()
+            return replay() or ({"error": "Could not create payment"}, 409)
+        response_cache.invalidate("payments")
 
+        stk_push.submit(payment.id, phone, plan.price)
+
+        return _push_accepted(payment)
+
+class PaymentStatus(Resource):
+    @client_required()
+    @query_budget(3)
+    def get(self, payment_id):
+        client = current_principal()
+
+        # A single indexed read; clients poll on a backoff, so no request is held open
+        row = (
+            db.session.query(Payment.id, Payment.status, Payment.checkout_response, Payment.mpesa_receipt)
+            .filter(Payment.id == payment_id, Payment.client_id == client.id)
+            .first()
         )
-        db.session.add(payment)
-        db.session.commit()
+        if not row:
+            return {"error": "Payment not found"}, 404
 
-        return {"message": "STK push sent. Check your phone.", "response": response}
+        headers = {"Retry-After": str(STATUS_POLL_INTERVAL)} if row.status == "Pending" else {}
+        return {
+            "payment_id": row.id,
+            "status": row.status,
+            "push_sent": row.checkout_response is not None,
+            "mpesa_receipt": row.mpesa_receipt
+        }, 200, headers
 
 class DashBoard(Resource):
+    @query_budget(4)
+    @response_cache.cached("dashboard", depends_on=("plans", "clients", "payments", "expenses"), ttl=60)
     def get(self):
         now = datetime.now()
         month = now.month
@@ -881,21 +1025,10 @@ class DashBoard(Resource):
         # Total clients
         clients_count = Client.query.count()
 
-        # Expenses for current month
-        expenses_total = (
-            db.session.query(func.sum(Expense.cost))
-            .filter(extract("month", Expense.created_at) == month)
-            .filter(extract("year", Expense.created_at) == year)
-            .scalar() or 0
-        )
-
-        # Payments for current month
-        payments_total = (
-            db.session.query(func.sum(Payment.amount))
-            .filter(extract("month", Payment.created_at) == month)
-            .filter(extract("year", Payment.created_at) == year)
-            .scalar() or 0
-        )
+        # Current month's figures come from the rollup table, not a scan
+        totals = rollups.month_totals(year, month)
+        expenses_total = totals.get((rollups.EXPENSES, ""), 0)
+        payments_total = totals.get((rollups.EARNINGS, ""), 0)
 
         # Subscriptions with number of clients in each
         subscriptions = (
@@ -915,7 +1048,8 @@ class DashBoard(Resource):
                 "id": sub.id,
                 "name": sub.name,
                 "price": sub.price,
-                "clients": sub.client_count
+                "clients": sub.client_count,
+                "payments_this_month": int(totals.get((rollups.PLAN_PAYMENTS, str(sub.id)), 0))
             }
             for sub in subscriptions
         ]
@@ -927,93 +1061,18 @@ class DashBoard(Resource):
             "subscriptions": subscriptions_list,
         }
 
-        return jsonify(stats)
-
-# class AddMpesaPayment(Resource):
-#     def post(self):
-#         data = request.get_json()
-#         body = data["Body"]["stkCallback"]
-
-#         checkout_id = body["CheckoutRequestID"]
-#         result_code = body["ResultCode"]
-#         result_desc = body["ResultDesc"]
-
-#         if result_code != 0:
-#             return {"message": "Payment failed"}, 400
-#         else:
-#             payment = Payment.query.filter_by(checkout_response=checkout_id).first()
-#             callback_metadata = body["CallbackMetadata"]["Item"]
- 
-
-
-#         # Extract Mpesa callback details
-#         items = callback_metadata["Item"]
-#         receipt, amount_paid, phone = None, None, None
-
-#         for i in items:
-#             if i["Name"] == "MpesaReceiptNumber":
-#                 receipt = i["Value"]
-#             elif i["Name"] == "Amount":
-#                 amount_paid = i["Value"]
-#             elif i["Name"] == "PhoneNumber":
-#                 phone = i["Value"]
-
-
-
-#         client = Client.query.filter_by(email=user_email).first()
-#         if not client:
-#             return {"error": "Client not found"}, 404
-
-#         # Find most recent pending payment for this user
-#         payment = (
-#             Payment.query.filter_by(client_id=client.id, status="Pending")
-#             .order_by(Payment.created_at.desc())
-#             .first()
-#         )
-#         if not payment:
-#             return {"error": "Pending payment not found"}, 404
-
-#         # Mark payment as successful
-#         payment.mpesa_receipt = receipt
-#         payment.status = "Success"
-#         payment.phone_number = phone
-#         db.session.commit()
-
-#         # Update client subscription
-#         plan = Subscription.query.get(payment.subscription_id)
-
-#         today = datetime.utcnow()
-#         if not client.subscription_expiry or client.subscription_expiry < today:
-#             # New subscription
-#             client.subscription_id = plan.id
-#             client.subscription_expiry = today + timedelta(days=plan.duration_days)
-#             client.status = "active"
-#         else:
-#             # Renewal → extend expiry
-#             client.subscription_expiry += timedelta(days=plan.duration_days)
-
-#         # Track payment history on client
-#         client.last_payment_date = today
-#         client.last_payment_amount = amount_paid
-#         db.session.commit()
-
-#         # Send email receipt
-#         send_email(
-#             to=client.email,
-#             subject="Subscription Payment Successful",
-#             body=f"""
-#             Hi {client.first_name},
-
-#             Your payment of {amount_paid} KES via M-PESA was successful.
-#             Mpesa Receipt: {receipt}
-
-#             Your {plan.name} subscription is now valid until {client.subscription_expiry.date()}.
-
-#             Thank you for staying with us!
-#             """
-#         )
-
-#         return {"message": "Payment processed and subscription updated"}, 200
+        return stats
+
+class AddMpesaPayment(Resource):
+    def post(self):
+        # Store and ack straight away; callback_processor applies it to the payment
+        data = request.get_json(silent=True)
+        try:
+            callback_processor.ingest(data)
+        except InvalidCallback as e:
+            return {"ResultCode": 1, "ResultDesc": str(e)}, 400
+
+        return {"ResultCode": 0, "ResultDesc": "Accepted"}, 200
 
 class AdminUpdate(Resource):
     @jwt_required()
@@ -1025,6 +1084,8 @@ class AdminUpdate(Resource):
         if not admin:
             return {"message": "Admin not found"}, 404
 
+        old_email = admin.email
+
         if data.get("name"):
             admin.name = data["name"]
 
@@ -1032,14 +1093,56 @@ class AdminUpdate(Resource):
             admin.email = data["email"]
 
         if data.get("old_password") and data.get("new_password"):
-            if not check_password(admin.password_hash, data["old_password"]):
+            if not check_password(data["old_password"], admin.password_hash):
                 return {"message": "Old password is incorrect"}, 400
 
             admin.password_hash = hash_password(data["new_password"])
 
         db.session.commit()
+        principal_cache.invalidate("admin", old_email)
         return {"message": "Profile updated successfully", "admin": admin.to_dict()}, 200
     
+class Export(Resource):
+    @admin_required()
+    @replica_reads()
+    def get(self, dataset):
+        fmt = request.args.get("format", "csv")
+        if fmt not in EXPORT_FORMATS:
+            return {"error": "format must be csv or ndjson"}, 400
+
+        statuses = [s for s in request.args.get("status", "").split(",") if s]
+        try:
+            stmt = build_export(dataset, request.args.get("start"), request.args.get("end"), statuses)
+        except InvalidExport as e:
+            return {"error": str(e)}, 400
+
+        filename = f"{dataset}-{datetime.utcnow():%Y%m%d}.{fmt}"
+        return Response(
+            stream_with_context(stream_export(stmt, fmt, app.config["EXPORT_BATCH_SIZE"])),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+class JobRuns(Resource):
+    @admin_required()
+    @query_budget(4)
+    def get(self):
+        query = JobRun.query
+        if request.args.get("job_id"):
+            query = query.filter_by(job_id=request.args["job_id"])
+
+        runs = query.order_by(JobRun.started_at.desc()).limit(clamp_limit(request.args.get("limit", type=int))).all()
+        lease = db.session.get(SchedulerLock, job_scheduler.LOCK_NAME)
+        return {
+            "leader": lease.owner if lease and lease.expires_at > datetime.utcnow() else None,
+            "runs": serializers.job_run.dump_many(runs)
+        }, 200
+
+class CacheStats(Resource):
+    @admin_required()
+    def get(self):
+        return response_cache.stats(), 200
+
 # ---------------- FORGOT PASSWORD ---------------- #
 
 class ForgotPassword(Resource):
@@ -1055,7 +1158,11 @@ class ForgotPassword(Resource):
             return {"message": "If that email exists, a reset link has been sent."}, 200  # Don't leak info
 
         # Generate a reset token (30 mins expiry)
-        reset_token = create_access_token(identity=user.email, expires_delta=timedelta(minutes=30))
+        reset_token = create_access_token(
+            identity=user.email,
+            additional_claims=identity_claims("client", user),
+            expires_delta=timedelta(minutes=30)
+        )
         reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
 
         # Send email
@@ -1095,7 +1202,7 @@ class ResetPasswordConfirm(Resource):
             return {"error": "New password is required"}, 400
 
         # Update password
-        user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        user.password_hash = hash_password(new_password)
         db.session.commit()
 
         return {"message": "Password reset successful! You can now log in with your new password."}, 200
@@ -1104,7 +1211,8 @@ api.add_resource(ForgotPassword, "/forgot-password")
 api.add_resource(ResetPasswordConfirm, "/reset-password")
 api.add_resource(AdminUpdate, "/admin/update")
 api.add_resource(MpesaInitiate, '/start/payment')
-# api.add_resource(AddMpesaPayment, '/callback')
+api.add_resource(PaymentStatus, '/payments/<int:payment_id>/status')
+api.add_resource(AddMpesaPayment, '/callback')
 api.add_resource(ClientDashboard, '/dashboard/client')
 api.add_resource(ClientLogin, '/client/login')
 api.add_resource(AdminLogin, '/admin/login')
@@ -1116,16 +1224,68 @@ api.add_resource(ChooseSubscription, '/chooseSubscription')
 api.add_resource(MarkCashPayment, '/markCashPayment')
 api.add_resource(SelectSubscription, '/selectSubscription')
 api.add_resource(GetClients, '/clients')
+api.add_resource(BulkAddClients, '/clients/bulk')
 api.add_resource(GetExpense, '/getExpense')
 api.add_resource(GetAllExpenses, '/expenses')
+api.add_resource(ExpenseSummary, '/expenses/summary')
 api.add_resource(Subscriptions, '/subscriptions')
 api.add_resource(ClientResource, "/clients/<int:client_id>")
 api.add_resource(UpdateClient, "/update")
 api.add_resource(GetPayments, "/client/payments")
+api.add_resource(PaymentLedger, "/payments")
 api.add_resource(DashBoard, "/dashboard")
+api.add_resource(CacheStats, "/cache/stats")
+api.add_resource(JobRuns, "/jobs/runs")
+api.add_resource(Export, "/export/<string:dataset>")
 api.add_resource(ResetPassword, "/reset/password")
 
 
+@app.cli.command("rebuild-rollups")
+@click.option("--year", type=int, default=None, help="Only rebuild this year.")
+def rebuild_rollups(year):
+    """Recompute monthly_rollups from payments and expenses."""
+    cells = rollups.rebuild(year)
+    click.echo(f"Rebuilt {cells} rollup rows.")
+
+
+@app.cli.command("import-clients")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json", "ndjson"]), default=None,
+              help="Defaults to the file extension.")
+@click.option("--welcome/--no-welcome", default=True, help="Queue welcome emails.")
+def import_clients(path, fmt, welcome):
+    """Bulk-create clients from a CSV, JSON or NDJSON file."""
+    importer = ClientImport(chunk_size=app.config["CLIENT_IMPORT_CHUNK_SIZE"], send_welcome=welcome,
+                            wait_for_mail=True)
+    with open(path, "rb") as f:
+        try:
+            importer.run(read_rows(f, fmt or path.rsplit(".", 1)[-1].lower()))
+        except InvalidImport as e:
+            click.echo(f"Stopped: {e}", err=True)
+
+    for result in importer.results:
+        if result["status"] != "created":
+            click.echo(f"row {result['row']}: {result['error']}", err=True)
+        elif result.get("welcome_queued") is False:
+            click.echo(f"row {result['row']}: welcome email not queued", err=True)
+    summary = importer.summary()
+    click.echo(f"Imported {summary['created']} of {summary['rows']} rows.")
+    if welcome:
+        mailer.join()
+
+
+@app.cli.command("run-scheduler")
+def run_scheduler():
+    """Run scheduled jobs; safe to start on several hosts, only the leader runs them."""
+    click.echo(f"Scheduler {job_scheduler.owner} waiting for the leader lease.")
+    signal.signal(signal.SIGTERM, lambda *_: job_scheduler.stop())
+    try:
+        job_scheduler.run()
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == '__main__':
+    if app.config["SCHEDULER_EMBEDDED"]:
+        job_scheduler.start()
     app.run(port=5000)
\ No newline at end of file
@@ -1,9 +1,137 @@
-from flask_bcrypt import Bcrypt
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt as _bcrypt
+from werkzeug.exceptions import TooManyRequests
+from metrics import metrics
 
-bcrypt = Bcrypt()
+
+class HashingBusy(TooManyRequests):
+    description = "Too many password operations in progress, please retry shortly."
+
+
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    return _bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded process pool instead of on the request thread.
+    At most `max_pending` operations may be queued or running; beyond that,
+    callers get HashingBusy (429) instead of piling up behind the pool.
+    With workers=0 hashing runs inline (seed scripts, single-user dev).
+    A pool broken by a dead worker (OOM kill, segfault) is replaced and the
+    operation retried once, as is one shut down by another thread's replace.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = os.cpu_count() or 1
+        self.max_pending = self.workers * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = int(app.config.get("BCRYPT_LOG_ROUNDS", self.rounds))
+        self.workers = int(app.config.get("BCRYPT_WORKERS", self.workers))
+        self.max_pending = int(app.config.get("BCRYPT_MAX_PENDING", self.workers * 4 or 1))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions["password_hasher"] = self
+
+    def hash(self, password):
+        return self._run(_hash, password.encode("utf-8"), self.rounds)
+
+    def check(self, password, hashed):
+        if not password or not hashed:
+            return False
+        return self._run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def hash_many(self, passwords):
+        """
+        Hash a batch (bulk imports). Holds one admission slot, waiting for it
+        rather than failing, and submits one pool-sized wave at a time so
+        logins queued meanwhile are not stuck behind the whole batch.
+        """
+        args = [(p.encode("utf-8"), self.rounds) for p in passwords]
+        if not self.workers:
+            with metrics.timed("bcrypt"):
+                return [_hash(*a) for a in args]
+
+        self._slots.acquire()
+        try:
+            hashes = []
+            with metrics.timed("bcrypt"):
+                for i in range(0, len(args), self.workers):
+                    hashes.extend(self._in_pool(_hash, args[i:i + self.workers]))
+            return hashes
+        finally:
+            self._slots.release()
+
+    def needs_rehash(self, hashed):
+        """True when the stored hash was made with a different cost than configured."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            with metrics.timed("bcrypt"):
+                return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(retry_after=1)
+        try:
+            with metrics.timed("bcrypt"):
+                return self._in_pool(fn, [args])[0]
+        finally:
+            self._slots.release()
+
+    def _in_pool(self, fn, arglist):
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                futures = [pool.submit(fn, *args) for args in arglist]
+                return [f.result() for f in futures]
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                if attempt:
+                    raise
+            except RuntimeError:
+                # "cannot schedule new futures after shutdown": another thread
+                # discarded this pool between _get_pool() and submit()
+                if attempt or pool is self._pool:
+                    raise
+
+    def _get_pool(self):
+        # Created on first use so each gunicorn worker gets its own pool after fork
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _discard_pool(self, pool):
+        # Only the first thread to see this pool broken replaces it
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher()
 
 def hash_password(password):
-    return bcrypt.generate_password_hash(password).decode('utf-8')
+    return hasher.hash(password)
 
 def check_password(password, hashed):
-    return bcrypt.check_password_hash(hashed, password)
+    return hasher.check(password, hashed)
+
+def needs_rehash(hashed):
+    return hasher.needs_rehash(hashed)
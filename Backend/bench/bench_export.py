@@ -0,0 +1,104 @@
+"""
+GET /export/payments over 1M payments: streamed CSV and NDJSON vs
+building the whole CSV in memory first (what a plain .all() + csv.writer
+handler would do). Reports bytes, time, and RSS at start and peak,
+sampled every 100 chunks. Total RSS includes the pages SQLite maps in
+(SQLITE_MMAP_SIZE, 256 MB by default), a fixed cost; anonymous RSS is
+the heap, which is what must not grow with the row count. Each mode runs
+in its own process so one mode's heap does not show up in the next.
+
+    python bench/bench_export.py [payments]
+"""
+import csv
+import io
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from common import BENCH_DB_DIR, insert_rows, report, rss_mb, use_database
+
+PAYMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+MODE = sys.argv[2] if len(sys.argv) > 2 else None
+MODES = ("csv", "ndjson", "buffered-csv")
+
+if MODE is None:
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, str(PAYMENTS), mode], check=True)
+    sys.exit()
+
+path, exists = use_database(f"export-{PAYMENTS}")
+
+from app import app  # noqa: E402
+from auth import hash_password  # noqa: E402
+from exports import _cell, build_export  # noqa: E402
+from models import db, Admin, Client, Payment, Subscription  # noqa: E402
+
+
+def seed():
+    db.create_all()
+    db.session.add(Subscription(name="Monthly", price=3000, duration_days=30))
+    db.session.add(Admin(name="Admin", email="admin@example.com", password_hash=hash_password("pw")))
+    db.session.add(Client(first_name="A", last_name="B", email="c@example.com", phone="0712345678",
+                          password_hash="x", status="Active"))
+    db.session.commit()
+    now = datetime.utcnow()
+    insert_rows(Payment, (
+        {"client_id": 1, "subscription_id": 1, "amount": 3000, "phone_number": "0712345678",
+         "status": "Success", "method": "M-PESA", "mpesa_receipt": f"R{i:09d}", "created_at": now}
+        for i in range(PAYMENTS)
+    ))
+
+
+def memory():
+    return rss_mb(), rss_mb("RssAnon")
+
+
+def peak_of(*samples):
+    return tuple(max(values) for values in zip(*samples))
+
+
+def streamed(fmt):
+    http = app.test_client()
+    token = http.post("/admin/login", json={"email": "admin@example.com", "password": "pw"}).get_json()["token"]
+    start = peak = memory()
+    started = time.perf_counter()
+    size = 0
+    response = http.get(f"/export/payments?format={fmt}", headers={"Authorization": f"Bearer {token}"},
+                        buffered=False)
+    for i, chunk in enumerate(response.response):
+        size += len(chunk)
+        if i % 100 == 0:
+            peak = peak_of(peak, memory())
+    response.close()
+    return size, time.perf_counter() - started, start, peak_of(peak, memory())
+
+
+def buffered_csv():
+    start = memory()
+    started = time.perf_counter()
+    with app.app_context():
+        result = db.session.execute(build_export("payments"))
+        columns = list(result.keys())
+        rows = result.all()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        writer.writerows([_cell(v) for v in row] for row in rows)
+        body = buffer.getvalue().encode("utf-8")
+        peak = memory()
+    return len(body), time.perf_counter() - started, start, peak
+
+
+with app.app_context():
+    if not exists:
+        print(f"Seeding {PAYMENTS:,} payments into {BENCH_DB_DIR} ...")
+        seed()
+
+size, elapsed, start, peak = buffered_csv() if MODE == "buffered-csv" else streamed(MODE)
+print(f"--- {MODE}: {PAYMENTS:,} payments, {size / 1e6:.0f} MB")
+report("time", elapsed * 1000)
+report("RSS at start", start[0], "MB")
+report("RSS at peak", peak[0], "MB")
+report("anonymous RSS at start", start[1], "MB")
+report("anonymous RSS at peak", peak[1], "MB")
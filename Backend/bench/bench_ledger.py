@@ -0,0 +1,99 @@
+"""
+Payment history and the admin ledger over 1M payments from 1,000 clients
+spread across two years: the old unpaged /client/payments (every row
+through to_dict) vs keyset pages, the /payments filters, and a page
+40,000 rows deep via the cursor vs OFFSET.
+
+    python bench/bench_ledger.py [payments]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from common import BENCH_DB_DIR, best_of, insert_rows, report, use_database
+
+PAYMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+CLIENTS = 1000
+DEPTH = 40_000
+path, exists = use_database(f"ledger-{PAYMENTS}")
+
+from sqlalchemy import text  # noqa: E402
+from app import app  # noqa: E402
+from auth import hash_password  # noqa: E402
+from ledger import filter_payments, payment_rows  # noqa: E402
+from models import db, Admin, Client, Payment, Subscription  # noqa: E402
+
+
+def seed():
+    rnd = random.Random(1)
+    base = datetime(2024, 10, 18)
+    db.create_all()
+    db.session.add_all([
+        Subscription(name="Monthly", price=3000, duration_days=30),
+        Subscription(name="Annual", price=30000, duration_days=365),
+        Admin(name="Admin", email="admin@example.com", password_hash=hash_password("pw")),
+    ])
+    db.session.commit()
+    insert_rows(Client, (
+        {"first_name": f"F{i}", "last_name": "L", "email": f"c{i}@example.com", "phone": f"07{i:08d}",
+         "password_hash": hash_password("pw") if i == 0 else "x", "status": "Active"}
+        for i in range(CLIENTS)
+    ))
+    insert_rows(Payment, (
+        {"client_id": rnd.randint(1, CLIENTS), "subscription_id": rnd.randint(1, 2), "amount": 3000,
+         "phone_number": "0700000000", "status": rnd.choice(["Success"] * 8 + ["Failed", "Pending"]),
+         "method": rnd.choice(["Cash", "M-PESA"]), "created_at": base + timedelta(seconds=rnd.randint(0, 730 * 86400))}
+        for _ in range(PAYMENTS)
+    ))
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def page_headers(http):
+    admin = http.post("/admin/login", json={"email": "admin@example.com", "password": "pw"}).get_json()["token"]
+    client = http.post("/client/login", json={"email": "c0@example.com", "password": "pw"}).get_json()["access_token"]
+    return {"Authorization": f"Bearer {admin}"}, {"Authorization": f"Bearer {client}"}
+
+
+with app.app_context():
+    if not exists:
+        print(f"Seeding {PAYMENTS:,} payments from {CLIENTS:,} clients into {BENCH_DB_DIR} ...")
+        seed()
+
+http = app.test_client()
+admin_headers, client_headers = page_headers(http)
+
+print(f"--- {PAYMENTS:,} payments, {CLIENTS:,} clients")
+with app.app_context():
+    history = Payment.query.filter_by(client_id=1).count()
+    report(f"old /client/payments, one client, all {history} rows via to_dict",
+           best_of(lambda: [p.to_dict() for p in Payment.query.filter_by(client_id=1).all()]))
+    db.session.remove()
+
+report("new /client/payments page 1 (50)", best_of(lambda: http.get("/client/payments", headers=client_headers)))
+cursor = None
+for _ in range(15):
+    response = http.get("/client/payments" + (f"?cursor={cursor}" if cursor else ""), headers=client_headers)
+    cursor = response.headers.get("X-Next-Cursor") or cursor
+report("new /client/payments page 16",
+       best_of(lambda: http.get(f"/client/payments?cursor={cursor}", headers=client_headers)))
+
+report("/payments page 1, unfiltered", best_of(lambda: http.get("/payments", headers=admin_headers)))
+report("/payments status=Failed&method=Cash",
+       best_of(lambda: http.get("/payments?status=Failed&method=Cash", headers=admin_headers)))
+report("/payments plan=Annual, one-month date range",
+       best_of(lambda: http.get("/payments?plan=Annual&start=2025-03-01&end=2025-03-31", headers=admin_headers)))
+
+cursor = None
+for _ in range(DEPTH // 200):
+    cursor = http.get("/payments?limit=200" + (f"&cursor={cursor}" if cursor else ""),
+                      headers=admin_headers).get_json()["next_cursor"]
+report(f"/payments {DEPTH:,} rows deep via the cursor",
+       best_of(lambda: http.get(f"/payments?cursor={cursor}", headers=admin_headers)))
+
+newest_first = (Payment.created_at.desc(), Payment.id.desc())
+with app.app_context():
+    report(f"same depth via OFFSET {DEPTH:,}", best_of(lambda: db.session.execute(
+        payment_rows().order_by(*newest_first).offset(DEPTH).limit(50)).all()))
+    report(f"status=Pending via OFFSET {DEPTH:,}", best_of(lambda: db.session.execute(
+        filter_payments(payment_rows(), statuses=["Pending"]).order_by(*newest_first).offset(DEPTH).limit(50)).all()))
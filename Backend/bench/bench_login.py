@@ -0,0 +1,116 @@
+"""
+/client/login under a login storm: bcrypt inline on the request thread
+(BCRYPT_WORKERS=0) vs the PasswordHasher process pool. Reports logins/s,
+p50/p99, how many callers were turned away with 429, and the p99 of a
+cheap GET /subscriptions issued alongside the storm. Halfway through the
+pool run its workers are SIGKILLed; the logins in flight then must
+succeed on a fresh pool rather than fail with 500.
+
+    python bench/bench_login.py [logins] [senders] [rounds]
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from common import report, use_database
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SENDERS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+ROUNDS = sys.argv[3] if len(sys.argv) > 3 else "10"
+MODE = sys.argv[4] if len(sys.argv) > 4 else None
+
+# One process per mode: the hasher reads its config at import time
+if MODE is None:
+    for mode in ("inline", "pool"):
+        subprocess.run([sys.executable, __file__, str(LOGINS), str(SENDERS), ROUNDS, mode], check=True)
+    sys.exit()
+
+env = {"BCRYPT_LOG_ROUNDS": ROUNDS}
+if MODE == "inline":
+    env["BCRYPT_WORKERS"] = "0"
+use_database(f"login-{MODE}", fresh=True, **env)
+
+from app import app  # noqa: E402
+from auth import hash_password, hasher  # noqa: E402
+from models import db, Client, Subscription  # noqa: E402
+
+
+def seed():
+    db.create_all()
+    db.session.add(Subscription(name="Monthly", price=3000, duration_days=30))
+    db.session.add_all(
+        Client(first_name="C", last_name=str(i), email=f"c{i}@example.com", phone=f"07{i:08d}",
+               password_hash=hash_password("pw"), status="Active")
+        for i in range(SENDERS)
+    )
+    db.session.commit()
+
+
+def login(k, count, latencies, statuses):
+    http = app.test_client()
+    body = {"email": f"c{k}@example.com", "password": "pw"}
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            status = http.post("/client/login", json=body).status_code
+        except Exception:
+            # The test client re-raises what the app did not handle
+            status = 500
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        statuses.append(status)
+
+
+def bystander(done, latencies):
+    http = app.test_client()
+    while not done.is_set():
+        started = time.perf_counter()
+        http.get("/subscriptions")
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.02)
+
+
+def kill_workers_halfway(statuses):
+    while len(statuses) < LOGINS // 2:
+        time.sleep(0.01)
+    pool = hasher._pool
+    if pool is not None:
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+
+
+def p(values, q):
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)] * 1000
+
+
+with app.app_context():
+    seed()
+
+latencies, statuses, side = [], [], []
+done = threading.Event()
+senders = [threading.Thread(target=login, args=(k, LOGINS // SENDERS, latencies, statuses))
+           for k in range(SENDERS)]
+extras = [threading.Thread(target=bystander, args=(done, side))]
+if MODE == "pool":
+    extras.append(threading.Thread(target=kill_workers_halfway, args=(statuses,), daemon=True))
+
+started = time.perf_counter()
+for t in senders + extras:
+    t.start()
+for t in senders:
+    t.join()
+elapsed = time.perf_counter() - started
+done.set()
+
+ok = statuses.count(200)
+print(f"--- {len(statuses):,} logins from {SENDERS} senders, bcrypt cost {ROUNDS}, "
+      f"{'inline' if MODE == 'inline' else f'pool of {hasher.workers}, max pending {hasher.max_pending}'}")
+report("successful logins", ok / elapsed, "logins/s")
+report("successful login latency p50", p(latencies, 0.5))
+report("successful login latency p99", p(latencies, 0.99))
+report("GET /subscriptions latency p99 during the storm", p(side, 0.99))
+print(f"200 {ok:,}, 429 {statuses.count(429):,}, other {len(statuses) - ok - statuses.count(429):,}")
@@ -0,0 +1,62 @@
+"""
+extract('month'/'year') filters vs periods.in_period over 1M expenses and
+1M payments spread across two years: the month totals behind /expenses,
+the dashboard and the monthly report.
+
+    python bench/bench_periods.py [rows]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from common import best_of, insert_rows, report, use_database
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+path, exists = use_database(f"periods-{ROWS}")
+
+from sqlalchemy import extract, func, text  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Client, Expense, Payment, Subscription  # noqa: E402
+from periods import in_period  # noqa: E402
+
+START = datetime(2024, 1, 1)
+SPAN = 730 * 86400
+
+
+def seed():
+    rnd = random.Random(1)
+    db.create_all()
+    db.session.add(Subscription(name="Monthly", price=3000, duration_days=30))
+    db.session.add(Client(first_name="A", last_name="B", email="a@example.com", phone="0700000000", password_hash="x"))
+    db.session.commit()
+    insert_rows(Expense, (
+        {"expense": f"E{i % 50}", "cost": rnd.randint(10, 5000),
+         "created_at": START + timedelta(seconds=rnd.randrange(SPAN))}
+        for i in range(ROWS)
+    ))
+    insert_rows(Payment, (
+        {"client_id": 1, "subscription_id": 1, "amount": 3000, "phone_number": "0700000000",
+         "status": "Success", "method": "Cash", "created_at": START + timedelta(seconds=rnd.randrange(SPAN))}
+        for _ in range(ROWS)
+    ))
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def by_extract(column, year, month):
+    return (extract("month", column) == month) & (extract("year", column) == year)
+
+
+with app.app_context():
+    if not exists:
+        print(f"Seeding {ROWS:,} expenses and payments into {path} ...")
+        seed()
+
+    year, month = 2025, 3
+    for label, where in (("extract()", by_extract), ("in_period", lambda c, y, m: in_period(c, y, m))):
+        report(f"expense month total, {label}", best_of(lambda: db.session.query(
+            func.sum(Expense.cost)).filter(where(Expense.created_at, year, month)).scalar()))
+        report(f"expense month rows, {label}", best_of(lambda: Expense.query.filter(
+            where(Expense.created_at, year, month)).all(), repeat=3))
+        report(f"payment month total, {label}", best_of(lambda: db.session.query(
+            func.sum(Payment.amount)).filter(where(Payment.created_at, year, month)).scalar()))
@@ -0,0 +1,64 @@
+"""
+/clients search: the old four-column ilike('%term%') OR-scan vs
+search.search_clients (FTS5 prefix match, phone-prefix range) at 10k,
+100k and 1M clients. Both fetch the first 50 matches.
+
+    python bench/bench_search.py [sizes...]
+"""
+import random
+import sys
+
+from common import BENCH_DB_DIR, best_of, insert_rows, report, use_database
+
+SIZES = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+FIRST = ["Alice", "Brian", "Carol", "David", "Esther", "Faith", "George", "Hassan", "Irene", "James",
+         "Kevin", "Lucy", "Mercy", "Njeri", "Otieno", "Peter", "Quinn", "Rose", "Samuel", "Wanjiru"]
+LAST = ["Kamau", "Otieno", "Mwangi", "Achieng", "Kiptoo", "Wambui", "Ochieng", "Njoroge", "Mutua", "Chebet"]
+TERMS = [("name word", "wanj"), ("two words", "alice kam"), ("email fragment", "mwangi1234"), ("phone prefix", "0712")]
+
+# One process per database: the app binds its engine at import time
+if len(SIZES) > 1:
+    import subprocess
+    for size in SIZES:
+        subprocess.run([sys.executable, __file__, str(size)], check=True)
+    sys.exit()
+
+SIZE = SIZES[0]
+path, exists = use_database(f"search-{SIZE}")
+
+from sqlalchemy import or_, text  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Client  # noqa: E402
+from search import search_clients  # noqa: E402
+
+
+def seed():
+    rnd = random.Random(1)
+    db.create_all()
+    insert_rows(Client, (
+        {"first_name": rnd.choice(FIRST), "last_name": (last := rnd.choice(LAST)),
+         "email": f"{last.lower()}{i}@example.com", "phone": f"07{i:08d}",
+         "password_hash": "x", "status": "Active"}
+        for i in range(SIZE)
+    ), batch_size=20000)
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def ilike_search(term):
+    pattern = f"%{term}%"
+    return Client.query.filter(or_(
+        Client.first_name.ilike(pattern), Client.last_name.ilike(pattern),
+        Client.email.ilike(pattern), Client.phone.ilike(pattern)
+    ))
+
+
+with app.app_context():
+    if not exists:
+        print(f"Seeding {SIZE:,} clients into {BENCH_DB_DIR} ...")
+        seed()
+
+    print(f"--- {SIZE:,} clients")
+    for label, term in TERMS:
+        report(f"{label} '{term}', ilike", best_of(lambda: ilike_search(term).limit(50).all()))
+        report(f"{label} '{term}', search index", best_of(lambda: search_clients(Client.query, term).limit(50).all()))
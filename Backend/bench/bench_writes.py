@@ -0,0 +1,91 @@
+"""
+Concurrent writes against file SQLite: the tuned SQLITE_PRAGMAS defaults
+(WAL, synchronous NORMAL, mmap, 64 MB cache) vs SQLite's own defaults
+(DELETE journal, synchronous FULL, no mmap, 2 MB cache). Threads in app
+contexts run payment-shaped transactions for a few seconds: read a
+client, insert a payment, update the client, every third also an
+expense, then a small read. Reports commits/s and failed commits.
+
+    python bench/bench_writes.py [seconds] [threads...]
+"""
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from common import report, use_database
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+THREADS = [int(n) for n in sys.argv[2:] if n.isdigit()] or [1, 8, 32]
+MODE = sys.argv[-1] if sys.argv[-1] in ("baseline", "tuned") else None
+BASELINE = {
+    "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+    "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": "-2000",
+}
+
+# One process per run: pragmas are read from the environment at import time
+if MODE is None:
+    for threads in THREADS:
+        for mode in ("baseline", "tuned"):
+            subprocess.run([sys.executable, __file__, str(SECONDS), str(threads), mode], check=True)
+    sys.exit()
+
+use_database(f"writes-{MODE}", fresh=True, **(BASELINE if MODE == "baseline" else {}))
+
+from app import app  # noqa: E402
+from models import db, Client, Expense, Payment, Subscription  # noqa: E402
+
+CLIENTS = 50
+
+
+def seed():
+    db.create_all()
+    db.session.add(Subscription(name="Monthly", price=3000, duration_days=30))
+    db.session.add_all(
+        Client(first_name="F", last_name=str(i), email=f"c{i}@example.com", phone=f"07{i:08d}",
+               password_hash="x", status="Active", subscription_id=1)
+        for i in range(CLIENTS)
+    )
+    db.session.commit()
+
+
+def worker(n, stop, commits, errors):
+    with app.app_context():
+        i = 0
+        while time.perf_counter() < stop:
+            i += 1
+            try:
+                client = db.session.get(Client, (n * 7 + i) % CLIENTS + 1)
+                db.session.add(Payment(client_id=client.id, subscription_id=1, amount=3000,
+                                       phone_number=client.phone, status="Success", method="Cash"))
+                client.last_payment_date = datetime.utcnow()
+                client.last_payment_amount = 3000
+                if i % 3 == 0:
+                    db.session.add(Expense(expense="Water", cost=1))
+                db.session.commit()
+                commits[n] += 1
+            except Exception:
+                db.session.rollback()
+                errors[n] += 1
+            db.session.query(Payment.id).filter(Payment.client_id == n % CLIENTS + 1) \
+                .order_by(Payment.id.desc()).limit(10).all()
+            db.session.commit()
+        db.session.remove()
+
+
+with app.app_context():
+    seed()
+
+threads = THREADS[0]
+commits, errors = [0] * threads, [0] * threads
+stop = time.perf_counter() + SECONDS
+workers = [threading.Thread(target=worker, args=(n, stop, commits, errors)) for n in range(threads)]
+for t in workers:
+    t.start()
+for t in workers:
+    t.join()
+
+print(f"--- {MODE}, {threads} threads, {SECONDS:g}s")
+report("commits", sum(commits) / SECONDS, "commits/s")
+print(f"failed commits {sum(errors):,}")
@@ -0,0 +1,74 @@
+"""
+Shared setup for the benchmark scripts. Run them from Backend/, e.g.
+`python bench/bench_periods.py`. Databases are built once under
+BENCH_DB_DIR (default: <tmp>/fitflow-bench) and reused by later runs.
+"""
+import os
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DB_DIR = os.environ.get("BENCH_DB_DIR", os.path.join(tempfile.gettempdir(), "fitflow-bench"))
+
+
+def use_database(name, fresh=False, **env):
+    """
+    Point the app at bench database `name`; call before importing app.
+    Returns (path, exists) so the caller knows whether to seed it.
+    """
+    os.makedirs(BENCH_DB_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DB_DIR, f"{name}.db")
+    if fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    os.environ["DATABASE_URI"] = f"sqlite:///{path}"
+    os.environ.setdefault("MAIL_USERNAME", "")
+    os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+    os.environ.setdefault("QUERY_BUDGET_MODE", "off")
+    os.environ.update(env)
+    sys.path.insert(0, BACKEND)
+    return path, os.path.exists(path)
+
+
+def insert_rows(model, rows, batch_size=50000):
+    """executemany-insert an iterable of dicts, committing every batch."""
+    from sqlalchemy import insert
+    from models import db
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+
+
+def best_of(fn, repeat=5):
+    """Fastest of `repeat` timed runs, in milliseconds, after one warm-up."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def rss_mb(field="VmRSS"):
+    """Resident memory in MB; field="RssAnon" leaves out file-backed pages such as SQLite's mmap."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1]) // 1024
+    return 0
+
+
+def report(label, value, unit="ms"):
+    print(f"{label:58s} {value:10.1f} {unit}")
@@ -0,0 +1,145 @@
+"""
+Replays Daraja STK callbacks against /callback over HTTP and reports how
+fast they are acked (callbacks/s, p50/p99) and how long callback_processor
+takes to apply all of them. The mix is 90% paid, 5% cancelled and 5% with
+no matching payment (deferred for a retry). The app is served by a
+threaded werkzeug server in a child process so the senders do not share
+its GIL; with --in-process the senders call the app through Flask's test
+client instead, which leaves out HTTP and shows what the handler and the
+processor can take.
+
+    python bench/load_callbacks.py [callbacks] [senders] [--in-process]
+"""
+import json
+import logging
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from common import report, use_database
+
+CALLBACKS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+SENDERS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+SERVING = "--serve" in sys.argv[3:]
+IN_PROCESS = "--in-process" in sys.argv[3:]
+use_database("callbacks", fresh=not SERVING)
+
+import requests  # noqa: E402
+from app import app  # noqa: E402
+from common import insert_rows  # noqa: E402
+from models import db, Client, MpesaCallback, Payment, Subscription  # noqa: E402
+
+
+def serve():
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    logging.getLogger("mailer").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    server.daemon_threads = True
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def seed():
+    db.create_all()
+    db.session.add(Subscription(name="Monthly", price=3000, duration_days=30))
+    insert_rows(Client, (
+        {"first_name": "C", "last_name": str(i), "email": f"c{i}@example.com", "phone": f"07{i:08d}",
+         "password_hash": "x", "status": "Active", "subscription_id": 1}
+        for i in range(1000)
+    ))
+    insert_rows(Payment, (
+        {"client_id": i % 1000 + 1, "subscription_id": 1, "amount": 3000, "phone_number": "254700000000",
+         "status": "Pending", "method": "M-PESA", "checkout_response": f"ws_CO_{i}"}
+        for i in range(CALLBACKS)
+    ))
+
+
+def payloads():
+    rnd = random.Random(1)
+    for i in range(CALLBACKS):
+        roll = rnd.random()
+        # The last 5% name a CheckoutRequestID no payment carries
+        checkout_id = f"ws_CO_{i}" if roll < 0.95 else f"ws_CO_unknown_{i}"
+        result_code = 1032 if roll < 0.05 else 0
+        items = [{"Name": "Amount", "Value": 3000}, {"Name": "MpesaReceiptNumber", "Value": f"R{i:09d}"}]
+        yield json.dumps({"Body": {"stkCallback": {
+            "CheckoutRequestID": checkout_id, "ResultCode": result_code, "ResultDesc": "",
+            "CallbackMetadata": {"Item": items} if result_code == 0 else None,
+        }}})
+
+
+def send(url, bodies, latencies, failures):
+    session = app.test_client() if IN_PROCESS else requests.Session()
+    headers = {"Content-Type": "application/json"}
+    for body in bodies:
+        started = time.perf_counter()
+        response = session.post(url, data=body, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            failures.append(response.status_code)
+
+
+def settled():
+    """Callbacks applied, reconciled or deferred; everything once the processor is done."""
+    with app.app_context():
+        db.session.remove()
+        return MpesaCallback.query.filter(
+            db.or_(MpesaCallback.processed_at.isnot(None), MpesaCallback.retry_at.isnot(None))
+        ).count()
+
+
+if SERVING:
+    serve()
+    sys.exit()
+
+with app.app_context():
+    print(f"Seeding {CALLBACKS:,} pending payments ...")
+    seed()
+
+if IN_PROCESS:
+    logging.getLogger("mailer").setLevel(logging.ERROR)
+    server = None
+    url = "/callback"
+else:
+    server = subprocess.Popen([sys.executable, __file__, str(CALLBACKS), str(SENDERS), "--serve"],
+                              stdout=subprocess.PIPE, text=True)
+    url = f"http://127.0.0.1:{server.stdout.readline().strip()}/callback"
+try:
+
+    bodies = list(payloads())
+    latencies, failures = [], []
+    senders = [threading.Thread(target=send, args=(url, bodies[i::SENDERS], latencies, failures))
+               for i in range(SENDERS)]
+
+    started = time.perf_counter()
+    for t in senders:
+        t.start()
+    for t in senders:
+        t.join()
+    acked = time.perf_counter() - started
+
+    while settled() < CALLBACKS - len(failures):
+        time.sleep(0.05)
+    applied = time.perf_counter() - started
+finally:
+    if server:
+        server.terminate()
+
+with app.app_context():
+    paid = Payment.query.filter_by(status="Success").count()
+    deferred = MpesaCallback.query.filter(MpesaCallback.retry_at.isnot(None)).count()
+
+latencies.sort()
+print(f"--- {CALLBACKS:,} callbacks from {SENDERS} senders{' (in-process)' if IN_PROCESS else ''}")
+report("acked", CALLBACKS / acked, "cb/s")
+report("ack latency p50", latencies[len(latencies) // 2] * 1000)
+report("ack latency p99", latencies[int(len(latencies) * 0.99) - 1] * 1000)
+report("settled (first sent to last applied)", CALLBACKS / applied, "cb/s")
+print(f"payments paid {paid:,}, callbacks deferred for retry {deferred:,}, failed acks {len(failures):,}")
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from models import db, RevokedToken
+
+
+class MemoryBlocklist:
+    """Per-process store. Only suitable for a single worker or tests."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, jti, exp):
+        with self._lock:
+            now = time.time()
+            self._entries = {j: e for j, e in self._entries.items() if e > now}
+            self._entries[jti] = exp
+
+    def contains(self, jti):
+        exp = self._entries.get(jti)
+        return exp is not None and exp > time.time()
+
+
+class SQLBlocklist:
+    """Revoked jtis in the app database (token_blocklist), shared by every worker."""
+
+    def add(self, jti, exp):
+        now = datetime.utcnow()
+        RevokedToken.query.filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+        db.session.merge(RevokedToken(jti=jti, expires_at=datetime.utcfromtimestamp(exp)))
+        db.session.commit()
+
+    def contains(self, jti):
+        return db.session.query(
+            RevokedToken.query.filter(
+                RevokedToken.jti == jti,
+                RevokedToken.expires_at > datetime.utcnow()
+            ).exists()
+        ).scalar()
+
+
+class RedisBlocklist:
+    """Any Redis-protocol server; keys expire by themselves at the token's exp."""
+
+    def __init__(self, url, prefix="fitflow:revoked:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("JWT_BLOCKLIST_BACKEND=redis requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def add(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl > 0:
+            self._redis.set(self._prefix + jti, 1, ex=ttl)
+
+    def contains(self, jti):
+        return bool(self._redis.exists(self._prefix + jti))
+
+
+class Blocklist:
+    """
+    Front cache over a shared backend.
+    Revoked jtis are cached until their exp (a revocation never goes away);
+    "not revoked" answers are cached for a short TTL, which bounds how long a
+    token revoked on another worker can keep working here.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBlocklist()
+        self.negative_ttl = 2.0
+        self.max_entries = 10000
+        self._revoked = OrderedDict()
+        self._allowed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        kind = app.config.get("JWT_BLOCKLIST_BACKEND", "sql")
+        if kind == "memory":
+            self.backend = MemoryBlocklist()
+        elif kind == "sql":
+            self.backend = SQLBlocklist()
+        elif kind == "redis":
+            self.backend = RedisBlocklist(app.config["JWT_BLOCKLIST_REDIS_URL"])
+        else:
+            raise ValueError(f"Unknown JWT_BLOCKLIST_BACKEND: {kind}")
+
+        self.negative_ttl = float(app.config.get("JWT_BLOCKLIST_NEGATIVE_TTL", self.negative_ttl))
+        self.max_entries = int(app.config.get("JWT_BLOCKLIST_CACHE_SIZE", self.max_entries))
+        app.extensions["jwt_blocklist"] = self
+
+    def revoke(self, jti, exp):
+        self.backend.add(jti, exp)
+        with self._lock:
+            self._allowed.pop(jti, None)
+            self._remember(self._revoked, jti, exp)
+
+    def is_revoked(self, jti, exp):
+        now = time.time()
+
+        revoked_until = self._revoked.get(jti)
+        if revoked_until is not None and revoked_until > now:
+            return True
+
+        checked_until = self._allowed.get(jti)
+        if checked_until is not None and checked_until > now:
+            return False
+
+        revoked = self.backend.contains(jti)
+        with self._lock:
+            if revoked:
+                self._remember(self._revoked, jti, exp)
+            else:
+                self._remember(self._allowed, jti, now + self.negative_ttl)
+        return revoked
+
+    def _remember(self, cache, jti, until):
+        cache[jti] = until
+        cache.move_to_end(jti)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+
+blocklist = Blocklist()
@@ -0,0 +1,103 @@
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request
+from metrics import RequestStats, metrics
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "warn", "raise")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryBudgets:
+    """
+    Catches query-count regressions on the hot paths. Resources opt in with
+    @query_budget(n), the most statements a request may run, auth lookups
+    included; jobs run under query_budgets.guard(name, n). Within those,
+    any statement run QUERY_REPEAT_THRESHOLD or more times is reported as a
+    possible N+1, since a lazy load in a loop repeats the same SQL once per
+    row. Endpoints without a budget are not checked at all, so a poll or a
+    retry loop is never mistaken for an N+1.
+
+    QUERY_BUDGET_MODE is "warn" (log and count in /metrics), "raise" (for
+    CI: the request fails with QueryBudgetExceeded) or "off".
+    """
+
+    def __init__(self):
+        self.mode = "warn"
+        self.repeat_threshold = 5
+
+    def init_app(self, app):
+        self.mode = app.config.get("QUERY_BUDGET_MODE", self.mode)
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown QUERY_BUDGET_MODE: {self.mode}")
+        self.repeat_threshold = int(app.config.get("QUERY_REPEAT_THRESHOLD", self.repeat_threshold))
+        # Registered after metrics.init_app, so it runs first and g.request_stats is still set
+        app.after_request(self._after_request)
+        app.extensions["query_budgets"] = self
+
+    def check(self, name, stats, max_queries=None, allow_repeats=False):
+        if self.mode == "off":
+            return
+
+        problems = []
+        if max_queries is not None and stats.queries > max_queries:
+            problems.append(("budget", f"ran {stats.queries} queries, budget is {max_queries}"))
+        if not allow_repeats:
+            for statement, count in stats.statements.items():
+                if count >= self.repeat_threshold:
+                    problems.append(("repeated", f"ran the same statement {count} times "
+                                                 f"(possible N+1): {' '.join(statement.split())[:200]}"))
+
+        for kind, message in problems:
+            metrics.record_violation(name, kind)
+            logger.warning(f"{name} {message}")
+        if problems and self.mode == "raise":
+            raise QueryBudgetExceeded(f"{name} " + "; ".join(message for _, message in problems))
+
+    @contextmanager
+    def guard(self, name, max_queries=None, allow_repeats=False):
+        """Count the statements run inside the block (jobs, CLI commands) and check them."""
+        previous = g.pop("request_stats", None)
+        stats = g.request_stats = RequestStats()
+        try:
+            yield stats
+        finally:
+            g.pop("request_stats", None)
+            if previous is not None:
+                g.request_stats = previous
+        self.check(name, stats, max_queries, allow_repeats)
+
+    def _after_request(self, response):
+        # Once per request; Flask runs after_request again for the 500 when check() raises
+        stats = g.get("request_stats")
+        budget = g.get("query_budget")
+        if stats is not None and budget is not None and not g.get("query_budget_checked"):
+            g.query_budget_checked = True
+            max_queries, allow_repeats = budget
+            self.check(request.endpoint or "unmatched", stats, max_queries, allow_repeats)
+        return response
+
+
+query_budgets = QueryBudgets()
+
+
+def query_budget(max_queries=None, allow_repeats=False):
+    """
+    Most SQL statements one request to this resource may run; declaring a
+    budget also turns on N+1 detection for it. allow_repeats is for
+    endpoints that repeat a statement by design (chunked imports).
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            g.query_budget = (max_queries, allow_repeats)
+            return fn(*args, **kwargs)
+        # Outer @wraps decorators copy this along, so tests can find every budgeted resource
+        decorator.query_budget = (max_queries, allow_repeats)
+        return decorator
+    return wrapper
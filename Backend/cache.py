@@ -0,0 +1,142 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from flask import Response, request
+from serializers import dumps
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, tag):
+        return self._versions[tag]
+
+    def bump(self, tag):
+        with self._lock:
+            self._versions[tag] += 1
+
+
+class RedisCacheBackend:
+    """Shared between workers, so an invalidation on one is seen by all."""
+
+    def __init__(self, url, prefix="fitflow:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, json.dumps(value), ex=int(ttl))
+
+    def version(self, tag):
+        return int(self._redis.get(self._prefix + "v:" + tag) or 0)
+
+    def bump(self, tag):
+        self._redis.incr(self._prefix + "v:" + tag)
+
+
+class ResponseCache:
+    """
+    Caches serialized GET responses with an ETag.
+    Each cached endpoint names the data it depends on ("plans", "clients",
+    "payments", "expenses"). Writers call invalidate() with those names, which
+    bumps a version that is part of the cache key, so stale entries are never
+    read again and simply age out.
+    """
+
+    def __init__(self):
+        self.backend = MemoryCacheBackend()
+        self.default_ttl = 300
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def init_app(self, app):
+        kind = app.config.get("RESPONSE_CACHE_BACKEND", "memory")
+        if kind == "memory":
+            self.backend = MemoryCacheBackend(int(app.config.get("RESPONSE_CACHE_SIZE", 1000)))
+        elif kind == "redis":
+            self.backend = RedisCacheBackend(app.config["RESPONSE_CACHE_REDIS_URL"])
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {kind}")
+
+        self.default_ttl = float(app.config.get("RESPONSE_CACHE_TTL", self.default_ttl))
+        app.extensions["response_cache"] = self
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump(tag)
+
+    def stats(self):
+        names = set(self.hits) | set(self.misses)
+        return {
+            name: {
+                "hits": self.hits[name],
+                "misses": self.misses[name],
+                "hit_rate": round(self.hits[name] / ((self.hits[name] + self.misses[name]) or 1), 4),
+            }
+            for name in sorted(names)
+        }
+
+    def cached(self, name, depends_on=(), ttl=None):
+        def wrapper(fn):
+            @wraps(fn)
+            def decorator(*args, **kwargs):
+                versions = ".".join(f"{t}{self.backend.version(t)}" for t in depends_on)
+                key = f"{name}:{versions}"
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits[name] += 1
+                else:
+                    self.misses[name] += 1
+                    rv = fn(*args, **kwargs)
+                    payload, status = (rv[0], rv[1]) if isinstance(rv, tuple) else (rv, 200)
+                    if status != 200:
+                        return rv
+
+                    body = dumps(payload, sort_keys=True)
+                    entry = {"body": body.decode("utf-8"), "etag": hashlib.sha1(body).hexdigest()}
+                    self.backend.set(key, entry, ttl or self.default_ttl)
+
+                return _conditional_response(entry)
+            return decorator
+        return wrapper
+
+
+def _conditional_response(entry):
+    if request.if_none_match.contains(entry["etag"]):
+        response = Response(status=304)
+    else:
+        response = Response(entry["body"], mimetype="application/json")
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+response_cache = ResponseCache()
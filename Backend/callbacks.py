@@ -0,0 +1,372 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
+from models import db, Client, Payment, MpesaCallback
+from mailer import mailer
+import rollups
+from cache import response_cache
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCallback(ValueError):
+    pass
+
+
+class NeedsReconciliation(Exception):
+    """A callback that contradicts its payment; someone has to look at it."""
+
+    def __init__(self, code, detail):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+def parse_stk_callback(data):
+    """Pull the fields we reconcile on out of a Daraja stkCallback body."""
+    try:
+        body = data["Body"]["stkCallback"]
+        checkout_id = body["CheckoutRequestID"]
+        result_code = int(body["ResultCode"])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCallback("Malformed STK callback")
+
+    items = (body.get("CallbackMetadata") or {}).get("Item") or []
+    meta = {i.get("Name"): i.get("Value") for i in items if isinstance(i, dict)}
+
+    return {
+        "checkout_id": checkout_id,
+        "result_code": result_code,
+        "result_desc": body.get("ResultDesc"),
+        "receipt": meta.get("MpesaReceiptNumber"),
+        "amount": meta.get("Amount"),
+        "phone": meta.get("PhoneNumber"),
+    }
+
+
+class _Incoming:
+    """A callback waiting in ingest() for the group commit that stores it."""
+    __slots__ = ("checkout_id", "payload", "done", "stored", "error")
+
+    def __init__(self, checkout_id, payload):
+        self.checkout_id = checkout_id
+        self.payload = payload
+        self.done = False
+        self.stored = False
+        self.error = None
+
+
+class CallbackProcessor:
+    """
+    The /callback endpoint only stores the raw payload in mpesa_callbacks and
+    acks. A background thread applies stored callbacks to payments and clients
+    in batched transactions. A batch that fails is re-applied with one
+    savepoint per callback, so a bad row cannot sink the rest of it.
+
+    A callback that cannot be applied yet (no payment carries its
+    CheckoutRequestID, or applying it raised) is retried every retry_delay.
+    After max_attempts, or straight away when it contradicts the payment
+    (paid after being marked Failed, paid twice, receipt already used), it
+    is closed with a reconcile_reason, logged as an error and counted in
+    fitflow_mpesa_callback_reconciliations_total.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 200
+        self.poll_interval = 5
+        self.coalesce_delay = 0.2
+        self.max_attempts = 5
+        self.retry_delay = timedelta(seconds=60)
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ingest_cond = threading.Condition()
+        self._ingest_queue = []
+        self._ingest_writing = False
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = int(app.config.get("MPESA_CALLBACK_BATCH_SIZE", self.batch_size))
+        self.max_attempts = int(app.config.get("MPESA_CALLBACK_MAX_ATTEMPTS", self.max_attempts))
+        self.retry_delay = timedelta(seconds=int(app.config.get(
+            "MPESA_CALLBACK_RETRY_SECONDS", self.retry_delay.total_seconds())))
+        app.extensions["mpesa_callbacks"] = self
+
+    def ingest(self, data):
+        """
+        Persist a callback. Returns False for a duplicate CheckoutRequestID,
+        which Safaricom sends when it retries delivery.
+
+        Concurrent callers share one INSERT and one commit (group commit):
+        the first caller in writes everything queued so far while the others
+        wait for their row to be durable. A single writer per process also
+        keeps request threads from fighting over SQLite's write lock.
+        """
+        parsed = parse_stk_callback(data)
+        incoming = _Incoming(parsed["checkout_id"], json.dumps(data))
+
+        with self._ingest_cond:
+            self._ingest_queue.append(incoming)
+            while not incoming.done and self._ingest_writing:
+                self._ingest_cond.wait()
+            if not incoming.done:
+                self._ingest_writing = True
+                batch, self._ingest_queue = self._ingest_queue, []
+
+        if not incoming.done:
+            try:
+                self._store(batch)
+            finally:
+                with self._ingest_cond:
+                    self._ingest_writing = False
+                    self._ingest_cond.notify_all()
+
+        if incoming.error:
+            raise incoming.error
+        if incoming.stored:
+            self._ensure_started()
+            self._wake.set()
+        return incoming.stored
+
+    def _store(self, batch):
+        try:
+            dialect = db.session.get_bind().dialect.name
+            insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            stmt = (
+                insert(MpesaCallback)
+                .on_conflict_do_nothing(index_elements=["checkout_request_id"])
+                .returning(MpesaCallback.checkout_request_id)
+            )
+            inserted = set(db.session.scalars(stmt, [
+                {"checkout_request_id": i.checkout_id, "payload": i.payload} for i in batch
+            ]))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for incoming in batch:
+                incoming.error = e
+        else:
+            for incoming in batch:
+                # A redelivery inside the same batch counts as the duplicate
+                incoming.stored = incoming.checkout_id in inserted
+                inserted.discard(incoming.checkout_id)
+        for incoming in batch:
+            incoming.done = True
+
+    def _ensure_started(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name="mpesa-callbacks", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if self._wake.wait(timeout=self.poll_interval):
+                # Let a burst build up so it is applied in a few full batches, not many tiny ones
+                time.sleep(self.coalesce_delay)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+            except Exception:
+                logger.exception("Applying M-PESA callbacks failed")
+
+    def drain(self):
+        """Apply stored callbacks until none are due. Returns how many were read."""
+        applied = 0
+        while True:
+            try:
+                count = self._apply_batch()
+            finally:
+                db.session.remove()
+            if count is None:
+                continue
+            if count == 0:
+                return applied
+            applied += count
+
+    def _apply_batch(self):
+        now = datetime.utcnow()
+        rows = (
+            MpesaCallback.query
+            .filter(
+                MpesaCallback.processed_at.is_(None),
+                db.or_(MpesaCallback.retry_at.is_(None), MpesaCallback.retry_at <= now)
+            )
+            .order_by(MpesaCallback.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        if not rows:
+            return 0
+
+        # Claim the batch first; if another worker got to any of it, back off and re-read
+        ids = [r.id for r in rows]
+        claimed = (
+            MpesaCallback.query
+            .filter(MpesaCallback.id.in_(ids), MpesaCallback.processed_at.is_(None))
+            .update({MpesaCallback.processed_at: now}, synchronize_session=False)
+        )
+        if claimed != len(ids):
+            db.session.rollback()
+            return None
+
+        callbacks = [parse_stk_callback(json.loads(r.payload)) for r in rows]
+        checkout_ids = [c["checkout_id"] for c in callbacks]
+        receipts = [c["receipt"] for c in callbacks if c["receipt"]]
+
+        payments = {
+            p.checkout_response: p
+            for p in Payment.query
+            .options(joinedload(Payment.subscription))
+            .filter(Payment.checkout_response.in_(checkout_ids))
+            .all()
+        }
+        seen_receipts = set()
+        if receipts:
+            seen_receipts = {
+                r for (r,) in db.session.query(Payment.mpesa_receipt)
+                .filter(Payment.mpesa_receipt.in_(receipts))
+            }
+
+        client_ids = {p.client_id for p in payments.values()}
+        clients = {
+            c.id: c for c in Client.query.filter(Client.id.in_(client_ids)).all()
+        } if client_ids else {}
+
+        applied = None
+        try:
+            # Common case: the whole batch in one savepoint, one flush, one upsert per rollup cell
+            with rollups.deferred(), db.session.begin_nested():
+                applied = self._apply_rows(rows, callbacks, payments, clients, set(seen_receipts), now)
+        except Exception:
+            logger.exception("Applying M-PESA callback batch failed; retrying one callback at a time")
+        if applied is None:
+            # Give each callback its own savepoint so only the bad ones are held back
+            with rollups.deferred():
+                applied = self._apply_rows(rows, callbacks, payments, clients, seen_receipts, now, isolate=True)
+        receipts_to_send, retry, reconcile = applied
+
+        for row, code, detail in retry:
+            if row.attempts + 1 >= self.max_attempts:
+                reconcile.append((row, code, detail))
+            else:
+                self._defer(row, now)
+        for row, code, detail in reconcile:
+            self._reconcile(row, code, detail)
+
+        db.session.commit()
+        response_cache.invalidate("payments", "clients")
+
+        for to_email, message in receipts_to_send:
+            mailer.enqueue(to_email, "Subscription Payment Successful", message)
+
+        return len(rows)
+
+    def _apply_rows(self, rows, callbacks, payments, clients, seen_receipts, now, isolate=False):
+        """
+        Apply each callback to its payment. Returns (receipts to send, rows to
+        retry, rows to reconcile); the last two hold (row, code, detail).
+        With isolate, a callback that raises is rolled back on its own and
+        retried later; without it the exception propagates.
+        """
+        receipts, retry, reconcile = [], [], []
+        for row, cb in zip(rows, callbacks):
+            payment = payments.get(cb["checkout_id"])
+            if payment is None:
+                # The callback can beat the STK worker's write of the CheckoutRequestID
+                retry.append((row, "unmatched", f"No payment for CheckoutRequestID {cb['checkout_id']}"))
+                continue
+            client = clients.get(payment.client_id)
+            try:
+                if isolate:
+                    with rollups.deferred(), db.session.begin_nested():
+                        receipt = self._apply(cb, payment, client, seen_receipts, now)
+                else:
+                    receipt = self._apply(cb, payment, client, seen_receipts, now)
+            except NeedsReconciliation as e:
+                reconcile.append((row, e.code, e.detail))
+                continue
+            except Exception as e:
+                if not isolate:
+                    raise
+                logger.exception(f"Applying M-PESA callback {row.id} failed")
+                retry.append((row, "error", f"{type(e).__name__}: {e}"))
+                continue
+            if receipt:
+                receipts.append(receipt)
+        return receipts, retry, reconcile
+
+    def _apply(self, cb, payment, client, seen_receipts, now):
+        """
+        Apply one callback to its payment. Returns the receipt email to send,
+        if any; raises NeedsReconciliation, before changing anything, when the
+        callback contradicts the payment.
+        """
+        if payment.status != "Pending":
+            if cb["result_code"] != 0 or cb["receipt"] == payment.mpesa_receipt:
+                return None  # late failure or a repeat of the callback we applied
+            if payment.status == "Success":
+                raise NeedsReconciliation("paid_twice", f"Receipt {cb['receipt']} for payment {payment.id}, "
+                                                        f"already paid with {payment.mpesa_receipt}")
+            raise NeedsReconciliation("paid_after_failure", f"Receipt {cb['receipt']} for payment {payment.id} "
+                                                            f"marked {payment.status}")
+
+        if cb["result_code"] != 0:
+            payment.status = "Failed"
+            rollups.record_payment(payment, previous_status="Pending")
+            return None
+
+        if cb["receipt"] in seen_receipts:
+            raise NeedsReconciliation("duplicate_receipt",
+                                      f"Receipt {cb['receipt']} already recorded; payment {payment.id}")
+        seen_receipts.add(cb["receipt"])
+
+        amount = float(cb["amount"]) if cb["amount"] is not None else payment.amount
+        pending_amount = payment.amount
+        payment.status = "Success"
+        payment.mpesa_receipt = cb["receipt"]
+        payment.amount = amount
+        rollups.record_payment(payment, previous_status="Pending", previous_amount=pending_amount)
+
+        if not client:
+            return None
+        new_expiry = client.apply_payment(payment.subscription, now, amount)
+        # Build the receipt now; attributes expire on commit
+        return (
+            client.email,
+            f"Hi {client.first_name},\n\n"
+            f"Your payment of KES {amount:.2f} via M-PESA was successful.\n"
+            f"Mpesa Receipt: {cb['receipt']}\n\n"
+            f"Your {payment.subscription.name} subscription is now valid until {new_expiry.strftime('%Y-%m-%d')}.\n\n"
+            f"Thank you for staying with us!\nFitFlow Gym"
+        )
+
+    def _defer(self, row, now):
+        # The claim was a bulk UPDATE, so reset processed_at the same way
+        MpesaCallback.query.filter_by(id=row.id).update({
+            MpesaCallback.processed_at: None,
+            MpesaCallback.attempts: MpesaCallback.attempts + 1,
+            MpesaCallback.retry_at: now + self.retry_delay,
+        }, synchronize_session=False)
+
+    def _reconcile(self, row, code, detail):
+        logger.error(f"M-PESA callback {row.id} needs reconciliation ({code}): {detail}")
+        metrics.record_callback_reconciliation(code)
+        MpesaCallback.query.filter_by(id=row.id).update({
+            MpesaCallback.attempts: MpesaCallback.attempts + 1,
+            MpesaCallback.reconcile_reason: f"{code}: {detail}"[:200],
+        }, synchronize_session=False)
+
+
+callback_processor = CallbackProcessor()
@@ -7,9 +7,47 @@ load_dotenv()
 # Get the base directory
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the backend `uri` points at."""
+    pool = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    }
+    if uri and uri.startswith("sqlite"):
+        # In-memory SQLite gets a StaticPool from Flask-SQLAlchemy, which takes no sizing
+        if uri.rstrip("/") == "sqlite:" or ":memory:" in uri:
+            return {}
+        # Local file: nothing to ping or recycle; lock waits are busy_timeout's job
+        return pool
+    return {
+        **pool,
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Optional read replica for the heavy admin reads (replicas.py)
+    DATABASE_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URI')
+    SQLALCHEMY_BINDS = {
+        "replica": {"url": DATABASE_REPLICA_URI, **engine_options(DATABASE_REPLICA_URI)}
+    } if DATABASE_REPLICA_URI else {}
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 5))
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+    # Applied to every new SQLite connection (database.py)
+    SQLITE_PRAGMAS = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),  # negative means KiB
+    }
     SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     # CORS configuration
     CORS_HEADERS = 'Content-Type'
@@ -17,16 +55,71 @@ class Config:
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access' , 'refresh']
+    # memory | sql | redis
+    JWT_BLOCKLIST_BACKEND = os.getenv("JWT_BLOCKLIST_BACKEND", "sql")
+    JWT_BLOCKLIST_REDIS_URL = os.getenv("JWT_BLOCKLIST_REDIS_URL", "redis://localhost:6379/0")
+    JWT_BLOCKLIST_NEGATIVE_TTL = float(os.getenv("JWT_BLOCKLIST_NEGATIVE_TTL", 2.0))
+    JWT_BLOCKLIST_CACHE_SIZE = int(os.getenv("JWT_BLOCKLIST_CACHE_SIZE", 10000))
+    PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+
+    # Response cache: memory | redis
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 1))
+    BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 4 * (os.cpu_count() or 1)))
 
 
 
+    # Rows per validate/lookup/insert round in bulk client imports
+    CLIENT_IMPORT_CHUNK_SIZE = int(os.getenv("CLIENT_IMPORT_CHUNK_SIZE", 500))
+
+    # Rows fetched per round-trip by the streaming exports
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+    # Scheduled jobs (run with `flask --app app run-scheduler`)
+    SCHEDULER_API_ENABLED = os.getenv("SCHEDULER_API_ENABLED", "False") == "True"
+    SCHEDULER_EMBEDDED = os.getenv("SCHEDULER_EMBEDDED", "False") == "True"
+    SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", 60))
+    SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", 3600))
+    SCHEDULER_HISTORY_DAYS = int(os.getenv("SCHEDULER_HISTORY_DAYS", 30))
+
+    # /metrics and per-request profiling (metrics.py); /metrics is not served without a token
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False") == "True"
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    # Query budgets and N+1 detection (budgets.py): off | warn | raise (CI)
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+    QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+
     # Optional: Enable debug mode via .env
     DEBUG = os.getenv('FLASK_DEBUG', 'False') == 'True'
 
+    # Outbound mail
+    MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "True") == "True"
+    MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+    MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", 2))
+    MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+    MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 3))
+    MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 1.0))
+
     # M-PESA
     MPESA_ENV = os.getenv("MPESA_ENV", "sandbox")
     MPESA_CONSUMER_KEY = os.getenv("MPESA_CONSUMER_KEY")
     MPESA_CONSUMER_SECRET = os.getenv("MPESA_CONSUMER_SECRET")
     MPESA_SHORTCODE = os.getenv("MPESA_SHORTCODE")
     MPESA_PASSKEY = os.getenv("MPESA_PASSKEY")
-    MPESA_CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
\ No newline at end of file
+    MPESA_CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
+    STK_PUSH_WORKERS = int(os.getenv("STK_PUSH_WORKERS", 4))
+    MPESA_CALLBACK_BATCH_SIZE = int(os.getenv("MPESA_CALLBACK_BATCH_SIZE", 200))
+    MPESA_CALLBACK_MAX_ATTEMPTS = int(os.getenv("MPESA_CALLBACK_MAX_ATTEMPTS", 5))
+    MPESA_CALLBACK_RETRY_SECONDS = int(os.getenv("MPESA_CALLBACK_RETRY_SECONDS", 60))
\ No newline at end of file
@@ -0,0 +1,28 @@
+from functools import partial
+from sqlalchemy import event
+from models import db
+
+
+def apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """
+    Tune SQLite connections as the pool opens them. WAL lets readers run
+    alongside the single writer, and busy_timeout makes writers queue for
+    the lock instead of failing with "database is locked".
+    """
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", partial(apply_pragmas, pragmas))
@@ -0,0 +1,100 @@
+import csv
+import io
+from datetime import datetime
+from sqlalchemy import select
+from models import db, Client, Expense, Payment, Subscription
+from periods import in_days
+from serializers import dumps
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class InvalidExport(ValueError):
+    pass
+
+
+def _clients():
+    stmt = (
+        select(
+            Client.id, Client.first_name, Client.last_name, Client.email, Client.phone,
+            Client.status, Subscription.name.label("subscription"), Client.subscription_expiry,
+            Client.last_payment_date, Client.last_payment_amount, Client.created_at
+        )
+        .outerjoin(Subscription, Client.subscription_id == Subscription.id)
+        .order_by(Client.id)
+    )
+    return stmt, Client.created_at, Client.status
+
+
+def _payments():
+    stmt = (
+        select(
+            Payment.id, Payment.created_at, Payment.client_id, Client.email.label("client_email"),
+            Subscription.name.label("subscription"), Payment.amount, Payment.method,
+            Payment.status, Payment.mpesa_receipt, Payment.phone_number
+        )
+        .join(Client, Payment.client_id == Client.id)
+        .join(Subscription, Payment.subscription_id == Subscription.id)
+        .order_by(Payment.id)
+    )
+    return stmt, Payment.created_at, Payment.status
+
+
+def _expenses():
+    stmt = select(Expense.id, Expense.created_at, Expense.expense, Expense.cost).order_by(Expense.id)
+    return stmt, Expense.created_at, None
+
+
+# dataset -> () -> (select, date column, status column or None)
+DATASETS = {"clients": _clients, "payments": _payments, "expenses": _expenses}
+
+
+def build_export(dataset, start=None, end=None, statuses=None):
+    """
+    Column-only select for one dataset, filtered to created_at in
+    [start, end] (end is a whole day) and to any of `statuses`.
+    """
+    if dataset not in DATASETS:
+        raise InvalidExport(f"Unknown export: {dataset}")
+
+    stmt, date_column, status_column = DATASETS[dataset]()
+    try:
+        stmt = stmt.where(in_days(date_column, start, end))
+    except ValueError as e:
+        raise InvalidExport(str(e))
+    if statuses:
+        if status_column is None:
+            raise InvalidExport(f"{dataset} have no status to filter on")
+        stmt = stmt.where(status_column.in_(statuses))
+    return stmt
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_export(stmt, fmt, batch_size=1000):
+    """
+    Yield the export as text chunks, one per `batch_size` rows.
+    yield_per keeps a server-side cursor open (postgres) and never builds
+    ORM objects, so memory stays flat however many rows there are.
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    columns = list(result.keys())
+    try:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for rows in result.partitions():
+                writer.writerows([_cell(v) for v in row] for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+    finally:
+        result.close()
@@ -0,0 +1,125 @@
+from calendar import month_name
+from datetime import date, datetime
+from sqlalchemy import extract, func, select
+from models import db, Client, Expense, Payment, Subscription
+from pagination import InvalidCursor, clamp_limit, decode_cursor, encode_cursor, keyset_after
+from periods import in_days, in_period
+
+EXPENSE_GROUPS = ("category", "month", "week")
+
+
+def week_start(column):
+    """Monday of the week `column` falls in, computed by the database."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("week", column)
+    # SQLite: forward to Sunday (same day if Sunday), then back to its Monday
+    return func.date(column, "weekday 0", "-6 days")
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def expense_totals(year, month=None):
+    """(total cost, number of expenses) for a year or one month."""
+    total, count = db.session.query(
+        func.coalesce(func.sum(Expense.cost), 0), func.count(Expense.id)
+    ).filter(in_period(Expense.created_at, year, month)).one()
+    return total, count
+
+
+def expenses_by(group, year, month=None):
+    """
+    Expense totals for a year or month, grouped in SQL by category (the
+    expense name), calendar month or week (keyed by its Monday).
+    A whole-year month breakdown includes empty months as zeros.
+    """
+    if group == "category":
+        key = Expense.expense
+    elif group == "month":
+        key = extract("month", Expense.created_at)
+    else:
+        key = week_start(Expense.created_at)
+
+    rows = (
+        db.session.query(key.label("key"), func.sum(Expense.cost), func.count(Expense.id))
+        .filter(in_period(Expense.created_at, year, month))
+        .group_by(key)
+        .order_by(func.sum(Expense.cost).desc() if group == "category" else key)
+        .all()
+    )
+
+    if group == "category":
+        return [{"category": k, "total": t, "count": c} for k, t, c in rows]
+    if group == "week":
+        return [{"week_start": _day(k), "total": t, "count": c} for k, t, c in rows]
+
+    totals = {int(k): (t, c) for k, t, c in rows}
+    months = [month] if month else range(1, 13)
+    return [
+        {"month": m, "name": month_name[m], "total": totals.get(m, (0, 0))[0], "count": totals.get(m, (0, 0))[1]}
+        for m in months
+    ]
+
+
+def payment_rows():
+    """Payments with client and plan names from one join, never per-row loads."""
+    return (
+        select(
+            Payment.id, Payment.created_at, Payment.client_id,
+            (Client.first_name + " " + Client.last_name).label("client_name"),
+            Payment.subscription_id, Subscription.name.label("plan"),
+            Payment.amount, Payment.method, Payment.status,
+            Payment.mpesa_receipt, Payment.phone_number
+        )
+        .join(Client, Payment.client_id == Client.id)
+        .join(Subscription, Payment.subscription_id == Subscription.id)
+    )
+
+
+def filter_payments(stmt, statuses=None, methods=None, plan=None, start=None, end=None):
+    """Ledger filters; raises ValueError for a malformed date."""
+    if statuses:
+        stmt = stmt.where(Payment.status.in_(statuses))
+    if methods:
+        stmt = stmt.where(Payment.method.in_(methods))
+    if plan:
+        stmt = stmt.where(Subscription.name == plan)
+    return stmt.where(in_days(Payment.created_at, start, end))
+
+
+def newest_first_after(cursor, created_at, id_column):
+    """
+    Keyset condition for the rows after `cursor` in newest-first
+    (created_at, id) order. Raises InvalidCursor.
+    """
+    created, last_id = decode_cursor(cursor, 2)
+    try:
+        after = [datetime.fromisoformat(created), int(last_id)]
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    return keyset_after([created_at, id_column], after, descending=True)
+
+
+def newest_first_page(stmt, limit=None, cursor=None):
+    """
+    One keyset page of payment rows, newest first on (created_at, id).
+    Returns (rows, next_cursor); raises InvalidCursor.
+    """
+    if cursor:
+        stmt = stmt.where(newest_first_after(cursor, Payment.created_at, Payment.id))
+
+    limit = clamp_limit(limit)
+    rows = db.session.execute(
+        stmt.order_by(Payment.created_at.desc(), Payment.id.desc()).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,157 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MailDispatcher:
+    """
+    Background outbound mail queue.
+    Request handlers only enqueue; worker threads each hold one authenticated
+    SMTP connection and drain the queue in batches over it.
+    """
+
+    def __init__(self):
+        self.host = "smtp.gmail.com"
+        self.port = 587
+        self.use_tls = True
+        self.username = None
+        self.password = None
+        self.workers = 2
+        self.batch_size = 20
+        self.max_retries = 3
+        self.retry_backoff = 1.0
+        self.idle_timeout = 30
+        self._queue = queue.Queue(maxsize=1000)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.host = app.config.get("MAIL_SERVER", self.host)
+        self.port = int(app.config.get("MAIL_PORT", self.port))
+        self.use_tls = bool(app.config.get("MAIL_USE_TLS", self.use_tls))
+        self.username = app.config.get("MAIL_USERNAME")
+        self.password = app.config.get("MAIL_PASSWORD")
+        self.workers = int(app.config.get("MAIL_WORKERS", self.workers))
+        self.batch_size = int(app.config.get("MAIL_BATCH_SIZE", self.batch_size))
+        self.max_retries = int(app.config.get("MAIL_MAX_RETRIES", self.max_retries))
+        self.retry_backoff = float(app.config.get("MAIL_RETRY_BACKOFF", self.retry_backoff))
+        self._queue = queue.Queue(maxsize=int(app.config.get("MAIL_QUEUE_SIZE", 1000)))
+        app.extensions["mailer"] = self
+
+    @property
+    def configured(self):
+        return bool(self.username and self.password)
+
+    def enqueue(self, to_email, subject, message, block=False, timeout=None, on_sent=None):
+        """
+        Queue a plaintext email. Returns False when creds are missing or the queue is full.
+        Pass block=True from background jobs to wait for room instead of dropping.
+        on_sent() is called from the worker thread once the server has accepted the message.
+        """
+        if not self.configured:
+            logger.warning("Email creds missing; skipping email send.")
+            return False
+
+        self._ensure_started()
+        try:
+            self._queue.put((to_email, subject, message, on_sent), block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            logger.error(f"Mail queue full; dropping email to {to_email}")
+            return False
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"mailer-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.username, self.password)
+        return server
+
+    def _close(self, server):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _build(self, to_email, subject, message):
+        msg = MIMEMultipart()
+        msg["From"] = self.username
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        msg.attach(MIMEText(message, "plain"))
+        return msg.as_string()
+
+    def _run(self):
+        server = None
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Don't hold the connection open while idle; SMTP servers drop it anyway
+                self._close(server)
+                server = None
+                continue
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for to_email, subject, message, on_sent in batch:
+                server, sent = self._deliver(server, to_email, subject, message)
+                if sent and on_sent is not None:
+                    try:
+                        on_sent()
+                    except Exception:
+                        logger.exception(f"Delivery callback for {to_email} failed")
+                self._queue.task_done()
+
+    def _deliver(self, server, to_email, subject, message):
+        body = self._build(to_email, subject, message)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timed("smtp"):
+                    if server is None:
+                        server = self._connect()
+                    server.sendmail(self.username, to_email, body)
+                return server, True
+            except smtplib.SMTPRecipientsRefused as e:
+                logger.error(f"Email to {to_email} refused: {e}")
+                return server, False
+            except (smtplib.SMTPException, OSError) as e:
+                self._close(server)
+                server = None
+                if attempt == self.max_retries:
+                    logger.error(f"Email failed: {e}")
+                    return None, False
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        return server, False
+
+
+mailer = MailDispatcher()
@@ -0,0 +1,253 @@
+import cProfile
+import hmac
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestStats:
+    """
+    What one request (or guarded job, see budgets.py) spent its time on;
+    kept on g.request_stats. `statements` counts each distinct SQL string.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.external = defaultdict(float)
+
+
+class Metrics:
+    """
+    Per-endpoint request latency, SQL statement count and time (from cursor
+    events on every engine), and time in external calls (smtp, daraja,
+    bcrypt) wrapped in metrics.timed(). Exposed in the Prometheus text
+    format on /metrics, which is only registered when METRICS_TOKEN is set
+    and wants it as a bearer token. Counters are per process, so scrape
+    each worker.
+
+    With PROFILING_ENABLED, a request sent with "X-Profile: cprofile" (or
+    "pyinstrument", when installed) is profiled and the dump written to
+    PROFILE_DIR; the file name comes back in X-Profile-File.
+    """
+
+    def __init__(self):
+        self.profiling = False
+        self.profile_dir = "profiles"
+        self.token = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def init_app(self, app, db):
+        self.profiling = bool(app.config.get("PROFILING_ENABLED", self.profiling))
+        self.profile_dir = app.config.get("PROFILE_DIR", self.profile_dir)
+        self.token = app.config.get("METRICS_TOKEN") or None
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+                event.listen(engine, "handle_error", self._handle_error)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.token:
+            app.add_url_rule("/metrics", "metrics", self.view)
+        else:
+            logger.info("METRICS_TOKEN is not set; /metrics is not served")
+        app.extensions["metrics"] = self
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(Histogram)           # (endpoint, method)
+            self.responses = defaultdict(int)               # (endpoint, method, status)
+            self.sql_queries = defaultdict(int)             # endpoint
+            self.sql_seconds = defaultdict(float)           # endpoint
+            self.request_external = defaultdict(float)      # (endpoint, service)
+            self.external = defaultdict(Histogram)          # service
+            self.query_violations = defaultdict(int)        # (endpoint, kind)
+            self.callback_reconciliations = defaultdict(int)  # reason
+
+    @contextmanager
+    def timed(self, service):
+        """Time an external call; also charged to the current request, if any."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.external[service].observe(elapsed)
+            if has_app_context() and "request_stats" in g:
+                g.request_stats.external[service] += elapsed
+
+    def record_violation(self, endpoint, kind):
+        with self._lock:
+            self.query_violations[endpoint, kind] += 1
+
+    def record_callback_reconciliation(self, reason):
+        with self._lock:
+            self.callback_reconciliations[reason] += 1
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", {})[id(cursor)] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop(id(cursor))
+        if has_app_context() and "request_stats" in g:
+            g.request_stats.queries += 1
+            g.request_stats.sql_seconds += elapsed
+            g.request_stats.statements[statement] += 1
+
+    def _handle_error(self, context):
+        # after_cursor_execute does not fire for a failed statement
+        if context.connection is not None and context.execution_context is not None:
+            context.connection.info.get("query_started", {}).pop(id(context.execution_context.cursor), None)
+
+    def _before_request(self):
+        g.request_stats = RequestStats()
+        if self.profiling and request.headers.get("X-Profile"):
+            g.profiler = self._start_profiler(request.headers["X-Profile"])
+
+    def _after_request(self, response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            response.headers["X-Profile-File"] = self._dump_profile(profiler)
+
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            self.latency[endpoint, request.method].observe(elapsed)
+            self.responses[endpoint, request.method, response.status_code] += 1
+            self.sql_queries[endpoint] += stats.queries
+            self.sql_seconds[endpoint] += stats.sql_seconds
+            for service, seconds in stats.external.items():
+                self.request_external[endpoint, service] += seconds
+        return response
+
+    def _teardown_request(self, exc):
+        # After an unhandled exception after_request may not have run; never leave a profiler on
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            self._dump_profile(profiler)
+
+    def _start_profiler(self, kind):
+        if kind == "pyinstrument" and pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _dump_profile(self, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f"{request.endpoint or 'unmatched'}-{time.strftime('%Y%m%dT%H%M%S')}-{time.perf_counter_ns() % 10**6}"
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = os.path.join(self.profile_dir, name + ".prof")
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = os.path.join(self.profile_dir, name + ".html")
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+        logger.info(f"Profile written to {path}")
+        return os.path.basename(path)
+
+    def view(self):
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _histograms(lines, "fitflow_request_duration_seconds", "Request latency by endpoint.",
+                        ("endpoint", "method"), self.latency)
+            _counter(lines, "fitflow_responses_total", "Responses by endpoint and status.",
+                     ("endpoint", "method", "status"), self.responses)
+            _counter(lines, "fitflow_sql_queries_total", "SQL statements executed while serving the endpoint.",
+                     ("endpoint",), self.sql_queries)
+            _counter(lines, "fitflow_sql_seconds_total", "Time in SQL statements while serving the endpoint.",
+                     ("endpoint",), self.sql_seconds)
+            _counter(lines, "fitflow_request_external_seconds_total",
+                     "Time in external calls while serving the endpoint.",
+                     ("endpoint", "service"), self.request_external)
+            _histograms(lines, "fitflow_external_call_duration_seconds",
+                        "External call latency (smtp, daraja, bcrypt), including background workers.",
+                        ("service",), self.external)
+            _counter(lines, "fitflow_query_violations_total",
+                     "Query budget overruns and repeated statements (possible N+1).",
+                     ("endpoint", "kind"), self.query_violations)
+            _counter(lines, "fitflow_mpesa_callback_reconciliations_total",
+                     "M-PESA callbacks that could not be applied and need manual reconciliation.",
+                     ("reason",), self.callback_reconciliations)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not isinstance(values, tuple):
+        values = (values,)
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _counter(lines, name, help, label_names, values):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} counter")
+    for key in sorted(values, key=str):
+        lines.append(f"{name}{_labels(label_names, key)} {values[key]}")
+
+
+def _histograms(lines, name, help, label_names, histograms):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for key in sorted(histograms, key=str):
+        histogram = histograms[key]
+        labels = _labels(label_names, key)[:-1]
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{labels}}} {cumulative}")
+
+
+metrics = Metrics()
@@ -0,0 +1,32 @@
+"""Retry and reconciliation state for mpesa_callbacks
+
+Revision ID: 1aa224198d43
+Revises: f76cbbe2cdcc
+Create Date: 2026-10-18 18:02:51.987403
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1aa224198d43'
+down_revision = 'f76cbbe2cdcc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mpesa_callbacks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('retry_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('reconcile_reason', sa.String(length=200), nullable=True))
+        batch_op.create_index(batch_op.f('ix_mpesa_callbacks_reconcile_reason'), ['reconcile_reason'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mpesa_callbacks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mpesa_callbacks_reconcile_reason'))
+        batch_op.drop_column('reconcile_reason')
+        batch_op.drop_column('retry_at')
+        batch_op.drop_column('attempts')
@@ -0,0 +1,25 @@
+"""Rename the plan_members rollup to plan_payments
+
+It counts successful payments per plan, not members.
+
+Revision ID: 1f255015b0f6
+Revises: 1aa224198d43
+Create Date: 2026-10-18 19:40:12.118305
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1f255015b0f6'
+down_revision = '1aa224198d43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE monthly_rollups SET metric = 'plan_payments' WHERE metric = 'plan_members'")
+
+
+def downgrade():
+    op.execute("UPDATE monthly_rollups SET metric = 'plan_members' WHERE metric = 'plan_payments'")
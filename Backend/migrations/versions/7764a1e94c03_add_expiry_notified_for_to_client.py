@@ -0,0 +1,26 @@
+"""Add expiry_notified_for to Client
+
+Revision ID: 7764a1e94c03
+Revises: 6bc9ea384b1b
+Create Date: 2026-10-18 09:12:40.218351
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7764a1e94c03'
+down_revision = '6bc9ea384b1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expiry_notified_for', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_column('expiry_notified_for')
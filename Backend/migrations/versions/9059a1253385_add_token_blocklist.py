@@ -0,0 +1,33 @@
+"""Add token_blocklist
+
+Revision ID: 9059a1253385
+Revises: 927e378e7852
+Create Date: 2026-10-18 12:58:31.104477
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9059a1253385'
+down_revision = '927e378e7852'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_blocklist',
+    sa.Column('jti', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_blocklist_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_blocklist_expires_at'))
+
+    op.drop_table('token_blocklist')
@@ -0,0 +1,43 @@
+"""Add mpesa_callbacks inbox
+
+Revision ID: 927e378e7852
+Revises: b642764cca2e
+Create Date: 2026-10-18 12:14:09.552870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '927e378e7852'
+down_revision = 'b642764cca2e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mpesa_callbacks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('checkout_request_id', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('received_at', sa.DateTime(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('checkout_request_id')
+    )
+    with op.batch_alter_table('mpesa_callbacks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mpesa_callbacks_processed_at'), ['processed_at'], unique=False)
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_payments_checkout_response'), ['checkout_response'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payments_checkout_response'))
+
+    with op.batch_alter_table('mpesa_callbacks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mpesa_callbacks_processed_at'))
+
+    op.drop_table('mpesa_callbacks')
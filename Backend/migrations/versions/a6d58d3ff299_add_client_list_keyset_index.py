@@ -0,0 +1,26 @@
+"""Add client list keyset index
+
+Revision ID: a6d58d3ff299
+Revises: de4a98b54b8f
+Create Date: 2026-10-18 10:25:17.903518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d58d3ff299'
+down_revision = 'de4a98b54b8f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.create_index('ix_clients_first_name_id', ['first_name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_index('ix_clients_first_name_id')
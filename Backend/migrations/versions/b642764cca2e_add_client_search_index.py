@@ -0,0 +1,75 @@
+"""Add client search index
+
+Revision ID: b642764cca2e
+Revises: a6d58d3ff299
+Create Date: 2026-10-18 11:02:48.335190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b642764cca2e'
+down_revision = 'a6d58d3ff299'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+        first_name, last_name, email, phone,
+        content='clients', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF first_name, last_name, email, phone ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+        INSERT INTO clients_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    "INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS clients_fts_au",
+    "DROP TRIGGER IF EXISTS clients_fts_ad",
+    "DROP TRIGGER IF EXISTS clients_fts_ai",
+    "DROP TABLE IF EXISTS clients_fts",
+]
+
+TRGM_COLUMNS = ['first_name', 'last_name', 'email', 'phone']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name in TRGM_COLUMNS:
+            op.create_index(
+                f'ix_clients_{name}_trgm', 'clients', [name],
+                postgresql_using='gin',
+                postgresql_ops={name: 'gin_trgm_ops'}
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        for name in TRGM_COLUMNS:
+            op.drop_index(f'ix_clients_{name}_trgm', table_name='clients')
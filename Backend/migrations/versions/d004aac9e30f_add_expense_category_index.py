@@ -0,0 +1,26 @@
+"""Index expenses.expense for name lookups and category totals
+
+Revision ID: d004aac9e30f
+Revises: 9cea1a2bb2b3
+Create Date: 2026-10-18 17:32:46.671704
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd004aac9e30f'
+down_revision = '9cea1a2bb2b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_expenses_expense'), ['expense'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_expenses_expense'))
@@ -0,0 +1,52 @@
+"""Add indexes for hot lookup columns
+
+Revision ID: de4a98b54b8f
+Revises: 7764a1e94c03
+Create Date: 2026-10-18 09:40:05.671204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'de4a98b54b8f'
+down_revision = '7764a1e94c03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_clients_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_clients_subscription_expiry'), ['subscription_expiry'], unique=False)
+        batch_op.create_index(batch_op.f('ix_clients_subscription_id'), ['subscription_id'], unique=False)
+
+    with op.batch_alter_table('subscriptions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_subscriptions_name'), ['name'], unique=False)
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_payments_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_payments_created_at'), ['created_at'], unique=False)
+        batch_op.create_index('ix_payments_client_id_created_at', ['client_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_expenses_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_expenses_created_at'))
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_payments_client_id_created_at')
+        batch_op.drop_index(batch_op.f('ix_payments_created_at'))
+        batch_op.drop_index(batch_op.f('ix_payments_status'))
+
+    with op.batch_alter_table('subscriptions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_subscriptions_name'))
+
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clients_subscription_id'))
+        batch_op.drop_index(batch_op.f('ix_clients_subscription_expiry'))
+        batch_op.drop_index(batch_op.f('ix_clients_status'))
@@ -0,0 +1,32 @@
+"""Add monthly_rollups
+
+Revision ID: e9ed6804f71c
+Revises: 9059a1253385
+Create Date: 2026-10-18 13:47:22.630918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9ed6804f71c'
+down_revision = '9059a1253385'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill afterwards with: flask rebuild-rollups
+    op.create_table('monthly_rollups',
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=40), nullable=False),
+    sa.Column('dimension', sa.String(length=60), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('year', 'month', 'metric', 'dimension')
+    )
+
+
+def downgrade():
+    op.drop_table('monthly_rollups')
@@ -0,0 +1,28 @@
+"""Add payments.idempotency_key, unique per client
+
+Revision ID: f76cbbe2cdcc
+Revises: d004aac9e30f
+Create Date: 2026-10-18 18:00:19.821999
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f76cbbe2cdcc'
+down_revision = 'd004aac9e30f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_payments_client_id_idempotency_key', ['client_id', 'idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_payments_client_id_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
@@ -1,16 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData  
-from datetime import datetime
-from app import bcrypt
+from datetime import datetime, timedelta
+import auth
+import serializers
+from replicas import RoutingSession
 
 metadata = MetaData(naming_convention={
+    "ix": "ix_%(column_0_label)s",
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"
 })
 
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={"class_": RoutingSession})
 
 class Client(db.Model):
     __tablename__ = "clients"
+    __table_args__ = (
+        db.Index("ix_clients_first_name_id", "first_name", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(150), nullable=False)
@@ -18,29 +24,41 @@ class Client(db.Model):
     email = db.Column(db.String(150), unique=True, nullable=False)
     phone = db.Column(db.String(12), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
-    status = db.Column(db.String)
+    status = db.Column(db.String, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_payment_date = db.Column(db.DateTime)
     last_payment_amount = db.Column(db.Float)
         
     
-    subscription_id = db.Column(db.Integer, db.ForeignKey('subscriptions.id'))
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscriptions.id'), index=True)
     subscription = db.relationship('Subscription', backref='clients')
 
-    subscription_expiry = db.Column(db.DateTime, nullable=True)
+    subscription_expiry = db.Column(db.DateTime, nullable=True, index=True)
+    # The subscription_expiry we last sent an "expired" email for
+    expiry_notified_for = db.Column(db.DateTime, nullable=True)
+
+    def apply_payment(self, subscription, paid_at, amount):
+        """
+        Extend the subscription for a successful payment: from the current expiry
+        if it is still running, otherwise from the payment date. Returns the new expiry.
+        """
+        today = paid_at.date()
+        if self.subscription_expiry and self.subscription_expiry.date() >= today:
+            base_dt = self.subscription_expiry
+        else:
+            base_dt = datetime.combine(today, datetime.min.time())
+
+        new_expiry = base_dt + timedelta(days=subscription.duration_days)
+
+        self.subscription = subscription
+        self.subscription_expiry = new_expiry
+        self.status = "Active"
+        self.last_payment_date = paid_at
+        self.last_payment_amount = amount
+        return new_expiry
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "email": self.email,
-            "phone": self.phone,
-            "status": self.status,
-            "subscription": self.subscription.name if self.subscription else None,
-            "subscription_expiry": self.subscription_expiry.isoformat() if self.subscription_expiry else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+        return serializers.client.dump(self, serializers.CLIENT_FIELDS)
 
     def __repr__(self):
         return f"<Client {self.id} - {self.email}>"
@@ -49,23 +67,23 @@ class Subscription(db.Model):
     __tablename__ = 'subscriptions'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)  
+    name = db.Column(db.String, nullable=False, index=True)
     price = db.Column(db.Float, nullable=False)
     duration_days = db.Column(db.Integer, nullable=False) 
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "price": self.price,
-            "duration_days": self.duration_days,
-        }
+        return serializers.subscription.dump(self)
 
     def __repr__(self):
         return f"<Subscription {self.name} - {self.price}>"
 
 class Payment(db.Model):
     __tablename__ = "payments"
+    __table_args__ = (
+        db.Index("ix_payments_client_id_created_at", "client_id", "created_at"),
+        # One payment per client-supplied Idempotency-Key
+        db.UniqueConstraint("client_id", "idempotency_key", name="uq_payments_client_id_idempotency_key"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey("clients.id"), nullable=False)
@@ -74,24 +92,17 @@ class Payment(db.Model):
     amount = db.Column(db.Float, nullable=False)
     mpesa_receipt = db.Column(db.String(120), unique=True, nullable=True)
     phone_number = db.Column(db.String(20), nullable=False)
-    status = db.Column(db.String(20), default="Pending")  # Pending, Success, Failed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default="Pending", index=True)  # Pending, Success, Failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     method = db.Column(db.String(20), nullable=False)
-    checkout_response =db.Column(db.String(100), nullable=True)
+    checkout_response =db.Column(db.String(100), nullable=True, index=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)
 
     client = db.relationship("Client", backref="payments")
     subscription = db.relationship("Subscription")
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "client_id": self.client_id,
-            "subscription_id": self.subscription_id,
-            "amount": self.amount,
-            "mpesa_receipt": self.mpesa_receipt,
-            "status": self.status,
-            "created_at": self.created_at.isoformat(),
-            }
+        return serializers.payment.dump(self, serializers.PAYMENT_FIELDS)
     
     def __repr__(self):
         return f"<Payment {self.id} - {self.amount}>"
@@ -106,31 +117,104 @@ class Admin(db.Model):
 
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = auth.hash_password(password)
     
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)   
+        return auth.check_password(password, self.password_hash)
     
     def __repr__(self):
         return f"<Admin {self.name}>"
     
     def to_dict(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            "name": self.name
-        }
+        return serializers.admin.dump(self)
     
 class Expense(db.Model):
     __tablename__ = "expenses"
 
     id = db.Column(db.Integer, primary_key=True)
-    expense = db.Column(db.String, nullable = False)
+    expense = db.Column(db.String, nullable = False, index=True)
     cost = db.Column(db.Integer, nullable = False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f"<Expense {self.expense} - {self.cost}>"
 
 
+class MpesaCallback(db.Model):
+    """
+    Durable inbox for Daraja STK callbacks; rows are applied to payments in batches.
+    A row that could not be applied is retried after retry_at; once out of
+    attempts it is closed with a reconcile_reason for someone to look at.
+    """
+    __tablename__ = "mpesa_callbacks"
+
+    id = db.Column(db.Integer, primary_key=True)
+    checkout_request_id = db.Column(db.String(100), unique=True, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    retry_at = db.Column(db.DateTime, nullable=True)
+    reconcile_reason = db.Column(db.String(200), nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<MpesaCallback {self.checkout_request_id}>"
+
+
+class RevokedToken(db.Model):
+    """JWT blocklist entry; rows past expires_at are dead and get purged."""
+    __tablename__ = "token_blocklist"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
+
+
+class MonthlyRollup(db.Model):
+    """Pre-aggregated monthly figures, maintained by rollups.py on every write."""
+    __tablename__ = "monthly_rollups"
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(40), primary_key=True)
+    dimension = db.Column(db.String(60), primary_key=True, default="")
+    value = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MonthlyRollup {self.year}-{self.month:02d} {self.metric}[{self.dimension}]={self.value}>"
+
+
+class SchedulerLock(db.Model):
+    """Leader lease: the process whose row is unexpired runs the scheduled jobs."""
+    __tablename__ = "scheduler_locks"
+
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SchedulerLock {self.name} held by {self.owner}>"
+
+
+class JobRun(db.Model):
+    """One execution of a scheduled job, kept for SCHEDULER_HISTORY_DAYS."""
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        db.Index("ix_job_runs_job_id_started_at", "job_id", "started_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    owner = db.Column(db.String(255))
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    duration_ms = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False)
+    error = db.Column(db.Text)
+
+    def to_dict(self):
+        return serializers.job_run.dump(self)
+
+    def __repr__(self):
+        return f"<JobRun {self.job_id} {self.status} {self.duration_ms}ms>"
@@ -12,17 +12,148 @@ CALLBACK_URL = config("MPESA_CALLBACK_URL")  # e.g., https://yourdomain/api/mpes
 
 BASE_URL = "https://sandbox.safaricom.co.ke"  # Use sandbox first
 
-import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from metrics import metrics
 
-def generate_access_token():
-    consumer_key = "YOUR_CONSUMER_KEY"
-    consumer_secret = "YOUR_CONSUMER_SECRET"
-    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
+# (connect, read) seconds, so a slow Safaricom response can't pin a worker
+TIMEOUT = (
+    config("MPESA_CONNECT_TIMEOUT", default=3.05, cast=float),
+    config("MPESA_READ_TIMEOUT", default=15, cast=float),
+)
+POOL_SIZE = config("MPESA_POOL_SIZE", default=10, cast=int)
+
+
+class MpesaUnavailable(Exception):
+    """Daraja is unreachable, erroring, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast until
+    `reset_timeout` has passed, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Cheap pre-check for callers that want to fail fast without using up the trial call."""
+        with self._lock:
+            return self._opened_at is None or time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(
+    failure_threshold=config("MPESA_BREAKER_THRESHOLD", default=5, cast=int),
+    reset_timeout=config("MPESA_BREAKER_RESET", default=30, cast=float),
+)
+
+# Shared keep-alive pool; only idempotent GETs (the OAuth call) are retried
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=POOL_SIZE,
+    # Wait for a free connection rather than opening throwaway extras past the cap
+    pool_block=True,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    ),
+))
+
+def daraja_request(method, url, **kwargs):
+    if not breaker.allow():
+        raise MpesaUnavailable("M-PESA is temporarily unavailable")
 
-    response = requests.get(url, auth=HTTPBasicAuth(consumer_key, consumer_secret))
+    try:
+        with metrics.timed("daraja"):
+            response = session.request(method, url, timeout=TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        breaker.record_failure()
+        raise MpesaUnavailable(str(e)) from e
+
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise MpesaUnavailable(f"Daraja returned {response.status_code}")
+
+    breaker.record_success()
+    return response
+
+# Daraja tokens live for an hour; refresh this many seconds before they lapse
+TOKEN_REFRESH_MARGIN = 60
+
+_token_lock = threading.Lock()
+_cached_token = None
+_token_expires_at = 0.0
+
+def fetch_access_token():
+    """One OAuth round-trip to Daraja. Returns (token, expires_in seconds)."""
+    url = f"{BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
+
+    response = daraja_request("GET", url, auth=HTTPBasicAuth(CONSUMER_KEY, CONSUMER_SECRET))
     json_response = response.json()
-    return json_response["access_token"]
+    return json_response["access_token"], int(json_response.get("expires_in", 3599))
+
+def generate_access_token():
+    """
+    Cached access token. Concurrent callers share a single in-flight refresh:
+    whoever takes the lock fetches, the rest wait and reuse its result.
+    """
+    global _cached_token, _token_expires_at
+
+    token = _cached_token
+    if token and time.monotonic() < _token_expires_at:
+        return token
+
+    with _token_lock:
+        if _cached_token and time.monotonic() < _token_expires_at:
+            return _cached_token
+
+        token, expires_in = fetch_access_token()
+        _cached_token = token
+        _token_expires_at = time.monotonic() + max(expires_in - TOKEN_REFRESH_MARGIN, 0)
+        return token
+
+def invalidate_access_token():
+    global _cached_token, _token_expires_at
+
+    with _token_lock:
+        _cached_token = None
+        _token_expires_at = 0.0
 
 def lipa_na_mpesa(phone_number, amount, account_reference="FitFlow Subscription", description="Subscription Payment"):
     token = generate_access_token()
@@ -44,5 +175,12 @@ def lipa_na_mpesa(phone_number, amount, account_reference="FitFlow Subscription"
     }
 
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(f"{BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
+    response = daraja_request("POST", f"{BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
+
+    # Token revoked or expired early on Daraja's side: refresh once and retry
+    if response.status_code == 401:
+        invalidate_access_token()
+        headers = {"Authorization": f"Bearer {generate_access_token()}"}
+        response = daraja_request("POST", f"{BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
+
     return response.json()
@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+import secrets
+import string
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy.exc import IntegrityError
+from auth import hasher
+from mailer import mailer
+from models import db, Client, Subscription
+from principals import Principal, identity_claims
+
+REQUIRED_FIELDS = ("first_name", "last_name", "email", "phone")
+# Text fields and their column lengths; anything else in a JSON row (objects, numbers) is rejected
+TEXT_FIELDS = {"first_name": 150, "last_name": 150, "email": 150, "status": 20, "subscription": 150}
+FORMATS = ("csv", "json", "ndjson")
+
+
+class InvalidImport(ValueError):
+    """The import stream itself is unreadable (bad format, bad JSON)."""
+
+
+def generate_password(length=10):
+    chars = string.ascii_letters + string.digits + "!@#$%^&*"
+    return ''.join(secrets.choice(chars) for _ in range(length))
+
+
+def send_welcome_email(client_id, email, first_name, password, block=False):
+    """Queue the welcome email with a temporary password and a 1-hour reset link."""
+    reset_token = create_access_token(
+        identity=email,
+        additional_claims=identity_claims("client", Principal("client", client_id, email)),
+        expires_delta=timedelta(hours=1)
+    )
+    reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
+
+    return mailer.enqueue(
+        email,
+        "Welcome to FitFlow - Set Your Password",
+        f"""
+                Hi {first_name},
+
+                🎉 Welcome to FitFlow! Your account has been created.
+
+                👉 Temporary password: {password}
+
+                Please use this temporary password to log in.
+                For security, we recommend you set your own password using the link below (expires in 1 hour):
+
+                {reset_link}
+
+                Thank you for joining us!
+
+                Kind regards,
+                FitFlow Management
+                """,
+        block=block
+    )
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per client from a binary CSV, JSON array or NDJSON stream."""
+    if fmt not in FORMATS:
+        raise InvalidImport(f"Unsupported format: {fmt}")
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(text)
+        elif fmt == "ndjson":
+            for line in text:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            rows = json.load(text)
+            if not isinstance(rows, list):
+                raise InvalidImport("JSON body must be an array of clients")
+            yield from rows
+    except (json.JSONDecodeError, UnicodeDecodeError, csv.Error) as e:
+        raise InvalidImport(f"Could not read {fmt} input: {e}")
+
+
+class ClientImport:
+    """
+    Creates clients from a stream of rows, `chunk_size` at a time.
+    Per chunk: validate every row, find existing emails/phones with one query,
+    hash all temporary passwords as one batch on the process pool, insert with
+    a single executemany and commit. Welcome emails are queued after the
+    commit. `results` holds one entry per input row, in input order.
+
+    With wait_for_mail the import waits for room in the mail queue (CLI
+    imports go at the mailer's pace); otherwise a full queue drops the
+    email and the row is reported with welcome_queued False, so an HTTP
+    request never stalls behind the mailer.
+    """
+
+    def __init__(self, chunk_size=500, send_welcome=True, wait_for_mail=False):
+        self.chunk_size = chunk_size
+        self.send_welcome = send_welcome
+        self.wait_for_mail = wait_for_mail
+        self.results = []
+        self._seen_emails = set()
+        self._seen_phones = set()
+        self._plans = {s.name: s for s in Subscription.query.all()}
+
+    def run(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self.results
+
+    def summary(self):
+        created = sum(1 for r in self.results if r["status"] == "created")
+        summary = {
+            "rows": len(self.results),
+            "created": created,
+            "failed": len(self.results) - created,
+        }
+        if self.send_welcome:
+            summary["welcome_not_queued"] = sum(1 for r in self.results if r.get("welcome_queued") is False)
+        return summary
+
+    def _import_chunk(self, rows):
+        first_row = len(self.results) + 1
+        results = [{"row": first_row + i, "status": "error"} for i in range(len(rows))]
+        self.results.extend(results)
+
+        now = datetime.utcnow()
+        valid = []
+        for row, result in zip(rows, results):
+            client, error = self._validate(row, now)
+            if error:
+                result["error"] = error
+            else:
+                valid.append((client, result))
+
+        # One set-based lookup for the whole chunk
+        emails = [c["email"] for c, _ in valid]
+        phones = [c["phone"] for c, _ in valid]
+        taken = db.session.query(Client.email, Client.phone).filter(
+            db.or_(Client.email.in_(emails), Client.phone.in_(phones))
+        ).all() if valid else []
+        taken_emails = {e for e, _ in taken}
+        taken_phones = {p for _, p in taken}
+
+        new = []
+        for client, result in valid:
+            if client["email"] in taken_emails:
+                result["error"] = "Email already in use"
+            elif client["phone"] in taken_phones:
+                result["error"] = "Phone number already in use"
+            else:
+                new.append((client, result))
+        if not new:
+            return
+
+        passwords = [generate_password() for _ in new]
+        for (client, _), password_hash in zip(new, hasher.hash_many(passwords)):
+            client["password_hash"] = password_hash
+
+        mappings = [client for client, _ in new]
+        try:
+            db.session.bulk_insert_mappings(Client, mappings, return_defaults=True)
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent insert; the rows can simply be resubmitted
+            db.session.rollback()
+            for _, result in new:
+                result["error"] = "Email or phone already in use, retry this row"
+            return
+
+        for (client, result), password in zip(new, passwords):
+            result.update(status="created", id=client["id"])
+            result.pop("error", None)
+            if self.send_welcome:
+                result["welcome_queued"] = send_welcome_email(
+                    client["id"], client["email"], client["first_name"], password, block=self.wait_for_mail
+                )
+
+    def _validate(self, row, now):
+        if not isinstance(row, dict):
+            return None, "Row must be an object"
+
+        data = {k: v.strip() if isinstance(v, str) else v for k, v in row.items()}
+        missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+        if missing:
+            return None, f"Missing required fields: {', '.join(missing)}"
+
+        for field, max_length in TEXT_FIELDS.items():
+            value = data.get(field)
+            if value in (None, ""):
+                continue
+            if not isinstance(value, str):
+                return None, f"{field} must be text"
+            if len(value) > max_length:
+                return None, f"{field} must be at most {max_length} characters"
+
+        email, phone = data["email"], data["phone"]
+        if "@" not in email:
+            return None, "Invalid email format"
+        if not isinstance(phone, str) or not phone.isdigit() or not 10 <= len(phone) <= 12:
+            return None, "Phone number must be 10 to 12 digits"
+        if email in self._seen_emails:
+            return None, "Duplicate email in import"
+        if phone in self._seen_phones:
+            return None, "Duplicate phone in import"
+
+        subscription = None
+        if data.get("subscription"):
+            subscription = self._plans.get(data["subscription"])
+            if subscription is None:
+                return None, "Invalid subscription name"
+
+        self._seen_emails.add(email)
+        self._seen_phones.add(phone)
+        return {
+            "first_name": data["first_name"],
+            "last_name": data["last_name"],
+            "email": email,
+            "phone": phone,
+            "status": data.get("status") or "Active",
+            "subscription_id": subscription.id if subscription else None,
+            "subscription_expiry": now + timedelta(days=subscription.duration_days) if subscription else None,
+            "created_at": now,
+        }, None
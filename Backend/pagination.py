@@ -0,0 +1,47 @@
+import base64
+import json
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    raw = json.dumps(values, default=lambda v: v.isoformat(), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, size):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def clamp_limit(limit, default=DEFAULT_PAGE_SIZE):
+    if not limit:
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_after(columns, values, descending=False):
+    """
+    Rows strictly after `values` in (col1, col2, ...) order:
+    (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...
+    With descending=True the comparisons flip, for newest-first pages.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal_prefix, column < value if descending else column > value))
+    return or_(*clauses)
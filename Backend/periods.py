@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, true
+
+# The period's end (January 1st of year + 1) must still be a valid datetime
+MIN_YEAR, MAX_YEAR = 1, 9998
+
+
+def check_period(year, month=None):
+    """ValueError with a client-facing message for an out-of-range year or month."""
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"year must be between {MIN_YEAR} and {MAX_YEAR}")
+    if month is not None and not 1 <= month <= 12:
+        raise ValueError("month must be between 1 and 12")
+
+
+def period_range(year, month=None):
+    """
+    Half-open [start, end) datetimes for a calendar month,
+    or for the whole year when month is None.
+    """
+    check_period(year, month)
+    if month is None:
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def in_period(column, year, month=None):
+    """
+    Index-friendly filter on a datetime column,
+    replacing extract('month'/'year', column) comparisons.
+    """
+    start, end = period_range(year, month)
+    return and_(column >= start, column < end)
+
+
+def parse_day(value, name):
+    """datetime from an ISO date query argument; the ValueError names the argument."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an ISO date, e.g. 2025-01-31")
+
+
+def in_days(column, start=None, end=None):
+    """
+    Filter on a datetime column for optional ISO-date bounds, both inclusive;
+    `end` covers its whole day.
+    """
+    clauses = []
+    if start:
+        clauses.append(column >= parse_day(start, "start"))
+    if end:
+        clauses.append(column < parse_day(end, "end") + timedelta(days=1))
+    return and_(true(), *clauses)
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from models import db, Admin, Client
+
+Principal = namedtuple("Principal", ["role", "id", "email"])
+
+MODELS = {"admin": Admin, "client": Client}
+
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of (role, email) -> Principal, so authorization does not
+    hit the database on every request. Writers that change or delete an
+    account call invalidate() once their change is committed; other workers
+    pick the change up within `ttl`.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get("PRINCIPAL_CACHE_TTL", self.ttl))
+        self.max_entries = int(app.config.get("PRINCIPAL_CACHE_SIZE", self.max_entries))
+        app.extensions["principal_cache"] = self
+
+    def get(self, role, email):
+        entry = self._entries.get((role, email))
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def put(self, principal):
+        key = (principal.role, principal.email)
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, role, email):
+        with self._lock:
+            self._entries.pop((role, email), None)
+
+
+principal_cache = PrincipalCache()
+
+
+def identity_claims(role, user):
+    """Extra claims for create_access_token so role checks need no lookup."""
+    return {"role": role, "uid": user.id}
+
+
+def load_principal(role):
+    """
+    Principal for the current token. With role/uid claims it is built from
+    the token; the database (or the cache) only confirms the account still
+    exists under that email, by primary key.
+    """
+    claims = get_jwt()
+    # Tokens issued before role claims existed fall through to the lookup
+    if claims.get("role") not in (None, role):
+        return None
+
+    email = get_jwt_identity()
+    uid = claims.get("uid")
+    principal = principal_cache.get(role, email)
+    # A token naming another account id under this email (forged, or issued
+    # to a deleted account whose email was reused) is checked, not trusted
+    if principal is not None and (uid is None or uid == principal.id):
+        return principal
+
+    model = MODELS[role]
+    if uid is not None:
+        row = db.session.query(model.email).filter_by(id=uid).first()
+        if row is None or row.email != email:
+            return None
+        principal = Principal(role, uid, email)
+    else:
+        row = db.session.query(model.id).filter_by(email=email).first()
+        if row is None:
+            return None
+        principal = Principal(role, row.id, email)
+
+    principal_cache.put(principal)
+    return principal
+
+
+def current_principal():
+    return g.principal
+
+
+def _role_required(role, error, status):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            verify_jwt_in_request()
+            principal = load_principal(role)
+            if principal is None:
+                return {"error": error}, status
+            g.principal = principal
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def admin_required():
+    return _role_required("admin", "Unauthorized, admin access required", 403)
+
+
+def client_required():
+    return _role_required("client", "Client not found", 404)
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+from cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to the "replica" bind while g.db_replica is set (see
+    replica_reads); flushes and INSERT/UPDATE/DELETE always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and has_app_context()
+            and g.get("db_replica")
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Decides per request whether the replica may serve reads. It will not if
+    no replica is configured, if the last probe found it unreachable or
+    lagging more than REPLICA_MAX_LAG seconds, or if the caller wrote within
+    REPLICA_STICKY_SECONDS (read-after-write goes to the primary). Sticky
+    marks live in the response cache backend, so with redis they are seen
+    by every worker.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self.sticky_seconds = 5.0
+        self._healthy = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.max_lag = float(app.config.get("REPLICA_MAX_LAG", self.max_lag))
+        self.check_interval = float(app.config.get("REPLICA_LAG_CHECK_INTERVAL", self.check_interval))
+        self.sticky_seconds = float(app.config.get("REPLICA_STICKY_SECONDS", self.sticky_seconds))
+        app.extensions["replica_router"] = self
+
+    @property
+    def configured(self):
+        return REPLICA_BIND in self.app.config.get("SQLALCHEMY_BINDS", {})
+
+    def available_for(self, principal=None):
+        if not self.configured:
+            return False
+        if principal is not None and response_cache.backend.get(self._sticky_key(principal)):
+            return False
+        return self.healthy()
+
+    def healthy(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._healthy = self._probe()
+                    self._checked_at = time.monotonic()
+        return self._healthy
+
+    def mark_write(self, principal):
+        response_cache.backend.set(self._sticky_key(principal), 1, self.sticky_seconds)
+
+    def lag(self):
+        """Replication delay in seconds; 0 for backends that cannot report it."""
+        engine = self.db.engines[REPLICA_BIND]
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                # NULL when nothing has been replayed yet (or not a standby)
+                value = conn.execute(text(
+                    "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+                )).scalar()
+                return float(value or 0)
+            conn.execute(text("SELECT 1"))
+            return 0.0
+
+    def _probe(self):
+        try:
+            lag = self.lag()
+        except SQLAlchemyError:
+            logger.exception("Read replica unreachable, reading from the primary")
+            return False
+        if lag > self.max_lag:
+            logger.warning(f"Read replica is {lag:.1f}s behind, reading from the primary")
+            return False
+        return True
+
+    def _sticky_key(self, principal):
+        return f"primary-reads:{principal.role}:{principal.id}"
+
+
+replica = ReplicaRouter()
+
+
+def replica_reads():
+    """Serve this resource's reads from the replica when it is fresh enough."""
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            g.db_replica = replica.available_for(g.get("principal"))
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+@contextmanager
+def replica_session():
+    """Replica reads for code outside a request, e.g. scheduled reports."""
+    g.db_replica = replica.available_for()
+    try:
+        yield
+    finally:
+        g.db_replica = False
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def record_write(session, flush_context):
+    # The next reads by this principal must see what they just wrote
+    if has_app_context() and g.get("principal") is not None and replica.configured:
+        replica.mark_write(g.principal)
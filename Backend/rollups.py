@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import extract, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Expense, Payment, MonthlyRollup
+from periods import in_period
+
+# Metrics kept per (year, month). `dimension` is "" unless noted.
+EXPENSES = "expenses"            # sum of Expense.cost
+EARNINGS = "earnings"            # sum of successful Payment.amount
+PAYMENTS = "payments"            # count, dimension "<method>:<status>"
+PAYMENT_AMOUNT = "payment_amount"  # sum, dimension "<method>:<status>"
+PLAN_PAYMENTS = "plan_payments"  # count of successful payments, dimension subscription_id
+
+
+def bump(when, metric, delta, dimension=""):
+    """Add `delta` to one rollup cell inside the caller's transaction."""
+    if not delta:
+        return
+
+    key = (when.year, when.month, metric, dimension)
+    pending = db.session.info.get("rollup_cells")
+    if pending is not None:
+        pending[key] = pending.get(key, 0) + delta
+        return
+    _write({key: delta})
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the bumps made inside the block and write each cell once, summed,
+    when it exits cleanly; an exception discards them. Nested blocks hand
+    their cells to the enclosing one, so a batch can defer per item and
+    only pay for one upsert per cell.
+    """
+    outer = db.session.info.get("rollup_cells")
+    cells = db.session.info["rollup_cells"] = {}
+    try:
+        yield
+    finally:
+        db.session.info["rollup_cells"] = outer
+    if outer is None:
+        _write(cells)
+    else:
+        for key, delta in cells.items():
+            outer[key] = outer.get(key, 0) + delta
+
+
+def _write(cells):
+    rows = [
+        {"year": year, "month": month, "metric": metric, "dimension": dimension, "value": delta}
+        for (year, month, metric, dimension), delta in cells.items() if delta
+    ]
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    insert = pg_insert if dialect == "postgresql" else sqlite_insert
+    stmt = insert(MonthlyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["year", "month", "metric", "dimension"],
+        set_={"value": MonthlyRollup.value + stmt.excluded.value}
+    )
+    db.session.execute(stmt, rows)
+
+
+def record_expense(expense):
+    bump(expense.created_at or datetime.utcnow(), EXPENSES, expense.cost)
+
+
+def record_payment(payment, previous_status=None, previous_amount=None):
+    """
+    Count a new payment, or move it between statuses when previous_status is
+    given (e.g. an M-PESA callback turning Pending into Success).
+    """
+    when = payment.created_at or datetime.utcnow()
+
+    if previous_status is not None:
+        amount = payment.amount if previous_amount is None else previous_amount
+        _apply_payment(when, payment, previous_status, amount, -1)
+    _apply_payment(when, payment, payment.status, payment.amount, 1)
+
+
+def _apply_payment(when, payment, status, amount, sign):
+    key = f"{payment.method}:{status}"
+    bump(when, PAYMENTS, sign, key)
+    bump(when, PAYMENT_AMOUNT, sign * amount, key)
+    if status == "Success":
+        bump(when, EARNINGS, sign * amount)
+        bump(when, PLAN_PAYMENTS, sign, str(payment.subscription_id))
+
+
+def month_totals(year, month):
+    """{(metric, dimension): value} for one month."""
+    rows = MonthlyRollup.query.filter_by(year=year, month=month).all()
+    return {(r.metric, r.dimension): r.value for r in rows}
+
+
+def rebuild(year=None):
+    """Recompute rollups from the base tables (backfill / repair)."""
+    query = MonthlyRollup.query
+    if year:
+        query = query.filter_by(year=year)
+    query.delete(synchronize_session=False)
+
+    cells = {}
+
+    def add(y, m, metric, dimension, value):
+        key = (int(y), int(m), metric, dimension)
+        cells[key] = cells.get(key, 0) + (value or 0)
+
+    e_year = extract("year", Expense.created_at)
+    e_month = extract("month", Expense.created_at)
+    expenses = db.session.query(e_year, e_month, func.sum(Expense.cost)).group_by(e_year, e_month)
+    if year:
+        expenses = expenses.filter(in_period(Expense.created_at, year))
+    for y, m, total in expenses:
+        add(y, m, EXPENSES, "", total)
+
+    p_year = extract("year", Payment.created_at)
+    p_month = extract("month", Payment.created_at)
+    payments = db.session.query(
+        p_year, p_month, Payment.method, Payment.status, Payment.subscription_id,
+        func.count(Payment.id), func.sum(Payment.amount)
+    ).group_by(p_year, p_month, Payment.method, Payment.status, Payment.subscription_id)
+    if year:
+        payments = payments.filter(in_period(Payment.created_at, year))
+    for y, m, method, status, plan_id, count, amount in payments:
+        key = f"{method}:{status}"
+        add(y, m, PAYMENTS, key, count)
+        add(y, m, PAYMENT_AMOUNT, key, amount)
+        if status == "Success":
+            add(y, m, EARNINGS, "", amount)
+            add(y, m, PLAN_PAYMENTS, str(plan_id), count)
+
+    db.session.bulk_insert_mappings(MonthlyRollup, [
+        {"year": y, "month": m, "metric": metric, "dimension": dimension, "value": value}
+        for (y, m, metric, dimension), value in cells.items()
+    ])
+    db.session.commit()
+    return len(cells)
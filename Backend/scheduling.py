@@ -0,0 +1,200 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import obj_to_ref
+from flask_apscheduler import APScheduler
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from models import db, JobRun, SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+TRIGGERS = {"cron": CronTrigger, "interval": IntervalTrigger}
+
+
+class JobScheduler:
+    """
+    Runs APScheduler jobs in exactly one process.
+    Importing the app only registers job definitions; nothing runs until a
+    process calls run() (`flask --app app run-scheduler`). Any number of those
+    may run: they compete for a lease row in scheduler_locks and only the
+    holder executes jobs. Jobs live in a SQLAlchemy job store, so a new leader
+    picks up next run times where the old one left off.
+    """
+
+    LOCK_NAME = "default"
+
+    def __init__(self):
+        self.app = None
+        self.scheduler = APScheduler()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = 60
+        self.history_days = 30
+        self.is_leader = False
+        self._jobs = {}
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        self.lease_ttl = float(app.config.get("SCHEDULER_LEASE_TTL", self.lease_ttl))
+        self.history_days = int(app.config.get("SCHEDULER_HISTORY_DAYS", self.history_days))
+
+        if "SCHEDULER_JOBSTORES" not in app.config:
+            with app.app_context():
+                # Share the app's engine, and the models' metadata so migrations own the table
+                app.config["SCHEDULER_JOBSTORES"] = {
+                    "default": SQLAlchemyJobStore(engine=db.engine, metadata=db.metadata)
+                }
+        app.config.setdefault("SCHEDULER_JOB_DEFAULTS", {
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": int(app.config.get("SCHEDULER_MISFIRE_GRACE", 3600)),
+        })
+        self.scheduler.init_app(app)
+        app.extensions["job_scheduler"] = self
+
+    def task(self, trigger, id, **trigger_args):
+        """Register a job; it is written to the job store when this process becomes leader."""
+        def wrapper(fn):
+            job = self._track(id, fn)
+            self._jobs[id] = (job, TRIGGERS[trigger](**trigger_args))
+            return job
+        return wrapper
+
+    def run(self):
+        """Block, holding or waiting for the leader lease, until stop() is called."""
+        self._stop.clear()
+        # Start paused: the job store is readable, but nothing fires until we lead
+        self.scheduler.scheduler.start(paused=True)
+        try:
+            while not self._stop.is_set():
+                self._heartbeat()
+                self._stop.wait(self.lease_ttl / 3)
+        finally:
+            self.scheduler.shutdown(wait=True)
+            self._release()
+            self.is_leader = False
+
+    def start(self):
+        """run() on a daemon thread, for a single-process dev server."""
+        thread = threading.Thread(target=self.run, name="job-scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self):
+        with self.app.app_context():
+            try:
+                leader = self._acquire()
+            except SQLAlchemyError:
+                db.session.rollback()
+                logger.exception("Could not renew the scheduler lease")
+                leader = False
+            finally:
+                db.session.remove()
+
+        if leader and not self.is_leader:
+            logger.info(f"{self.owner} is now the scheduler leader")
+            self._sync_jobs()
+            self.scheduler.resume()
+        elif not leader and self.is_leader:
+            logger.warning(f"{self.owner} lost the scheduler lease, pausing jobs")
+            self.scheduler.pause()
+        self.is_leader = leader
+
+    def _acquire(self):
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+
+        # Renew our own lease or take over an expired one, in a single statement
+        taken = SchedulerLock.query.filter(
+            SchedulerLock.name == self.LOCK_NAME,
+            db.or_(SchedulerLock.owner == self.owner, SchedulerLock.expires_at < now)
+        ).update({"owner": self.owner, "expires_at": expires_at}, synchronize_session=False)
+        if taken:
+            db.session.commit()
+            return True
+
+        if db.session.get(SchedulerLock, self.LOCK_NAME) is not None:
+            db.session.rollback()
+            return False
+
+        try:
+            db.session.add(SchedulerLock(name=self.LOCK_NAME, owner=self.owner, expires_at=expires_at))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Another process created the row first
+            db.session.rollback()
+            return False
+
+    def _release(self):
+        with self.app.app_context():
+            try:
+                SchedulerLock.query.filter_by(name=self.LOCK_NAME, owner=self.owner).delete()
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def _sync_jobs(self):
+        # Leave unchanged jobs alone so their stored next_run_time survives a failover
+        for job_id, (func, trigger) in self._jobs.items():
+            stored = self.scheduler.get_job(job_id)
+            if stored is not None and stored.func_ref == obj_to_ref(func) and str(stored.trigger) == str(trigger):
+                continue
+            self.scheduler.add_job(job_id, func, trigger=trigger, replace_existing=True)
+
+        for stored in self.scheduler.get_jobs():
+            if stored.id not in self._jobs:
+                self.scheduler.remove_job(stored.id)
+
+    def _track(self, job_id, fn):
+        @wraps(fn)
+        def run_job(*args, **kwargs):
+            started_at = datetime.utcnow()
+            start = time.perf_counter()
+            status, error = "success", None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                status, error = "failed", repr(e)
+                raise
+            finally:
+                self._record(job_id, started_at, time.perf_counter() - start, status, error)
+        return run_job
+
+    def _record(self, job_id, started_at, elapsed, status, error):
+        with self.app.app_context():
+            try:
+                db.session.add(JobRun(
+                    job_id=job_id,
+                    owner=self.owner,
+                    started_at=started_at,
+                    duration_ms=int(elapsed * 1000),
+                    status=status,
+                    error=error
+                ))
+                cutoff = datetime.utcnow() - timedelta(days=self.history_days)
+                JobRun.query.filter(JobRun.job_id == job_id, JobRun.started_at < cutoff).delete()
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                logger.exception(f"Could not record run of job {job_id}")
+
+            if status == "failed":
+                logger.error(f"Job {job_id} failed after {elapsed:.2f}s: {error}")
+            else:
+                logger.info(f"Job {job_id} finished in {elapsed:.2f}s")
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,117 @@
+import re
+from sqlalchemy import column, event, false, func, literal_column, or_, table, text
+from models import db, Client
+
+# SQLite: external-content FTS5 table over clients, kept in sync by triggers.
+# Postgres: pg_trgm GIN indexes on the same columns (created by the migration).
+FTS_TABLE = "clients_fts"
+
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        first_name, last_name, email, phone,
+        content='clients', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF first_name, last_name, email, phone ON clients BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+        INSERT INTO {FTS_TABLE}(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+PHONE_PREFIX = re.compile(r"^\+?\d{3,}$")
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+@event.listens_for(Client.__table__, "after_create")
+def _create_fts(target, connection, **kw):
+    # Keep db.create_all() (seed.py) in step with what the migration installs
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Client.__table__, "before_drop")
+def _drop_fts(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter: the search index lives outside the models."""
+    if type_ == "table" and name.startswith(FTS_TABLE):
+        return False
+    if type_ == "index" and name and name.endswith("_trgm"):
+        return False
+    return True
+
+
+def phone_prefix_range(prefix):
+    """[prefix, next prefix) so the unique phone index can be range-scanned."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Client.phone >= prefix, Client.phone < upper
+
+
+def fts_match_expression(term):
+    """Every word of the search box as an FTS5 prefix query: "ali"* AND "exa"*"""
+    tokens = TOKEN.findall(term)
+    return " AND ".join(f'"{t}"*' for t in tokens)
+
+
+def search_clients(query, term):
+    """
+    Narrow a Client query to rows matching `term`, best matches first.
+    Digit-only terms are treated as phone-number prefixes.
+    """
+    term = term.strip()
+
+    if PHONE_PREFIX.match(term):
+        # Stored numbers are local (07...), so fold the country code back
+        prefix = term.lstrip("+")
+        if prefix.startswith("254"):
+            prefix = "0" + prefix[3:]
+        return query.filter(*phone_prefix_range(prefix)).order_by(Client.phone.asc())
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        match = fts_match_expression(term)
+        if not match:
+            return query.filter(false())
+        return (
+            query.join(fts, fts.c.rowid == Client.id)
+            .filter(literal_column(FTS_TABLE).op("MATCH")(match))
+            .order_by(fts.c.rank, Client.id)
+        )
+
+    pattern = f"%{term}%"
+    query = query.filter(
+        or_(
+            Client.first_name.ilike(pattern),
+            Client.last_name.ilike(pattern),
+            Client.email.ilike(pattern),
+            Client.phone.ilike(pattern)
+        )
+    )
+
+    if dialect == "postgresql":
+        # The ilike above is served by the gin_trgm_ops indexes; rank by trigram similarity
+        score = func.greatest(
+            func.similarity(Client.first_name, term),
+            func.similarity(Client.last_name, term),
+            func.similarity(Client.email, term),
+        )
+        return query.order_by(score.desc(), Client.id)
+
+    return query.order_by(Client.first_name.asc(), Client.id.asc())
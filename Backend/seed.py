@@ -1,6 +1,7 @@
 from app import app, db
 from models import Client, Subscription, Admin, Expense
 from auth import hash_password
+from rollups import rebuild as rebuild_rollups
 from datetime import datetime, timedelta
 
 # ---------- Sample Data ---------- #
@@ -102,4 +103,7 @@ with app.app_context():
         db.session.add(expense)
 
     db.session.commit()
+
+    print("📊 Building monthly rollups...")
+    rebuild_rollups()
     print("✅ Seeding complete.")
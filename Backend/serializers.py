@@ -0,0 +1,172 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from operator import attrgetter
+from flask import make_response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class UnknownField(ValueError):
+    pass
+
+
+class Schema:
+    """
+    Named fields for one model. Plain attributes are given by name, computed
+    fields as getters. Each projection is compiled once into a closure that
+    reads the plain attributes with one attrgetter and then adds the
+    computed fields; datetimes are left as-is for the encoder. Works on ORM
+    instances and on column-only result rows alike.
+
+    Projections are keyed by their canonical form (deduplicated, in schema
+    order: plain attributes, then computed fields), so any permutation of a
+    caller's ?fields= shares one entry, and at most `max_compiled` are kept.
+    """
+
+    def __init__(self, *attrs, max_compiled=64, **getters):
+        self.attrs = set(attrs)
+        self.fields = dict.fromkeys(attrs)
+        self.fields.update(getters)
+        self.max_compiled = max_compiled
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, fields):
+        unknown = [f for f in fields if f not in self.fields]
+        if unknown:
+            raise UnknownField(f"Unknown fields: {', '.join(unknown)}")
+
+    def canonical(self, fields=None):
+        if not fields:
+            return tuple(self.fields)
+        self.check(fields)
+        wanted = set(fields)
+        return tuple(f for f in self.fields if f in wanted)
+
+    def compile(self, fields=None):
+        key = self.canonical(fields)
+        dump = self._compiled.get(key)
+        if dump is None:
+            dump = self._build(key)
+            with self._lock:
+                self._compiled[key] = dump
+                while len(self._compiled) > self.max_compiled:
+                    self._compiled.popitem(last=False)
+        return dump
+
+    def _build(self, fields):
+        plain = tuple(f for f in fields if f in self.attrs)
+        computed = tuple((f, self.fields[f]) for f in fields if f not in self.attrs)
+
+        if len(plain) == 1:
+            get_one = attrgetter(plain[0])
+
+            def get_plain(obj):
+                return (get_one(obj),)
+        elif plain:
+            get_plain = attrgetter(*plain)
+        else:
+            def get_plain(obj):
+                return ()
+
+        if not computed:
+            def dump(obj):
+                return dict(zip(plain, get_plain(obj)))
+        else:
+            def dump(obj):
+                row = dict(zip(plain, get_plain(obj)))
+                for name, get in computed:
+                    row[name] = get(obj)
+                return row
+        return dump
+
+    def dump(self, obj, fields=None):
+        return self.compile(fields)(obj)
+
+    def dump_many(self, objs, fields=None):
+        dump = self.compile(fields)
+        return [dump(obj) for obj in objs]
+
+
+def _plan(attr):
+    def get(client):
+        return getattr(client.subscription, attr) if client.subscription else None
+    return get
+
+
+client = Schema(
+    "id", "first_name", "last_name", "email", "phone", "status",
+    "subscription_id", "subscription_expiry", "created_at",
+    "last_payment_date", "last_payment_amount",
+    subscription=_plan("name"),
+    subscription_price=_plan("price"),
+)
+# Named projections of `client` used by the endpoints
+CLIENT_FIELDS = ("id", "first_name", "last_name", "email", "phone", "status",
+                 "subscription", "subscription_expiry", "created_at")
+CLIENT_LIST_FIELDS = ("id", "first_name", "last_name", "email", "phone", "status",
+                      "subscription", "subscription_id", "subscription_expiry", "created_at")
+CLIENT_PROFILE_FIELDS = ("id", "first_name", "last_name", "email", "phone", "subscription",
+                         "subscription_price", "subscription_expiry", "created_at")
+CLIENT_CONTACT_FIELDS = ("id", "first_name", "last_name", "email", "phone")
+# Fields that read client.subscription, so list queries should joinedload it
+CLIENT_PLAN_FIELDS = {"subscription", "subscription_price"}
+
+subscription = Schema("id", "name", "price", "duration_days")
+
+payment = Schema(
+    "id", "client_id", "subscription_id", "amount", "mpesa_receipt", "status", "created_at",
+    "method", "phone_number",
+    # Only on ledger.payment_rows() results
+    "client_name", "plan"
+)
+PAYMENT_FIELDS = ("id", "client_id", "subscription_id", "amount", "mpesa_receipt", "status", "created_at")
+PAYMENT_HISTORY_FIELDS = PAYMENT_FIELDS + ("method", "plan")
+PAYMENT_LEDGER_FIELDS = PAYMENT_HISTORY_FIELDS + ("client_name", "phone_number")
+
+expense = Schema("id", "expense", "cost", "created_at")
+
+admin = Schema("id", "email", "name")
+
+job_run = Schema("id", "job_id", "owner", "started_at", "duration_ms", "status", "error")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj, sort_keys=False):
+    """JSON bytes; orjson when installed, otherwise the stdlib with the same output."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for application/json."""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Routes jsonify() through the same encoder."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get("sort_keys", False)).decode("utf-8")
@@ -0,0 +1,65 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Payment
+from mpesa import MpesaUnavailable, lipa_na_mpesa
+import rollups
+from cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class StkPushDispatcher:
+    """
+    Runs STK pushes off the request thread.
+    MpesaInitiate saves a Pending Payment and submits it here; the worker does
+    the Daraja round-trips and records the CheckoutRequestID (or the failure).
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+
+    def init_app(self, app):
+        self.app = app
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(app.config.get("STK_PUSH_WORKERS", 4)),
+            thread_name_prefix="stk-push"
+        )
+        app.extensions["stk_push"] = self
+
+    def submit(self, payment_id, phone, amount):
+        return self._executor.submit(self._run, payment_id, phone, amount)
+
+    def _run(self, payment_id, phone, amount):
+        with self.app.app_context():
+            try:
+                response = lipa_na_mpesa(phone, amount)
+            except MpesaUnavailable as e:
+                logger.warning(f"STK push for payment {payment_id} failed: {e}")
+                response = {}
+            except Exception:
+                logger.exception(f"STK push for payment {payment_id} crashed")
+                response = {}
+
+            try:
+                payment = db.session.get(Payment, payment_id)
+                if payment is None or payment.status != "Pending":
+                    return
+
+                checkout_id = response.get("CheckoutRequestID")
+                if checkout_id:
+                    payment.checkout_response = checkout_id
+                else:
+                    logger.warning(f"STK push for payment {payment_id} rejected: {response}")
+                    payment.status = "Failed"
+                    rollups.record_payment(payment, previous_status="Pending")
+                db.session.commit()
+                response_cache.invalidate("payments")
+            except Exception:
+                db.session.rollback()
+                logger.exception(f"Could not record STK push result for payment {payment_id}")
+            finally:
+                db.session.remove()
+
+
+stk_push = StkPushDispatcher()
@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# Config is read at import time, so the environment has to be set before app is imported
+_db_dir = tempfile.mkdtemp(prefix="fitflow-tests-")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["MAIL_USERNAME"] = ""
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+os.environ["BCRYPT_WORKERS"] = "0"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["METRICS_TOKEN"] = "test-metrics-token"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from auth import hash_password  # noqa: E402
+from cache import MemoryCacheBackend, response_cache  # noqa: E402
+from models import db, Admin, Client, Expense, Payment, Subscription  # noqa: E402
+from principals import principal_cache  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+
+
+@pytest.fixture(autouse=True)
+def clean_db(app):
+    yield
+    with app.app_context():
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    response_cache.backend = MemoryCacheBackend()
+    principal_cache._entries.clear()
+
+
+@pytest.fixture
+def http(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """A plan, an admin, a client with two payments and an expense."""
+    with app.app_context():
+        plan = Subscription(name="Monthly", price=3000, duration_days=30)
+        db.session.add(plan)
+        db.session.add(Admin(name="Admin", email="admin@example.com", password_hash=hash_password("pw")))
+        member = Client(
+            first_name="Ann", last_name="Member", email="ann@example.com", phone="0712345678",
+            password_hash=hash_password("pw"), status="Active", subscription=plan,
+            subscription_expiry=datetime.utcnow() + timedelta(days=10)
+        )
+        db.session.add(member)
+        db.session.flush()
+        for _ in range(2):
+            db.session.add(Payment(client_id=member.id, subscription_id=plan.id, amount=3000,
+                                   status="success", method="cash", phone_number=member.phone))
+        db.session.add(Expense(expense="Water", cost=100))
+        db.session.commit()
+        return {"plan_id": plan.id, "client_id": member.id}
+
+
+@pytest.fixture
+def admin_headers(http, seed):
+    token = http.post("/admin/login", json={"email": "admin@example.com", "password": "pw"}).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def client_headers(http, seed):
+    token = http.post("/client/login", json={"email": "ann@example.com", "password": "pw"}).get_json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def daraja(monkeypatch):
+    """A running FakeDaraja with mpesa pointed at it and a cold token cache."""
+    import mpesa
+    from fake_daraja import FakeDaraja
+
+    fake = FakeDaraja().start()
+    monkeypatch.setattr(mpesa, "BASE_URL", fake.url)
+    # The fake speaks plain HTTP; route it through the same pooled adapter as Daraja
+    monkeypatch.setitem(mpesa.session.adapters, "http://", mpesa.session.get_adapter("https://"))
+    mpesa.invalidate_access_token()
+    mpesa.breaker.record_success()
+    yield fake
+    mpesa.invalidate_access_token()
+    fake.stop()
@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections from bursts of callers
+    request_queue_size = 128
+
+
+class FakeDaraja:
+    """
+    Local stand-in for the Daraja API: the OAuth and STK push endpoints,
+    counting calls. `token_delay` slows the OAuth call so concurrent callers
+    overlap; `reject_next_push` answers the next push with a 401.
+    `max_in_flight` is the most requests it was serving at once.
+    """
+
+    def __init__(self, expires_in=3599, token_delay=0.2, push_delay=0.0):
+        self.expires_in = expires_in
+        self.token_delay = token_delay
+        self.push_delay = push_delay
+        self.reject_next_push = False
+        self.token_calls = 0
+        self.push_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.tokens_seen = []
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if not self.path.startswith("/oauth/v1/generate"):
+                    return self._reply(404, {})
+                with fake._lock:
+                    fake.token_calls += 1
+                    token = f"token-{fake.token_calls}"
+                time.sleep(fake.token_delay)
+                self._reply(200, {"access_token": token, "expires_in": str(fake.expires_in)})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with fake._lock:
+                    fake.push_calls += 1
+                    fake.tokens_seen.append(self.headers.get("Authorization"))
+                    reject, fake.reject_next_push = fake.reject_next_push, False
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                time.sleep(fake.push_delay)
+                with fake._lock:
+                    fake.in_flight -= 1
+                if reject:
+                    return self._reply(401, {"errorMessage": "Invalid Access Token"})
+                self._reply(200, {"CheckoutRequestID": f"ws_CO_{fake.push_calls}", "ResponseCode": "0"})
+
+        return Handler
@@ -0,0 +1,59 @@
+import os
+import signal
+import time
+
+import pytest
+from flask import Flask
+
+from auth import PasswordHasher
+
+
+@pytest.fixture
+def pooled():
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=4, BCRYPT_WORKERS=1, BCRYPT_MAX_PENDING=4)
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    yield hasher
+    if hasher._pool:
+        hasher._pool.shutdown(cancel_futures=True)
+
+
+def _kill_workers(hasher):
+    pool = hasher._pool
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    # Let the executor notice and mark itself broken
+    deadline = time.monotonic() + 5
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return pool
+
+
+def test_dead_worker_is_replaced_and_the_call_retried(pooled):
+    hashed = pooled.hash("pw")
+    broken = _kill_workers(pooled)
+
+    assert pooled.check("pw", hashed)
+    assert pooled._pool is not broken
+
+
+def test_hash_many_survives_a_dead_worker(pooled):
+    pooled.hash("warm-up")
+    _kill_workers(pooled)
+
+    hashes = pooled.hash_many(["a", "b", "c"])
+    assert [pooled.check(p, h) for p, h in zip("abc", hashes)] == [True, True, True]
+
+
+def test_submit_to_a_pool_replaced_by_another_thread_is_retried(pooled):
+    hashed = pooled.hash("pw")
+    # Another thread saw the pool broken and shut it down after this one fetched it
+    stale = pooled._pool
+    pooled._discard_pool(stale)
+    get_pool = pooled._get_pool
+    handed_out = iter([stale])
+    pooled._get_pool = lambda: next(handed_out, None) or get_pool()
+
+    assert pooled.check("pw", hashed)
+    assert pooled._pool not in (None, stale)
@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import decode_token
+
+from blocklist import Blocklist, SQLBlocklist
+from models import db, RevokedToken
+
+
+def jwt_claims(app, headers):
+    with app.app_context():
+        return decode_token(headers["Authorization"].split()[1])
+
+
+@pytest.fixture
+def other_worker():
+    """A second process's Blocklist: same SQL backend, its own front cache."""
+    other = Blocklist()
+    other.backend = SQLBlocklist()
+    other.negative_ttl = 0.3
+    return other
+
+
+def test_logged_out_token_is_rejected(http, client_headers):
+    assert http.get("/client/payments", headers=client_headers).status_code == 200
+
+    assert http.post("/logout", headers=client_headers).status_code == 200
+
+    response = http.get("/client/payments", headers=client_headers)
+    assert response.status_code == 401
+    assert "revoked" in response.get_json()["msg"]
+
+
+def test_revocation_reaches_another_worker_within_negative_ttl(app, http, client_headers, other_worker):
+    claims = jwt_claims(app, client_headers)
+    with app.app_context():
+        # The other worker has seen the token live, so it caches "not revoked"
+        assert other_worker.is_revoked(claims["jti"], claims["exp"]) is False
+
+    http.post("/logout", headers=client_headers)
+
+    with app.app_context():
+        assert other_worker.is_revoked(claims["jti"], claims["exp"]) is False
+        time.sleep(other_worker.negative_ttl + 0.1)
+        assert other_worker.is_revoked(claims["jti"], claims["exp"]) is True
+        # And from then on without asking the backend
+        db.session.query(RevokedToken).delete()
+        db.session.commit()
+        assert other_worker.is_revoked(claims["jti"], claims["exp"]) is True
+
+
+def test_expired_rows_are_purged_and_ignored(app):
+    backend = SQLBlocklist()
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add(RevokedToken(jti="old", expires_at=now - timedelta(minutes=1)))
+        db.session.commit()
+        assert backend.contains("old") is False
+
+        backend.add("new", (now + timedelta(hours=1) - datetime(1970, 1, 1)).total_seconds())
+
+        assert [t.jti for t in RevokedToken.query.all()] == ["new"]
+        assert backend.contains("new") is True
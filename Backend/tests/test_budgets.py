@@ -0,0 +1,112 @@
+"""
+Runs every resource that declares a @query_budget in raise mode (set in
+conftest), with cold caches and enough rows per table that a lazy load
+in a loop would cross QUERY_REPEAT_THRESHOLD. A new budgeted resource
+fails test_every_budgeted_resource_is_exercised until it is added here.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+
+from budgets import QueryBudgetExceeded, query_budgets
+from cache import MemoryCacheBackend, response_cache
+from metrics import RequestStats
+from models import db, Client, Expense, JobRun, Payment, Subscription
+from principals import principal_cache
+
+ROWS = 8
+
+
+@pytest.fixture
+def busy(app, seed):
+    """ROWS more plans, each with a member who has paid, plus expenses and job runs."""
+    now = datetime.utcnow()
+    with app.app_context():
+        for i in range(ROWS):
+            plan = Subscription(name=f"Plan {i}", price=1000 + i, duration_days=30)
+            member = Client(first_name=f"M{i}", last_name="Member", email=f"m{i}@example.com",
+                            phone=f"07200000{i:02d}", password_hash="x", status="Active", subscription=plan,
+                            subscription_expiry=now + timedelta(days=i))
+            db.session.add_all([plan, member])
+            db.session.flush()
+            db.session.add(Payment(client_id=member.id, subscription_id=plan.id, amount=plan.price,
+                                   status="Success", method="Cash", phone_number=member.phone))
+            db.session.add(Payment(client_id=seed["client_id"], subscription_id=plan.id, amount=plan.price,
+                                   status="Pending", method="M-PESA", phone_number="254712345678"))
+            db.session.add(Expense(expense=f"Item {i % 3}", cost=10 * i))
+            db.session.add(JobRun(job_id="expire_subscriptions", owner="host", started_at=now - timedelta(hours=i),
+                                  duration_ms=5, status="success"))
+        db.session.commit()
+        pending = Payment.query.filter_by(client_id=seed["client_id"], status="Pending").first().id
+    return {**seed, "pending_payment_id": pending}
+
+
+def _bulk_import(http, admin_headers, client_headers, ids):
+    body = "\n".join(json.dumps({"first_name": "New", "last_name": str(i), "email": f"new{i}@example.com",
+                                 "phone": f"07300000{i:02d}", "subscription": f"Plan {i}"}) for i in range(ROWS))
+    return http.post("/clients/bulk?welcome=false", data=body,
+                     headers={**admin_headers, "Content-Type": "application/x-ndjson"})
+
+
+# (rule, method) -> request against it
+REQUESTS = {
+    ("/clients/bulk", "POST"): _bulk_import,
+    ("/subscriptions", "GET"): lambda http, a, c, ids: http.get("/subscriptions"),
+    ("/clients", "GET"): lambda http, a, c, ids: http.get("/clients", headers=a),
+    ("/dashboard/client", "GET"): lambda http, a, c, ids: http.get("/dashboard/client", headers=c),
+    ("/expenses", "GET"): lambda http, a, c, ids: http.get("/expenses", headers=a),
+    ("/expenses/summary", "GET"): lambda http, a, c, ids: http.get("/expenses/summary", headers=a),
+    ("/client/payments", "GET"): lambda http, a, c, ids: http.get("/client/payments", headers=c),
+    ("/payments", "GET"): lambda http, a, c, ids: http.get("/payments", headers=a),
+    ("/dashboard", "GET"): lambda http, a, c, ids: http.get("/dashboard", headers=a),
+    ("/jobs/runs", "GET"): lambda http, a, c, ids: http.get("/jobs/runs", headers=a),
+    ("/payments/<int:payment_id>/status", "GET"):
+        lambda http, a, c, ids: http.get(f"/payments/{ids['pending_payment_id']}/status", headers=c),
+}
+
+
+def budgeted_resources(app):
+    found = set()
+    for rule in app.url_map.iter_rules():
+        view_class = getattr(app.view_functions[rule.endpoint], "view_class", None)
+        for method in getattr(view_class, "methods", None) or ():
+            if hasattr(getattr(view_class, method.lower()), "query_budget"):
+                found.add((rule.rule, method))
+    return found
+
+
+def test_every_budgeted_resource_is_exercised(app):
+    assert budgeted_resources(app) == set(REQUESTS)
+
+
+@pytest.mark.parametrize("resource", sorted(REQUESTS), ids=lambda r: f"{r[1]} {r[0]}")
+def test_budgeted_resource_stays_within_budget(app, http, admin_headers, client_headers, busy, resource):
+    assert query_budgets.mode == "raise"
+    # Worst case: nothing answered from the response or principal caches
+    response_cache.backend = MemoryCacheBackend()
+    principal_cache._entries.clear()
+
+    response = REQUESTS[resource](http, admin_headers, client_headers, busy)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def _finish_request(app, repeats, budget=None):
+    with app.test_request_context("/payments/1/status"):
+        g.request_stats = stats = RequestStats()
+        stats.queries = repeats
+        stats.statements["SELECT payments.status FROM payments WHERE payments.id = ?"] = repeats
+        if budget is not None:
+            g.query_budget = budget
+        query_budgets._after_request(app.response_class())
+
+
+def test_unbudgeted_endpoints_are_not_checked_for_repeats(app):
+    _finish_request(app, repeats=50)
+
+
+def test_budgeted_endpoints_are_checked_for_repeats(app):
+    with pytest.raises(QueryBudgetExceeded, match="possible N\\+1"):
+        _finish_request(app, repeats=query_budgets.repeat_threshold, budget=(None, False))
+    _finish_request(app, repeats=50, budget=(None, True))
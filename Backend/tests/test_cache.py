@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from cache import response_cache
+from models import db, Client, Subscription
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    response_cache.hits.clear()
+    response_cache.misses.clear()
+
+
+def dashboard(http, **headers):
+    return http.get("/dashboard", headers=headers)
+
+
+def test_etag_round_trip(http, seed):
+    first = dashboard(http)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    etag = first.headers["ETag"]
+
+    again = dashboard(http, **{"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+    other = dashboard(http, **{"If-None-Match": '"something-else"'})
+    assert other.status_code == 200
+    assert other.get_json() == first.get_json()
+    assert response_cache.stats()["dashboard"] == {"hits": 2, "misses": 1, "hit_rate": 0.6667}
+
+
+def test_adding_an_expense_refreshes_the_dashboard(http, admin_headers, seed):
+    before = dashboard(http)
+
+    response = http.post("/addExpense", json={"expense": "Rent", "cost": 500}, headers=admin_headers)
+    assert response.status_code == 201
+
+    after = dashboard(http, **{"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.get_json()["expenses"] == before.get_json()["expenses"] + 500
+
+
+def test_a_cash_payment_refreshes_the_dashboard(http, admin_headers, seed):
+    before = dashboard(http)
+
+    response = http.post("/markCashPayment", headers=admin_headers, json={
+        "phone": "0712345678", "subscription": "Monthly", "payment_status": "success", "amount": 3000,
+    })
+    assert response.status_code == 200
+
+    after = dashboard(http, **{"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.get_json()["payments"] == before.get_json()["payments"] + 3000
+
+
+@pytest.mark.parametrize("tag", ["clients", "payments"])
+def test_invalidating_a_tag_the_dashboard_depends_on(app, http, seed, tag):
+    assert dashboard(http).get_json()["clients"] == 1
+
+    # A write that forgets to invalidate is served stale...
+    with app.app_context():
+        db.session.add(Client(first_name="Bo", last_name="Late", email="bo@example.com", phone="0711111111",
+                              password_hash="x", status="Active"))
+        db.session.commit()
+    assert dashboard(http).get_json()["clients"] == 1
+
+    # ...until any tag it depends on moves on
+    response_cache.invalidate(tag)
+    assert dashboard(http).get_json()["clients"] == 2
+
+
+def test_invalidating_an_unrelated_tag_keeps_the_entry(http, seed):
+    dashboard(http)
+    response_cache.invalidate("unrelated")
+    dashboard(http)
+    assert response_cache.stats()["dashboard"]["misses"] == 1
+
+
+def test_entries_expire_after_their_ttl(app, http, seed, monkeypatch):
+    monkeypatch.setattr(response_cache, "default_ttl", 0.2)
+    assert [p["name"] for p in http.get("/subscriptions").get_json()] == ["Monthly"]
+
+    with app.app_context():
+        db.session.add(Subscription(name="Yearly", price=30000, duration_days=365))
+        db.session.commit()
+    assert [p["name"] for p in http.get("/subscriptions").get_json()] == ["Monthly"]
+
+    time.sleep(0.3)
+    assert [p["name"] for p in http.get("/subscriptions").get_json()] == ["Monthly", "Yearly"]
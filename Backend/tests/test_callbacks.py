@@ -0,0 +1,161 @@
+import json
+import threading
+from datetime import timedelta
+
+import pytest
+
+from callbacks import callback_processor
+from metrics import metrics
+from models import db, Client, MpesaCallback, Payment
+
+
+def stk_callback(checkout_id, receipt=None, result_code=0, amount=3000):
+    items = [{"Name": "Amount", "Value": amount}, {"Name": "MpesaReceiptNumber", "Value": receipt}]
+    return {"Body": {"stkCallback": {
+        "CheckoutRequestID": checkout_id, "ResultCode": result_code, "ResultDesc": "",
+        "CallbackMetadata": {"Item": items} if result_code == 0 else None,
+    }}}
+
+
+def store(app, *callbacks):
+    with app.app_context():
+        for cb in callbacks:
+            db.session.add(MpesaCallback(
+                checkout_request_id=cb["Body"]["stkCallback"]["CheckoutRequestID"], payload=json.dumps(cb)))
+        db.session.commit()
+
+
+def pending_payment(app, client_id, plan_id, checkout_id, status="Pending"):
+    with app.app_context():
+        payment = Payment(client_id=client_id, subscription_id=plan_id, amount=3000, status=status,
+                          method="M-PESA", phone_number="254712345678", checkout_response=checkout_id)
+        db.session.add(payment)
+        db.session.commit()
+        return payment.id
+
+
+def drain(app):
+    with app.app_context():
+        return callback_processor.drain()
+
+
+def callback_row(app, checkout_id):
+    with app.app_context():
+        return MpesaCallback.query.filter_by(checkout_request_id=checkout_id).one()
+
+
+def payment_status(app, payment_id):
+    with app.app_context():
+        return db.session.get(Payment, payment_id).status
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr(callback_processor, "max_attempts", 3)
+    monkeypatch.setattr(callback_processor, "retry_delay", timedelta(minutes=1))
+    return callback_processor
+
+
+def test_success_is_applied(app, seed, processor):
+    payment_id = pending_payment(app, seed["client_id"], seed["plan_id"], "ws_CO_1")
+    store(app, stk_callback("ws_CO_1", receipt="RCP1"))
+
+    assert drain(app) == 1
+    assert payment_status(app, payment_id) == "Success"
+    row = callback_row(app, "ws_CO_1")
+    assert row.processed_at is not None and row.reconcile_reason is None
+
+
+def test_unmatched_callback_waits_for_its_payment(app, seed, processor):
+    # The callback arrived before the STK worker stored the CheckoutRequestID
+    store(app, stk_callback("ws_CO_early", receipt="RCP2"))
+    drain(app)
+    row = callback_row(app, "ws_CO_early")
+    assert row.processed_at is None and row.attempts == 1 and row.retry_at is not None
+
+    payment_id = pending_payment(app, seed["client_id"], seed["plan_id"], "ws_CO_early")
+    # Not due yet
+    drain(app)
+    assert payment_status(app, payment_id) == "Pending"
+
+    with app.app_context():
+        MpesaCallback.query.update({MpesaCallback.retry_at: row.retry_at - timedelta(minutes=2)})
+        db.session.commit()
+    drain(app)
+    assert payment_status(app, payment_id) == "Success"
+
+
+def test_unmatched_callback_is_reconciled_after_max_attempts(app, seed, processor, monkeypatch):
+    monkeypatch.setattr(processor, "retry_delay", timedelta(0))
+    before = metrics.callback_reconciliations["unmatched"]
+    store(app, stk_callback("ws_CO_nobody", receipt="RCP3"))
+
+    drain(app)
+    row = callback_row(app, "ws_CO_nobody")
+    assert row.processed_at is not None
+    assert row.attempts == processor.max_attempts
+    assert row.reconcile_reason.startswith("unmatched:")
+    assert metrics.callback_reconciliations["unmatched"] == before + 1
+
+
+def test_payment_for_a_failed_payment_is_reconciled(app, seed, processor):
+    payment_id = pending_payment(app, seed["client_id"], seed["plan_id"], "ws_CO_late", status="Failed")
+    store(app, stk_callback("ws_CO_late", receipt="RCP4"))
+
+    drain(app)
+    assert payment_status(app, payment_id) == "Failed"
+    assert callback_row(app, "ws_CO_late").reconcile_reason.startswith("paid_after_failure:")
+
+
+def test_one_bad_row_does_not_sink_the_batch(app, seed, processor, monkeypatch):
+    with app.app_context():
+        other = Client(first_name="Bob", last_name="Member", email="bob@example.com", phone="0712000000",
+                       password_hash="x", status="Active")
+        db.session.add(other)
+        db.session.commit()
+        bad_client_id = other.id
+    good = pending_payment(app, seed["client_id"], seed["plan_id"], "ws_CO_good")
+    bad = pending_payment(app, bad_client_id, seed["plan_id"], "ws_CO_bad")
+
+    apply_payment = Client.apply_payment
+
+    def flaky(self, *args):
+        if self.id == bad_client_id:
+            raise RuntimeError("boom")
+        return apply_payment(self, *args)
+
+    monkeypatch.setattr(Client, "apply_payment", flaky)
+    store(app, stk_callback("ws_CO_bad", receipt="RCP5"), stk_callback("ws_CO_good", receipt="RCP6"))
+
+    drain(app)
+    assert payment_status(app, good) == "Success"
+    assert payment_status(app, bad) == "Pending"
+    row = callback_row(app, "ws_CO_bad")
+    assert row.processed_at is None and row.attempts == 1
+
+
+def test_concurrent_ingest_keeps_one_row_per_checkout_id(app, monkeypatch):
+    monkeypatch.setattr(callback_processor, "_ensure_started", lambda: None)
+    senders = 16
+    barrier = threading.Barrier(senders)
+    results = []
+
+    def send(k):
+        http = app.test_client()
+        barrier.wait()
+        # Every checkout id is delivered twice, by different senders
+        for i in range(k % 8, 200, 8):
+            response = http.post("/callback", json=stk_callback(f"ws_CO_{i}", receipt=f"R{i}"))
+            results.append(response.status_code)
+
+    threads = [threading.Thread(target=send, args=(k,)) for k in range(senders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [200] * 400
+    with app.app_context():
+        assert MpesaCallback.query.count() == 200
+        assert callback_processor.ingest(stk_callback("ws_CO_0")) is False
+        assert callback_processor.ingest(stk_callback("ws_CO_new")) is True
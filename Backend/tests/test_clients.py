@@ -0,0 +1,90 @@
+import pytest
+
+from models import db, Client
+from pagination import encode_cursor
+from serializers import CLIENT_LIST_FIELDS
+
+MEMBERS = [("Bea", "One"), ("Ann", "Two"), ("Cal", "Three"), ("Bea", "Four")]
+
+
+@pytest.fixture
+def members(app, seed):
+    """Ann from the seed plus four more, sharing first names so the id breaks ties."""
+    with app.app_context():
+        db.session.add_all(
+            Client(first_name=first, last_name=last, email=f"{last.lower()}@example.com", phone=f"07000000{i:02d}",
+                   password_hash="x", status="Active")
+            for i, (first, last) in enumerate(MEMBERS)
+        )
+        db.session.commit()
+        return [c.id for c in Client.query.order_by(Client.first_name, Client.id)]
+
+
+def get_clients(http, headers, query=""):
+    response = http.get(f"/clients{query}", headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def test_pages_walk_every_client_once_in_name_order(http, admin_headers, members):
+    seen, cursor = [], None
+    while True:
+        body = get_clients(http, admin_headers, "?limit=2" + (f"&cursor={cursor}" if cursor else ""))
+        assert len(body["clients"]) <= 2
+        seen += [c["id"] for c in body["clients"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == members
+
+
+def test_without_limit_or_cursor_the_full_list_is_returned(http, admin_headers, members):
+    body = get_clients(http, admin_headers)
+    assert [c["id"] for c in body["clients"]] == members
+    assert body["next_cursor"] is None
+
+
+def test_limit_is_clamped(http, admin_headers, members, monkeypatch):
+    monkeypatch.setattr("pagination.MAX_PAGE_SIZE", 3)
+    body = get_clients(http, admin_headers, "?limit=1000")
+    assert len(body["clients"]) == 3
+    assert body["next_cursor"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor("Bea", "zzz"),
+    encode_cursor(7, 1),
+    encode_cursor("Bea"),
+])
+def test_malformed_cursor_is_rejected(http, admin_headers, members, cursor):
+    response = http.get(f"/clients?cursor={cursor}", headers=admin_headers)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_cursor_cannot_be_combined_with_search(http, admin_headers, members):
+    cursor = encode_cursor("Ann", members[0])
+    assert http.get(f"/clients?search=bea&cursor={cursor}", headers=admin_headers).status_code == 400
+
+
+def test_fields_project_the_response(http, admin_headers, members):
+    body = get_clients(http, admin_headers, "?fields=email,id&limit=1")
+    assert body["clients"] == [{"id": members[0], "email": "ann@example.com"}]
+
+    # The plan name is only joined in when asked for
+    body = get_clients(http, admin_headers, "?fields=first_name,subscription&limit=2")
+    assert body["clients"] == [{"first_name": "Ann", "subscription": "Monthly"},
+                               {"first_name": "Ann", "subscription": None}]
+
+
+def test_default_fields_are_the_list_fields(http, admin_headers, members):
+    body = get_clients(http, admin_headers, "?limit=1")
+    assert set(body["clients"][0]) == set(CLIENT_LIST_FIELDS)
+
+
+def test_unknown_fields_are_rejected(http, admin_headers, members):
+    response = http.get("/clients?fields=id,password_hash", headers=admin_headers)
+    assert response.status_code == 400
+    assert "password_hash" in response.get_json()["error"]
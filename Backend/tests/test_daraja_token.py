@@ -0,0 +1,62 @@
+import threading
+import time
+
+import mpesa
+
+
+def _push_concurrently(callers):
+    barrier = threading.Barrier(callers)
+    errors = []
+
+    def push():
+        barrier.wait()
+        try:
+            mpesa.lipa_na_mpesa("254712345678", 1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=push) for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_concurrent_pushes_share_one_token_fetch(daraja):
+    _push_concurrently(50)
+
+    assert daraja.push_calls == 50
+    assert daraja.token_calls == 1
+    assert set(daraja.tokens_seen) == {"Bearer token-1"}
+
+
+def test_token_is_refreshed_before_expires_in_runs_out(daraja):
+    # 61s lifetime minus the 60s margin: cached for about one second
+    daraja.expires_in = mpesa.TOKEN_REFRESH_MARGIN + 1
+    _push_concurrently(10)
+    assert daraja.token_calls == 1
+
+    time.sleep(1.1)
+    _push_concurrently(10)
+    assert daraja.token_calls == 2
+
+
+def test_rejected_token_is_dropped_and_the_push_retried_once(daraja):
+    mpesa.generate_access_token()
+    daraja.reject_next_push = True
+
+    mpesa.lipa_na_mpesa("254712345678", 1)
+
+    assert daraja.token_calls == 2
+    assert daraja.tokens_seen == ["Bearer token-1", "Bearer token-2"]
+
+
+def test_connections_per_host_are_capped_at_the_pool_size(daraja):
+    mpesa.generate_access_token()
+    daraja.push_delay = 0.1
+
+    _push_concurrently(mpesa.POOL_SIZE * 3)
+
+    assert daraja.push_calls == mpesa.POOL_SIZE * 3
+    assert daraja.max_in_flight <= mpesa.POOL_SIZE
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Expense
+from pagination import encode_cursor
+
+
+@pytest.fixture
+def expenses(app, seed):
+    """2025's expenses, two of them at the same instant, plus one just before the year."""
+    rows = [
+        ("Rent", 500, datetime(2025, 1, 6, 9)),
+        ("Water", 20, datetime(2025, 1, 8, 12)),
+        ("Rent", 500, datetime(2025, 3, 10, 10)),
+        ("Water", 30, datetime(2025, 3, 14, 18)),
+        ("Towels", 15, datetime(2025, 3, 14, 18)),
+        ("Gear", 40, datetime(2024, 12, 31, 23, 59)),
+    ]
+    with app.app_context():
+        db.session.add_all(Expense(expense=e, cost=c, created_at=at) for e, c, at in rows)
+        db.session.commit()
+        in_2025 = Expense.query.filter(Expense.created_at.between(datetime(2025, 1, 1), datetime(2025, 12, 31)))
+        return [e.id for e in in_2025.order_by(Expense.created_at.desc(), Expense.id.desc())]
+
+
+def test_expense_pages_walk_the_year_newest_first(http, admin_headers, expenses):
+    seen, cursor = [], None
+    while True:
+        url = "/expenses?year=2025&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        body = http.get(url, headers=admin_headers).get_json()
+        assert len(body["expenses"]) <= 2
+        # Totals are for the whole period on every page
+        assert (body["total"], body["count"]) == (1065, 5)
+        seen += [e["id"] for e in body["expenses"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == expenses
+
+
+def test_expenses_without_limit_or_cursor_are_not_paginated(http, admin_headers, expenses):
+    body = http.get("/expenses?year=2025&month=3", headers=admin_headers).get_json()
+    assert [e["expense"] for e in body["expenses"]] == ["Towels", "Water", "Rent"]
+    assert body["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor("2025-03-01T00:00:00", "zzz"),
+    encode_cursor("yesterday", 1),
+    encode_cursor("2025-03-01T00:00:00"),
+])
+def test_malformed_expense_cursor_is_rejected(http, admin_headers, expenses, cursor):
+    response = http.get(f"/expenses?year=2025&cursor={cursor}", headers=admin_headers)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_summary_groups_by_category_month_and_week(http, admin_headers, expenses):
+    body = http.get("/expenses/summary?year=2025", headers=admin_headers).get_json()
+
+    assert (body["total"], body["count"]) == (1065, 5)
+    assert body["by_category"] == [
+        {"category": "Rent", "total": 1000, "count": 2},
+        {"category": "Water", "total": 50, "count": 2},
+        {"category": "Towels", "total": 15, "count": 1},
+    ]
+    assert len(body["by_month"]) == 12
+    assert body["by_month"][0] == {"month": 1, "name": "January", "total": 520, "count": 2}
+    assert body["by_month"][1] == {"month": 2, "name": "February", "total": 0, "count": 0}
+    assert body["by_month"][2] == {"month": 3, "name": "March", "total": 545, "count": 3}
+    # Weeks are keyed by their Monday
+    assert body["by_week"] == [
+        {"week_start": "2025-01-06", "total": 520, "count": 2},
+        {"week_start": "2025-03-10", "total": 545, "count": 3},
+    ]
+
+
+def test_summary_of_one_month_and_selected_groups(http, admin_headers, expenses):
+    body = http.get("/expenses/summary?year=2025&month=1&group=month,week", headers=admin_headers).get_json()
+
+    assert "by_category" not in body
+    assert body["by_month"] == [{"month": 1, "name": "January", "total": 520, "count": 2}]
+    assert body["by_week"] == [{"week_start": "2025-01-06", "total": 520, "count": 2}]
+
+
+def test_summary_rejects_unknown_groups_and_periods(http, admin_headers):
+    assert http.get("/expenses/summary?group=day", headers=admin_headers).status_code == 400
+    assert http.get("/expenses/summary?month=13", headers=admin_headers).status_code == 400
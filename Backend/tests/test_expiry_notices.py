@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from models import db, Client
+
+
+def _expired_member(i):
+    return Client(first_name=f"Member{i}", last_name="X", email=f"m{i}@example.com",
+                  phone=f"07000000{i:02d}", password_hash="x",
+                  subscription_expiry=datetime.utcnow() - timedelta(days=1))
+
+
+def test_marker_is_set_on_delivery_not_on_enqueue(app, monkeypatch):
+    with app.app_context():
+        db.session.add_all([_expired_member(1), _expired_member(2)])
+        db.session.commit()
+
+    queued = []
+    monkeypatch.setattr(app_module.mailer, "enqueue",
+                        lambda to, subject, message, block=False, on_sent=None: queued.append((to, on_sent)) or True)
+
+    app_module.check_expired_subscriptions()
+    assert [to for to, _ in queued] == ["m1@example.com", "m2@example.com"]
+
+    # Only the first message reaches the SMTP server
+    queued[0][1]()
+    with app.app_context():
+        marked = {c.email: c.expiry_notified_for for c in Client.query.all()}
+    assert marked["m1@example.com"] is not None
+    assert marked["m2@example.com"] is None
+
+    # The undelivered notice is sent again on the next run
+    queued.clear()
+    app_module.check_expired_subscriptions()
+    assert [to for to, _ in queued] == ["m2@example.com"]
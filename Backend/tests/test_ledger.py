@@ -0,0 +1,129 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Client, Payment, Subscription
+from pagination import encode_cursor
+from serializers import PAYMENT_HISTORY_FIELDS, PAYMENT_LEDGER_FIELDS
+
+# client, plan, status, method, created_at; "ann" is the seeded client
+PAYMENTS = [
+    ("ann", "Monthly", "Success", "M-PESA", datetime(2025, 3, 1, 8)),
+    ("ann", "Monthly", "Failed", "M-PESA", datetime(2025, 3, 1, 8)),
+    ("ann", "Yearly", "Pending", "M-PESA", datetime(2025, 3, 31, 23, 30)),
+    ("bo", "Yearly", "Success", "Cash", datetime(2025, 3, 15, 12)),
+    ("bo", "Monthly", "Success", "M-PESA", datetime(2025, 4, 1, 0, 0)),
+]
+
+
+@pytest.fixture
+def payments(app, seed):
+    """PAYMENTS on top of the seed's two (made now); returns their ids in PAYMENTS order."""
+    with app.app_context():
+        yearly = Subscription(name="Yearly", price=30000, duration_days=365)
+        bo = Client(first_name="Bo", last_name="Other", email="bo@example.com", phone="0711111111",
+                    password_hash="x", status="Active")
+        db.session.add_all([yearly, bo])
+        db.session.flush()
+        clients = {"ann": seed["client_id"], "bo": bo.id}
+        plans = {"Monthly": seed["plan_id"], "Yearly": yearly.id}
+        rows = [
+            Payment(client_id=clients[who], subscription_id=plans[plan], amount=100, status=status, method=method,
+                    phone_number="254700000000", created_at=at)
+            for who, plan, status, method, at in PAYMENTS
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [p.id for p in rows]
+
+
+def newest_first(app, *ids):
+    with app.app_context():
+        rows = Payment.query.filter(Payment.id.in_(ids)).order_by(Payment.created_at.desc(), Payment.id.desc())
+        return [p.id for p in rows]
+
+
+def ledger(http, headers, query=""):
+    response = http.get(f"/payments{query}", headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def ledger_ids(http, headers, query=""):
+    return [p["id"] for p in ledger(http, headers, query)["payments"]]
+
+
+def test_history_pages_through_the_clients_own_payments(app, http, client_headers, seed, payments):
+    with app.app_context():
+        own = [p.id for p in Payment.query.filter_by(client_id=seed["client_id"])]
+    seen, cursor = [], None
+    while True:
+        response = http.get("/client/payments?limit=2" + (f"&cursor={cursor}" if cursor else ""),
+                            headers=client_headers)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 2
+        assert all(set(p) == set(PAYMENT_HISTORY_FIELDS) for p in page)
+        seen += [p["id"] for p in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    # Bo's payments never show up, and the two made at the same instant are both there
+    assert len(own) == 5
+    assert seen == newest_first(app, *own)
+
+
+def test_history_rejects_a_malformed_cursor(http, client_headers, payments):
+    for cursor in ("garbage", encode_cursor("2025-03-01T08:00:00", "zzz")):
+        response = http.get(f"/client/payments?cursor={cursor}", headers=client_headers)
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_ledger_lists_everything_newest_first(app, http, admin_headers, payments):
+    body = ledger(http, admin_headers)
+    assert body["next_cursor"] is None
+    assert len(body["payments"]) == 7
+    assert all(set(p) == set(PAYMENT_LEDGER_FIELDS) for p in body["payments"])
+    assert [p["id"] for p in body["payments"]][2:] == newest_first(app, *payments)
+
+    bo = body["payments"][2]
+    assert (bo["client_name"], bo["plan"], bo["method"]) == ("Bo Other", "Monthly", "M-PESA")
+
+
+def test_ledger_filters(http, admin_headers, payments):
+    ann_ok, ann_failed, ann_pending, bo_cash, bo_april = payments
+
+    assert ledger_ids(http, admin_headers, "?status=Failed,Pending") == [ann_pending, ann_failed]
+    assert ledger_ids(http, admin_headers, "?method=Cash") == [bo_cash]
+    assert ledger_ids(http, admin_headers, "?plan=Yearly") == [ann_pending, bo_cash]
+    # Both bounds are inclusive days
+    assert ledger_ids(http, admin_headers, "?start=2025-03-01&end=2025-03-31") == \
+        [ann_pending, bo_cash, ann_failed, ann_ok]
+    assert ledger_ids(http, admin_headers, "?start=2025-03-15&end=2025-04-01") == [bo_april, ann_pending, bo_cash]
+
+
+def test_ledger_filters_combine(app, http, admin_headers, payments):
+    ann_ok, _, _, _, bo_april = payments
+    with app.app_context():
+        bo = Client.query.filter_by(email="bo@example.com").one().id
+
+    assert ledger_ids(http, admin_headers, "?status=Success&method=M-PESA&end=2025-12-31") == [bo_april, ann_ok]
+    assert ledger_ids(http, admin_headers, f"?client_id={bo}&plan=Monthly") == [bo_april]
+
+
+def test_ledger_cursor_keeps_the_filters(http, admin_headers, payments):
+    ann_ok, ann_failed, ann_pending, bo_cash, _ = payments
+    query = "?start=2025-03-01&end=2025-03-31&limit=3"
+
+    first = ledger(http, admin_headers, query)
+    assert [p["id"] for p in first["payments"]] == [ann_pending, bo_cash, ann_failed]
+    second = ledger(http, admin_headers, f"{query}&cursor={first['next_cursor']}")
+    assert [p["id"] for p in second["payments"]] == [ann_ok]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.parametrize("query", ["?start=yesterday", "?end=2025-13-01", "?cursor=garbage"])
+def test_ledger_rejects_bad_dates_and_cursors(http, admin_headers, payments, query):
+    assert http.get(f"/payments{query}", headers=admin_headers).status_code == 400
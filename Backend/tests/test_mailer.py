@@ -0,0 +1,129 @@
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from mailer import MailDispatcher
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+from aiosmtpd.smtp import AuthResult  # noqa: E402
+
+MESSAGES = 500
+
+
+class Recorder:
+    """aiosmtpd handler that notes when each message arrived and over which connection."""
+
+    def __init__(self):
+        self.received = {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.received[envelope.rcpt_tos[0]] = time.perf_counter()
+            self.sessions.add(id(session))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    recorder = Recorder()
+    controller = aiosmtpd.Controller(
+        recorder, hostname="127.0.0.1", port=_free_port(),
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False
+    )
+    controller.start()
+    yield controller, recorder
+    controller.stop()
+
+
+def _dispatcher(port, workers=2):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_TLS=False,
+        MAIL_USERNAME="fitflow@example.com", MAIL_PASSWORD="secret",
+        MAIL_WORKERS=workers, MAIL_QUEUE_SIZE=MESSAGES, MAIL_RETRY_BACKOFF=0.01
+    )
+    dispatcher = MailDispatcher()
+    dispatcher.init_app(app)
+    return dispatcher
+
+
+def test_throughput_and_p99_over_pooled_connections(smtp_server):
+    controller, recorder = smtp_server
+    dispatcher = _dispatcher(controller.port)
+
+    queued_at = {}
+    started = time.perf_counter()
+    for i in range(MESSAGES):
+        to = f"member{i}@example.com"
+        queued_at[to] = time.perf_counter()
+        assert dispatcher.enqueue(to, "Welcome", "Hello")
+    dispatcher.join()
+    elapsed = time.perf_counter() - started
+
+    assert len(recorder.received) == MESSAGES
+    # Each worker keeps one authenticated connection for the whole run
+    assert len(recorder.sessions) <= dispatcher.workers
+
+    latencies = sorted(recorder.received[to] - queued_at[to] for to in queued_at)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"\n{MESSAGES} messages in {elapsed:.2f}s ({MESSAGES / elapsed:.0f} msg/s), "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms")
+
+
+def test_enqueue_does_not_wait_for_smtp(smtp_server):
+    controller, _ = smtp_server
+    dispatcher = _dispatcher(controller.port)
+
+    started = time.perf_counter()
+    for i in range(50):
+        dispatcher.enqueue(f"member{i}@example.com", "Welcome", "Hello")
+    assert time.perf_counter() - started < 0.1
+    dispatcher.join()
+
+
+def test_unreachable_server_gives_up_after_retries(caplog):
+    dispatcher = _dispatcher(_free_port(), workers=1)
+    dispatcher.max_retries = 2
+    attempts = []
+    connect = dispatcher._connect
+    dispatcher._connect = lambda: attempts.append(time.perf_counter()) or connect()
+    delivered = []
+
+    assert dispatcher.enqueue("member@example.com", "Welcome", "Hello", on_sent=lambda: delivered.append(True))
+    joiner = threading.Thread(target=dispatcher.join, daemon=True)
+    joiner.start()
+    joiner.join(timeout=5)
+
+    assert not joiner.is_alive()
+    assert len(attempts) == dispatcher.max_retries + 1
+    # Exponential backoff between attempts
+    assert attempts[1] - attempts[0] >= dispatcher.retry_backoff
+    assert attempts[2] - attempts[1] >= dispatcher.retry_backoff * 2
+    assert delivered == []
+    assert any(r.message.startswith("Email failed") for r in caplog.records)
+
+
+def test_on_sent_runs_only_after_delivery(smtp_server):
+    controller, recorder = smtp_server
+    delivered = []
+    dispatcher = _dispatcher(controller.port)
+    dispatcher.enqueue("member@example.com", "Welcome", "Hello", on_sent=lambda: delivered.append(True))
+    dispatcher.join()
+    assert delivered == [True]
+
+    failing = _dispatcher(_free_port(), workers=1)
+    failing.max_retries = 0
+    failing.enqueue("member@example.com", "Welcome", "Hello", on_sent=lambda: delivered.append(False))
+    failing.join()
+    assert delivered == [True]
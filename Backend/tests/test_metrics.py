@@ -0,0 +1,106 @@
+import os
+import pstats
+import sys
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from metrics import CONTENT_TYPE, Metrics, metrics
+from models import db
+
+TOKEN = {"Authorization": "Bearer test-metrics-token"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "profiling", True)
+    monkeypatch.setattr(metrics, "profile_dir", str(tmp_path))
+    return tmp_path
+
+
+def test_metrics_wants_the_token(http):
+    assert http.get("/metrics").status_code == 401
+    assert http.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert http.get("/metrics", headers=TOKEN).status_code == 200
+
+
+def test_metrics_is_not_served_without_a_token():
+    bare = Flask("no-token")
+    bare.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(bare)
+    Metrics().init_app(bare, db)
+
+    assert "metrics" not in bare.view_functions
+    assert bare.test_client().get("/metrics").status_code == 404
+
+
+def test_render_is_prometheus_text(http, seed):
+    http.get("/subscriptions")
+    http.get("/subscriptions")
+
+    response = http.get("/metrics", headers=TOKEN)
+    assert response.content_type == CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert "# TYPE fitflow_request_duration_seconds histogram" in lines
+    assert "# TYPE fitflow_responses_total counter" in lines
+    labels = 'endpoint="subscriptions",method="GET"'
+    buckets = [line for line in lines if line.startswith(f"fitflow_request_duration_seconds_bucket{{{labels},")]
+    assert len(buckets) == len(metrics.latency["subscriptions", "GET"].buckets) + 1
+    assert buckets[-1] == f'fitflow_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2'
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert f"fitflow_request_duration_seconds_count{{{labels}}} 2" in lines
+    assert f'fitflow_responses_total{{{labels},status="200"}} 2' in lines
+
+
+def test_label_values_are_escaped():
+    metrics.callback_reconciliations['say "hi"\\\n'] += 1
+    assert 'fitflow_mpesa_callback_reconciliations_total{reason="say \\"hi\\"\\\\\\n"} 1' in metrics.render()
+
+
+def test_profile_header_writes_a_profile(http, seed, profiling):
+    assert "X-Profile-File" not in http.get("/subscriptions").headers
+
+    response = http.get("/subscriptions", headers={"X-Profile": "cprofile"})
+    name = response.headers["X-Profile-File"]
+    assert name.startswith("subscriptions-") and name.endswith(".prof")
+    assert pstats.Stats(str(profiling / name)).total_calls > 0
+
+
+def test_profiler_is_stopped_after_an_unhandled_exception(http, seed, profiling, monkeypatch):
+    def boom(self):
+        raise RuntimeError("boom")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module.Subscriptions, "get", boom)
+        with pytest.raises(RuntimeError):
+            http.get("/subscriptions", headers={"X-Profile": "cprofile"})
+
+    assert sys.getprofile() is None
+    assert len(os.listdir(profiling)) == 1
+    response = http.get("/subscriptions", headers={"X-Profile": "cprofile"})
+    assert response.status_code == 200
+    assert "X-Profile-File" in response.headers
+
+
+def test_failed_statements_do_not_leak_start_times(app):
+    with app.app_context():
+        connection = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                with connection.begin_nested():
+                    connection.execute(text("INSERT INTO clients (id) VALUES (NULL)"))
+        connection.execute(text("SELECT 1"))
+        assert connection.info.get("query_started") == {}
+        db.session.rollback()
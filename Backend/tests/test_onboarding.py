@@ -0,0 +1,61 @@
+import json
+import queue
+import threading
+
+import pytest
+
+from mailer import mailer
+from models import Client
+
+
+@pytest.fixture
+def full_mail_queue(monkeypatch):
+    """A configured mailer whose queue has room for one message and no worker draining it."""
+    monkeypatch.setattr(mailer, "username", "fitflow@example.com")
+    monkeypatch.setattr(mailer, "password", "secret")
+    monkeypatch.setattr(mailer, "_queue", queue.Queue(maxsize=1))
+    monkeypatch.setattr(mailer, "_ensure_started", lambda: None)
+    return mailer._queue
+
+
+def test_http_import_does_not_wait_for_the_mail_queue(app, http, admin_headers, full_mail_queue):
+    body = "\n".join(json.dumps({"first_name": "New", "last_name": str(i), "email": f"new{i}@example.com",
+                                 "phone": f"07110000{i:02d}"}) for i in range(3))
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(http.post(
+        "/clients/bulk", data=body, headers={**admin_headers, "Content-Type": "application/x-ndjson"})), daemon=True)
+    request.start()
+    request.join(timeout=10)
+    assert not request.is_alive(), "the import blocked on the full mail queue"
+
+    data = responses[0].get_json()
+    assert data["created"] == 3
+    assert data["welcome_not_queued"] == 2
+    assert [r["welcome_queued"] for r in data["results"]] == [True, False, False]
+    with app.app_context():
+        assert Client.query.filter(Client.email.like("new%")).count() == 3
+
+
+def test_malformed_rows_are_reported_and_the_rest_imported(app, http, admin_headers):
+    rows = [
+        {"first_name": "Good", "last_name": "One", "email": "good1@example.com", "phone": "0711000001"},
+        {"first_name": {"a": 1}, "last_name": "Obj", "email": "obj@example.com", "phone": "0711000002"},
+        {"first_name": "Num", "last_name": 7, "email": "num@example.com", "phone": "0711000003"},
+        {"first_name": "Long", "last_name": "x" * 151, "email": "long@example.com", "phone": "0711000004"},
+        {"first_name": "Status", "last_name": "List", "email": "st@example.com", "phone": "0711000005",
+         "status": ["Active"]},
+        {"first_name": "Plan", "last_name": "Obj", "email": "plan@example.com", "phone": "0711000006",
+         "subscription": {"name": "Monthly"}},
+        {"first_name": "Good", "last_name": "Two", "email": "good2@example.com", "phone": "0711000007"},
+    ]
+    response = http.post("/clients/bulk?welcome=false", json=rows, headers=admin_headers)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [r["status"] for r in data["results"]] == ["created"] + ["error"] * 5 + ["created"]
+    assert [r.get("error") for r in data["results"][1:6]] == [
+        "first_name must be text", "last_name must be text", "last_name must be at most 150 characters",
+        "status must be text", "subscription must be text",
+    ]
+    with app.app_context():
+        assert Client.query.filter(Client.email.like("good%")).count() == 2
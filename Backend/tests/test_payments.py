@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from models import Payment
+
+ATTEMPT = {"plan_name": "Monthly", "phone_number": "0712345678"}
+
+
+@pytest.fixture
+def pushes(monkeypatch):
+    """Records STK pushes instead of sending them."""
+    sent = []
+    monkeypatch.setattr(app_module.stk_push, "submit", lambda payment_id, phone, amount: sent.append(payment_id))
+    app_module.mpesa_breaker.record_success()
+    return sent
+
+
+def _start(http, headers, key, **body):
+    return http.post("/start/payment", json={**ATTEMPT, **body}, headers={**headers, "Idempotency-Key": key})
+
+
+def test_retries_with_the_same_key_reuse_the_payment(http, client_headers, pushes):
+    first = _start(http, client_headers, "attempt-1")
+    again = _start(http, client_headers, "attempt-1")
+
+    assert first.status_code == again.status_code == 202
+    assert again.get_json()["payment_id"] == first.get_json()["payment_id"]
+    assert pushes == [first.get_json()["payment_id"]]
+
+    other = _start(http, client_headers, "attempt-2")
+    assert other.get_json()["payment_id"] != first.get_json()["payment_id"]
+    assert len(pushes) == 2
+
+
+def test_concurrent_double_clicks_push_once(app, client_headers, pushes):
+    clicks = 8
+    barrier = threading.Barrier(clicks)
+    responses = []
+
+    def click():
+        http = app.test_client()
+        barrier.wait()
+        responses.append(_start(http, client_headers, "double-click"))
+
+    threads = [threading.Thread(target=click) for _ in range(clicks)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [r.status_code for r in responses] == [202] * clicks
+    assert len({r.get_json()["payment_id"] for r in responses}) == 1
+    assert len(pushes) == 1
+    with app.app_context():
+        assert Payment.query.filter_by(idempotency_key="double-click").count() == 1
+
+
+def test_idempotency_key_is_required_and_bound_to_the_attempt(http, client_headers, pushes):
+    missing = http.post("/start/payment", json=ATTEMPT, headers=client_headers)
+    assert missing.status_code == 400
+
+    assert _start(http, client_headers, "attempt-1").status_code == 202
+    reused = _start(http, client_headers, "attempt-1", phone_number="0799999999")
+    assert reused.status_code == 422
+    assert len(pushes) == 1
+
+
+def test_integrity_error_without_a_winning_payment_is_a_conflict(http, client_headers, pushes, monkeypatch):
+    def conflict(payment):
+        raise IntegrityError("INSERT INTO payments", {}, Exception("UNIQUE constraint failed"))
+
+    monkeypatch.setattr(app_module.rollups, "record_payment", conflict)
+    response = _start(http, client_headers, "attempt-1")
+
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "Could not create payment"}
+    assert pushes == []
+
+
+def test_status_answers_immediately(http, client_headers, pushes):
+    payment_id = _start(http, client_headers, "attempt-1").get_json()["payment_id"]
+
+    started = time.perf_counter()
+    pending = http.get(f"/payments/{payment_id}/status?wait=20", headers=client_headers)
+    assert time.perf_counter() - started < 0.5
+    assert pending.get_json()["status"] == "Pending"
+    assert pending.headers["Retry-After"] == str(app_module.STATUS_POLL_INTERVAL)
+
+    assert http.get("/payments/999999/status", headers=client_headers).status_code == 404
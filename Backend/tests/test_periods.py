@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import pytest
+
+from periods import period_range
+
+
+def test_month_and_year_ranges_are_half_open():
+    assert period_range(2025, 12) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+    assert period_range(2025) == (datetime(2025, 1, 1), datetime(2026, 1, 1))
+
+
+@pytest.mark.parametrize("year, month", [(0, None), (9999, None), (2025, 13), (2025, 0)])
+def test_out_of_range_period_is_rejected(year, month):
+    with pytest.raises(ValueError):
+        period_range(year, month)
+
+
+@pytest.mark.parametrize("path", ["/expenses", "/expenses/summary"])
+@pytest.mark.parametrize("query", ["year=9999", "year=0", "year=2025&month=13"])
+def test_expense_endpoints_answer_400_for_bad_periods(http, admin_headers, path, query):
+    response = http.get(f"{path}?{query}", headers=admin_headers)
+    assert response.status_code == 400
+    assert "between" in response.get_json()["error"]
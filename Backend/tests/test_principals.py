@@ -0,0 +1,94 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+
+from auth import hash_password
+from models import db, Client
+from principals import principal_cache
+
+
+@pytest.fixture
+def invalidations(app, monkeypatch):
+    """Records, for each invalidate(), the email the database held at that moment."""
+    seen = []
+    invalidate = principal_cache.invalidate
+
+    def spy(role, email):
+        # A separate connection only sees committed data
+        with app.app_context(), db.engine.connect() as conn:
+            emails = conn.execute(text(f"SELECT email FROM {role}s")).scalars().all()
+        seen.append((email, emails))
+        invalidate(role, email)
+
+    monkeypatch.setattr(principal_cache, "invalidate", spy)
+    return seen
+
+
+def test_cache_is_invalidated_after_the_email_change_commits(http, admin_headers, client_headers, seed, invalidations):
+    assert http.get("/client/payments", headers=client_headers).status_code == 200
+
+    response = http.patch(f"/clients/{seed['client_id']}", json={"email": "ann.new@example.com"}, headers=admin_headers)
+    assert response.status_code == 200
+
+    assert invalidations == [("ann@example.com", ["ann.new@example.com"])]
+    # The old token names an email the account no longer has
+    assert http.get("/client/payments", headers=client_headers).status_code == 404
+
+
+def test_deleted_client_is_locked_out(app, http, admin_headers, invalidations):
+    with app.app_context():
+        member = Client(first_name="Bob", last_name="Member", email="bob@example.com", phone="0712000000",
+                        password_hash=hash_password("pw"), status="Active")
+        db.session.add(member)
+        db.session.commit()
+        member_id = member.id
+    token = http.post("/client/login", json={"email": "bob@example.com", "password": "pw"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert http.get("/client/payments", headers=headers).status_code == 200
+
+    assert http.delete(f"/clients/{member_id}", headers=admin_headers).status_code == 200
+
+    assert invalidations == [("bob@example.com", ["ann@example.com"])]
+    assert http.get("/client/payments", headers=headers).status_code == 404
+
+
+def test_principal_is_built_from_the_uid_claim(app, http, seed):
+    with app.app_context():
+        good = create_access_token(identity="ann@example.com", additional_claims={"role": "client", "uid": seed["client_id"]})
+        forged = create_access_token(identity="ann@example.com", additional_claims={"role": "client", "uid": 999})
+
+    assert http.get("/client/payments", headers={"Authorization": f"Bearer {forged}"}).status_code == 404
+    assert http.get("/client/payments", headers={"Authorization": f"Bearer {good}"}).status_code == 200
+    assert principal_cache.get("client", "ann@example.com").id == seed["client_id"]
+
+
+def test_cached_principal_is_not_lent_to_another_uid(app, http, client_headers, seed):
+    # A valid token warms the cache first
+    assert http.get("/client/payments", headers=client_headers).status_code == 200
+    with app.app_context():
+        forged = create_access_token(identity="ann@example.com", additional_claims={"role": "client", "uid": 999})
+
+    assert http.get("/client/payments", headers={"Authorization": f"Bearer {forged}"}).status_code == 404
+    assert http.get("/client/payments", headers=client_headers).status_code == 200
+
+
+def test_token_of_a_deleted_client_does_not_reach_the_new_owner_of_its_email(app, http, admin_headers, seed):
+    with app.app_context():
+        member = Client(first_name="Bob", last_name="Member", email="bob@example.com", phone="0712000000",
+                        password_hash=hash_password("pw"), status="Active")
+        # A later row, so SQLite does not hand the deleted id out again
+        db.session.add_all([member, Client(first_name="Cy", last_name="Member", email="cy@example.com",
+                                           phone="0712000002", password_hash="x", status="Active")])
+        db.session.commit()
+        member_id = member.id
+    stale = http.post("/client/login", json={"email": "bob@example.com", "password": "pw"}).get_json()["access_token"]
+    assert http.delete(f"/clients/{member_id}", headers=admin_headers).status_code == 200
+
+    with app.app_context():
+        db.session.add(Client(first_name="Bob", last_name="Newcomer", email="bob@example.com", phone="0712000001",
+                              password_hash=hash_password("pw2"), status="Active"))
+        db.session.commit()
+    fresh = http.post("/client/login", json={"email": "bob@example.com", "password": "pw2"}).get_json()["access_token"]
+    assert http.get("/client/payments", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200
+
+    assert http.get("/client/payments", headers={"Authorization": f"Bearer {stale}"}).status_code == 404
@@ -0,0 +1,112 @@
+"""
+Query-plan regression test: runs each hot path, then EXPLAIN QUERY PLANs
+every SELECT it issued (same SQL, same parameters) and fails when one
+reads a whole table instead of using an index. The schema comes from
+db.create_all(); `flask db check` keeps the models and migrations in step.
+"""
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from models import db
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@contextmanager
+def recorded_selects(app):
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+
+
+def full_scans(app, statements):
+    scans = []
+    with app.app_context(), db.engine.connect() as conn:
+        for statement, parameters in statements:
+            for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+                match = FULL_SCAN.match(row[3])
+                if match:
+                    scans.append((match.group(1), " ".join(statement.split())[:160]))
+    return scans
+
+
+def _login_admin(http, admin_headers, client_headers):
+    http.post("/admin/login", json={"email": "admin@example.com", "password": "pw"})
+
+
+def _login_client(http, admin_headers, client_headers):
+    http.post("/client/login", json={"email": "ann@example.com", "password": "pw"})
+
+
+def _clients_page(http, admin_headers, client_headers):
+    http.get("/clients?limit=20", headers=admin_headers)
+    http.get("/clients?status=active&limit=20", headers=admin_headers)
+
+
+def _client_search(http, admin_headers, client_headers):
+    http.get("/clients?search=ann", headers=admin_headers)
+    http.get("/clients?search=0712", headers=admin_headers)
+
+
+def _payment_history(http, admin_headers, client_headers):
+    http.get("/client/payments", headers=client_headers)
+
+
+def _payments_ledger(http, admin_headers, client_headers):
+    http.get("/payments?status=success", headers=admin_headers)
+    http.get("/payments?start=2025-01-01&end=2025-01-31", headers=admin_headers)
+
+
+def _expenses(http, admin_headers, client_headers):
+    http.get("/expenses?year=2025&month=1", headers=admin_headers)
+    http.get("/expenses/summary?group=category&year=2025", headers=admin_headers)
+
+
+def _dashboards(http, admin_headers, client_headers):
+    http.get("/dashboard", headers=admin_headers)
+    http.get("/dashboard/client", headers=client_headers)
+
+
+def _jobs(http, admin_headers, client_headers):
+    app_module.check_expired_subscriptions()
+    app_module.send_monthly_report()
+
+
+# (hot path, tables it may read whole because it wants every row)
+HOT_PATHS = [
+    (_login_admin, ()),
+    (_login_client, ()),
+    (_clients_page, ()),
+    (_client_search, ()),
+    (_payment_history, ()),
+    (_payments_ledger, ()),
+    (_expenses, ()),
+    # Per-plan breakdown lists every plan
+    (_dashboards, ("subscriptions",)),
+    # The monthly report goes to every admin
+    (_jobs, ("admins",)),
+]
+
+
+@pytest.mark.parametrize("run, whole_tables", HOT_PATHS, ids=[fn.__name__.strip("_") for fn, _ in HOT_PATHS])
+def test_hot_queries_use_indexes(app, http, admin_headers, client_headers, run, whole_tables):
+    with recorded_selects(app) as statements:
+        run(http, admin_headers, client_headers)
+
+    assert statements
+    scans = [(table, sql) for table, sql in full_scans(app, statements) if table not in whole_tables]
+    assert not scans, "full table scans:\n" + "\n".join(f"{t}: {sql}" for t, sql in scans)
@@ -0,0 +1,85 @@
+"""
+Binds "replica" to a second SQLite file for the duration of a test. The
+two databases are never synced, so which one answered a request shows in
+the data: the replica holds a client the primary does not.
+"""
+import os
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import db, Client
+from replicas import REPLICA_BIND, replica
+
+
+@pytest.fixture
+def replica_db(app, monkeypatch):
+    path = os.path.join(tempfile.mkdtemp(prefix="fitflow-replica-"), "replica.db")
+    url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Client(first_name="Rita", last_name="Replica", email="rita@example.com", phone="0799999999",
+                           password_hash="x", status="Active"))
+        session.commit()
+
+    monkeypatch.setitem(app.config, "SQLALCHEMY_BINDS", {REPLICA_BIND: url})
+    with app.app_context():
+        engines = db.engines
+    engines[REPLICA_BIND] = engine
+    # Probe on every request, and start from a clean bill of health
+    monkeypatch.setattr(replica, "check_interval", 0)
+    monkeypatch.setattr(replica, "_checked_at", 0.0)
+    yield engine
+    engines.pop(REPLICA_BIND, None)
+    engine.dispose()
+
+
+def client_emails(http, admin_headers):
+    response = http.get("/clients", headers=admin_headers)
+    assert response.status_code == 200
+    return {c["email"] for c in response.get_json()["clients"]}
+
+
+def test_replica_reads_are_served_by_the_replica(http, admin_headers, replica_db):
+    assert client_emails(http, admin_headers) == {"rita@example.com"}
+
+
+def test_without_a_replica_reads_use_the_primary(http, admin_headers):
+    assert client_emails(http, admin_headers) == {"ann@example.com"}
+
+
+def test_a_write_sends_the_writers_next_reads_to_the_primary(http, admin_headers, replica_db, monkeypatch):
+    monkeypatch.setattr(replica, "sticky_seconds", 60)
+    response = http.post("/addExpense", json={"expense": "Rent", "cost": 500}, headers=admin_headers)
+    assert response.status_code == 201
+
+    assert client_emails(http, admin_headers) == {"ann@example.com"}
+
+
+def test_the_sticky_mark_expires(http, admin_headers, replica_db, monkeypatch):
+    monkeypatch.setattr(replica, "sticky_seconds", 0.01)
+    http.post("/addExpense", json={"expense": "Rent", "cost": 500}, headers=admin_headers)
+
+    time.sleep(0.05)
+    assert client_emails(http, admin_headers) == {"rita@example.com"}
+
+
+def test_a_lagging_replica_falls_back_to_the_primary(http, admin_headers, replica_db, monkeypatch):
+    monkeypatch.setattr(replica, "lag", lambda: replica.max_lag + 1)
+    assert client_emails(http, admin_headers) == {"ann@example.com"}
+
+    monkeypatch.setattr(replica, "lag", lambda: replica.max_lag / 2)
+    assert client_emails(http, admin_headers) == {"rita@example.com"}
+
+
+def test_an_unreachable_replica_falls_back_to_the_primary(http, admin_headers, replica_db, monkeypatch):
+    def down():
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(replica, "lag", down)
+    assert client_emails(http, admin_headers) == {"ann@example.com"}
@@ -0,0 +1,36 @@
+import rollups
+from models import MonthlyRollup
+
+
+def plan_row(http, admin_headers, plan_id):
+    stats = http.get("/dashboard", headers=admin_headers).get_json()
+    return next(s for s in stats["subscriptions"] if s["id"] == plan_id)
+
+
+def test_dashboard_counts_members_and_payments_per_plan_separately(app, http, admin_headers, seed):
+    for _ in range(2):
+        response = http.post("/markCashPayment", headers=admin_headers, json={
+            "phone": "0712345678", "subscription": "Monthly", "payment_status": "success"})
+        assert response.status_code == 200
+
+    # One member who paid twice this month
+    row = plan_row(http, admin_headers, seed["plan_id"])
+    assert row["clients"] == 1
+    assert row["payments_this_month"] == 2
+
+
+def plan_cells(app):
+    with app.app_context():
+        rows = MonthlyRollup.query.filter_by(metric=rollups.PLAN_PAYMENTS)
+        return {(r.year, r.month, r.dimension): r.value for r in rows}
+
+
+def test_rebuild_matches_the_incremental_plan_cells(app, http, admin_headers, seed):
+    http.post("/markCashPayment", headers=admin_headers, json={
+        "phone": "0712345678", "subscription": "Monthly", "payment_status": "success"})
+    before = plan_cells(app)
+
+    with app.app_context():
+        rollups.rebuild()
+
+    assert before and plan_cells(app) == before
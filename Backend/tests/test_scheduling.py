@@ -0,0 +1,134 @@
+"""
+Two JobSchedulers, each on its own Flask app and engine against the test
+database, stand in for two `run-scheduler` processes. The tests drive
+_heartbeat() by hand rather than run() so lease timing is deterministic.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+from flask import Flask
+from sqlalchemy import MetaData
+
+from models import db, JobRun, SchedulerLock
+from scheduling import JobScheduler, job_scheduler
+
+LEASE_TTL = 0.3
+
+
+def make_node(app, owner):
+    node = Flask(f"scheduler-{owner}")
+    node.config.update(
+        SQLALCHEMY_DATABASE_URI=app.config["SQLALCHEMY_DATABASE_URI"],
+        SCHEDULER_LEASE_TTL=LEASE_TTL,
+        SCHEDULER_HISTORY_DAYS=30,
+        # Each process builds one store on db.metadata; two in one process need their own
+        SCHEDULER_JOBSTORES={"default": SQLAlchemyJobStore(url=app.config["SQLALCHEMY_DATABASE_URI"],
+                                                           metadata=MetaData())},
+    )
+    db.init_app(node)
+    scheduler = JobScheduler()
+    scheduler.owner = owner
+    scheduler.init_app(node)
+    # The same job definitions every process registers on import
+    scheduler._jobs = dict(job_scheduler._jobs)
+    scheduler.scheduler.scheduler.start(paused=True)
+    return scheduler
+
+
+@pytest.fixture
+def nodes(app):
+    started = [make_node(app, "host-a:1"), make_node(app, "host-b:2")]
+    yield started
+    for node in started:
+        node.scheduler.shutdown(wait=False)
+        with node.app.app_context():
+            db.engine.dispose()
+
+
+def lease_owner(app):
+    with app.app_context():
+        lock = db.session.get(SchedulerLock, JobScheduler.LOCK_NAME)
+        return lock.owner if lock else None
+
+
+def test_only_one_node_leads(app, nodes):
+    a, b = nodes
+    a._heartbeat()
+    b._heartbeat()
+
+    assert (a.is_leader, b.is_leader) == (True, False)
+    assert a.scheduler.state == STATE_RUNNING
+    assert b.scheduler.state == STATE_PAUSED
+    assert lease_owner(app) == "host-a:1"
+
+    # Renewing keeps the lease where it is
+    a._heartbeat()
+    b._heartbeat()
+    assert (a.is_leader, b.is_leader) == (True, False)
+
+
+def test_standby_takes_over_an_expired_lease_and_the_old_leader_pauses(app, nodes):
+    a, b = nodes
+    a._heartbeat()
+    b._heartbeat()
+
+    # The leader stops renewing (hung, partitioned) until its lease runs out
+    time.sleep(LEASE_TTL + 0.1)
+    b._heartbeat()
+    assert b.is_leader and b.scheduler.state == STATE_RUNNING
+    assert lease_owner(app) == "host-b:2"
+
+    a._heartbeat()
+    assert not a.is_leader
+    assert a.scheduler.state == STATE_PAUSED
+
+
+def test_next_run_time_survives_a_failover(app, nodes):
+    a, b = nodes
+    a._heartbeat()
+    assert {job.id for job in a.scheduler.get_jobs()} == set(job_scheduler._jobs)
+
+    # Pick a time no freshly added job would get
+    planned = a.scheduler.get_job("apply_mpesa_callbacks").next_run_time + timedelta(days=2, seconds=7)
+    a.scheduler.modify_job("apply_mpesa_callbacks", next_run_time=planned)
+
+    time.sleep(LEASE_TTL + 0.1)
+    b._heartbeat()
+    assert b.is_leader
+    assert b.scheduler.get_job("apply_mpesa_callbacks").next_run_time == planned
+
+
+def test_release_frees_the_lease(app, nodes):
+    a, b = nodes
+    a._heartbeat()
+    a._release()
+
+    b._heartbeat()
+    assert b.is_leader
+
+
+def test_runs_are_recorded_and_old_ones_pruned(app, nodes):
+    a, _ = nodes
+    with app.app_context():
+        db.session.add(JobRun(job_id="probe", owner="host-a:1", started_at=datetime.utcnow() - timedelta(days=31),
+                              duration_ms=1, status="success"))
+        db.session.add(JobRun(job_id="other", owner="host-a:1", started_at=datetime.utcnow() - timedelta(days=31),
+                              duration_ms=1, status="success"))
+        db.session.commit()
+
+    def boom():
+        raise RuntimeError("boom")
+
+    a._track("probe", lambda: None)()
+    with pytest.raises(RuntimeError):
+        a._track("probe", boom)()
+
+    with app.app_context():
+        runs = JobRun.query.filter_by(job_id="probe").order_by(JobRun.id).all()
+        assert [(r.status, r.owner) for r in runs] == [("success", "host-a:1"), ("failed", "host-a:1")]
+        assert "boom" in runs[1].error
+        # Only the job that ran prunes its own history
+        assert JobRun.query.filter_by(job_id="other").count() == 1
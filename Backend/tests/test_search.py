@@ -0,0 +1,86 @@
+from urllib.parse import quote
+
+import pytest
+
+from models import db, Client
+
+PEOPLE = [
+    # first, last, email, phone
+    ("Joe", "Otieno", "kimberly.joe@example.com", "0722000001"),
+    ("Kim", "Kimani", "kim@example.com", "0722000002"),
+    ("Alice", "Wanjiru", "alice@example.com", "0712999999"),
+    ("Alicia", "Achieng", "alicia@example.com", "0733000003"),
+    ("Alex", "Mwangi", "alex@example.com", "0712000000"),
+]
+
+
+@pytest.fixture
+def people(app, seed):
+    with app.app_context():
+        db.session.add_all(
+            Client(first_name=first, last_name=last, email=email, phone=phone, password_hash="x", status="Active")
+            for first, last, email, phone in PEOPLE
+        )
+        db.session.commit()
+
+
+def search(http, headers, term):
+    response = http.get(f"/clients?search={quote(term)}&fields=first_name,phone", headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()["clients"]
+
+
+def names(http, headers, term):
+    return [c["first_name"] for c in search(http, headers, term)]
+
+
+@pytest.mark.parametrize("term", ["0712", "254712", "+254712"])
+def test_digits_are_a_phone_prefix_in_number_order(http, admin_headers, people, term):
+    assert search(http, admin_headers, term) == [
+        {"first_name": "Alex", "phone": "0712000000"},
+        {"first_name": "Ann", "phone": "0712345678"},
+        {"first_name": "Alice", "phone": "0712999999"},
+    ]
+
+
+def test_an_unknown_phone_prefix_matches_nobody(http, admin_headers, people):
+    assert names(http, admin_headers, "0799") == []
+
+
+def test_words_match_as_prefixes_of_any_column(http, admin_headers, people):
+    assert sorted(names(http, admin_headers, "ali")) == ["Alice", "Alicia"]
+    assert names(http, admin_headers, "wanj") == ["Alice"]
+    assert names(http, admin_headers, "ALEX@") == ["Alex"]
+
+
+def test_every_word_has_to_match(http, admin_headers, people):
+    assert names(http, admin_headers, "ali wanj") == ["Alice"]
+    assert names(http, admin_headers, "ali nobody") == []
+
+
+def test_matches_in_more_columns_rank_first(http, admin_headers, people):
+    # Kim matches on first name, last name and email; Joe only on email
+    assert names(http, admin_headers, "kim") == ["Kim", "Joe"]
+
+
+def test_search_syntax_in_the_term_is_not_interpreted(http, admin_headers, people):
+    assert names(http, admin_headers, 'ali" OR "joe') == []
+    assert names(http, admin_headers, "-*()") == []
+
+
+def test_index_follows_updates_and_deletes(app, http, admin_headers, people):
+    with app.app_context():
+        alex = Client.query.filter_by(first_name="Alex").one()
+        alex.first_name = "Zed"
+        db.session.delete(Client.query.filter_by(first_name="Kim").one())
+        db.session.commit()
+
+    assert names(http, admin_headers, "alex") == ["Zed"]
+    assert names(http, admin_headers, "zed") == ["Zed"]
+    assert names(http, admin_headers, "kim") == ["Joe"]
+
+
+def test_limit_caps_the_ranked_matches(http, admin_headers, people):
+    response = http.get("/clients?search=ali&limit=1", headers=admin_headers).get_json()
+    assert len(response["clients"]) == 1
+    assert response["next_cursor"] is None
@@ -0,0 +1,39 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from serializers import Schema, UnknownField
+
+
+@pytest.fixture
+def schema():
+    return Schema("id", "name", "email", plan=lambda obj: obj.plan_name.upper(), max_compiled=4)
+
+
+ROW = SimpleNamespace(id=1, name="Ann", email="ann@example.com", plan_name="monthly")
+
+
+def test_dump_reads_plain_and_computed_fields(schema):
+    assert schema.dump(ROW) == {"id": 1, "name": "Ann", "email": "ann@example.com", "plan": "MONTHLY"}
+    assert schema.dump(ROW, ["email"]) == {"email": "ann@example.com"}
+    assert schema.dump(ROW, ["plan"]) == {"plan": "MONTHLY"}
+
+
+def test_permutations_and_duplicates_share_one_projection(schema):
+    for fields in itertools.permutations(["plan", "email", "id"]):
+        assert schema.dump(ROW, fields + ("id",)) == {"id": 1, "email": "ann@example.com", "plan": "MONTHLY"}
+
+    assert list(schema._compiled) == [("id", "email", "plan")]
+
+
+def test_compiled_projections_are_bounded(schema):
+    for fields in itertools.combinations(["id", "name", "email", "plan"], 2):
+        schema.compile(fields)
+
+    assert len(schema._compiled) == schema.max_compiled
+
+
+def test_unknown_fields_are_rejected(schema):
+    with pytest.raises(UnknownField, match="__class__"):
+        schema.compile(["id", "__class__"])
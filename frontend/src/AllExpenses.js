@@ -12,8 +12,13 @@ function ExpenseList() {
     year: new Date().getFullYear()
   });
   const [total, setTotal] = useState(0);
+  const [count, setCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [summary, setSummary] = useState(null);
   const navigate = useNavigate();
 
+  const PAGE_SIZE = 50;
+
 useEffect(() => {
   const fetchExpenses = async () => {
     setLoading(true);
@@ -23,15 +28,27 @@ useEffect(() => {
       if (filters.month) params.month = filters.month;
       if (filters.year) params.year = filters.year;
 
-      const res = await axios.get("http://localhost:5000/expenses", {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-        params
-      });
+      // First page of rows plus server-side totals for the chart
+      const [res, summaryRes] = await Promise.all([
+        axios.get("http://localhost:5000/expenses", {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+          params: { ...params, limit: PAGE_SIZE }
+        }),
+        axios.get("http://localhost:5000/expenses/summary", {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+          params
+        })
+      ]);
 
       setExpenses(res.data.expenses);
       setTotal(res.data.total);
+      setCount(res.data.count);
+      setNextCursor(res.data.next_cursor);
+      setSummary(summaryRes.data);
       setMessage("");
     } catch (err) {
       if (err.response?.status === 401) {
@@ -41,6 +58,9 @@ useEffect(() => {
       }
       setExpenses([]);
       setTotal(0);
+      setCount(0);
+      setNextCursor(null);
+      setSummary(null);
     } finally {
       setLoading(false);
     }
@@ -50,6 +70,35 @@ useEffect(() => {
 }, [filters.month, filters.year]);
 
 
+  const loadMore = async () => {
+    try {
+      const token = localStorage.getItem("token");
+      const params = { limit: PAGE_SIZE, cursor: nextCursor };
+      if (filters.month) params.month = filters.month;
+      if (filters.year) params.year = filters.year;
+
+      const res = await axios.get("http://localhost:5000/expenses", {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+        params
+      });
+
+      setExpenses(prev => [...prev, ...res.data.expenses]);
+      setNextCursor(res.data.next_cursor);
+    } catch (err) {
+      setMessage(err.response?.data?.error || "Failed to fetch expenses");
+    }
+  };
+
+  // Monthly bars for a year, weekly bars for a single month
+  const chartRows = summary
+    ? (filters.month
+        ? summary.by_week.map(w => ({ label: new Date(w.week_start).toLocaleDateString(), total: w.total }))
+        : summary.by_month.map(m => ({ label: m.name.slice(0, 3), total: m.total })))
+    : [];
+  const chartMax = Math.max(1, ...chartRows.map(r => r.total));
+
   const handleFilterChange = (e) => {
     const { name, value } = e.target;
     setFilters(prev => ({
@@ -118,12 +167,44 @@ useEffect(() => {
         <>
           <div className="summary">
             <p>Total Expenses: <strong>KES {total.toLocaleString()}</strong></p>
-            <p>Number of Expenses: <strong>{expenses.length}</strong></p>
+            <p>Number of Expenses: <strong>{count}</strong></p>
             {filters.month && (
               <p>Month: <strong>{months.find(m => m.value === filters.month)?.label} {filters.year}</strong></p>
             )}
           </div>
           
+          {chartRows.length > 0 && (
+            <div className="expense-chart">
+              {chartRows.map(row => (
+                <div key={row.label} className="expense-chart-bar" title={`KES ${row.total.toLocaleString()}`}>
+                  <div className="expense-chart-fill" style={{ height: `${(row.total / chartMax) * 100}%` }} />
+                  <span>{row.label}</span>
+                </div>
+              ))}
+            </div>
+          )}
+
+          {summary?.by_category?.length > 0 && (
+            <table className="expense-table">
+              <thead>
+                <tr>
+                  <th>Category</th>
+                  <th>Total (KES)</th>
+                  <th>Entries</th>
+                </tr>
+              </thead>
+              <tbody>
+                {summary.by_category.map(cat => (
+                  <tr key={cat.category}>
+                    <td>{cat.category}</td>
+                    <td>{cat.total.toLocaleString()}</td>
+                    <td>{cat.count}</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          )}
+
           <table className="expense-table">
             <thead>
               <tr>
@@ -148,6 +229,12 @@ useEffect(() => {
               )}
             </tbody>
           </table>
+
+          {nextCursor && (
+            <button className="btn btn-secondary" onClick={loadMore}>
+              Load more
+            </button>
+          )}
         </>
       )}
     </div>
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import "./Payment.css";
 import { useNavigate } from "react-router-dom";
@@ -11,6 +11,8 @@ const MpesaPayment = () => {
   const [message, setMessage] = useState("");
   const [email, setEmail] = useState("");
   const navigate = useNavigate();
+  // One key per payment attempt, so double-clicks and retries reuse the same STK push
+  const idempotencyKey = useRef(crypto.randomUUID());
   const Popup = ({ message, onClose }) => {
     if (!message) return null;
 
@@ -26,6 +28,13 @@ const MpesaPayment = () => {
 
   const token = localStorage.getItem("access_token");
 
+  // A different plan or phone number is a new payment attempt
+  useEffect(() => {
+    idempotencyKey.current = crypto.randomUUID();
+  }, [selectedPlan, phone]);
+
+  const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
   // Fetch available plans from backend
   useEffect(() => {
     const fetchPlans = async () => {
@@ -59,10 +68,36 @@ const MpesaPayment = () => {
           plan_name: selectedPlan,
           phone_number: phone,
         },
-        { headers: { Authorization: `Bearer ${token}` } }
+        {
+          headers: {
+            Authorization: `Bearer ${token}`,
+            "Idempotency-Key": idempotencyKey.current,
+          },
+        }
       );
 
       setMessage(res.data.message || "STK push sent. Check your phone.");
+
+      // Poll the payment on a backoff until M-PESA confirms or rejects it
+      const paymentId = res.data.payment_id;
+      const giveUpAt = Date.now() + 2 * 60 * 1000;
+      for (let delay = 1000; paymentId && Date.now() < giveUpAt; delay = Math.min(delay * 2, 10000)) {
+        await sleep(delay);
+        const status = await axios.get(
+          `http://localhost:5000/payments/${paymentId}/status`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        if (status.data.status === "Success") {
+          setMessage("Payment received. Your subscription has been updated.");
+          idempotencyKey.current = crypto.randomUUID();
+          break;
+        }
+        if (status.data.status === "Failed") {
+          setMessage("Payment was not completed. Please try again.");
+          idempotencyKey.current = crypto.randomUUID();
+          break;
+        }
+      }
     } catch (err) {
       setMessage(err.response?.data?.error || "Failed to initiate payment.");
     } finally {
@@ -5,13 +5,16 @@ import { useNavigate } from "react-router-dom";
 function PaymentsList() {
   const [payments, setPayments] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
   const navigate = useNavigate();
-  
 
-  useEffect(() => {
+  // Newest payments first, 20 at a time; the server sends the next page's cursor in X-Next-Cursor
+  const fetchPage = (cursor) => {
     const token = localStorage.getItem("token");
+    const params = new URLSearchParams({ limit: 20 });
+    if (cursor) params.set("cursor", cursor);
 
-    fetch("http://127.0.0.1:5000/client/payments", {
+    return fetch(`http://127.0.0.1:5000/client/payments?${params}`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
@@ -22,16 +25,21 @@ function PaymentsList() {
         if (!res.ok) {
           throw new Error(`HTTP error! status: ${res.status}`);
         }
+        setNextCursor(res.headers.get("X-Next-Cursor"));
         return res.json();
       })
       .then((data) => {
-        setPayments(data);
+        setPayments((prev) => (cursor ? [...prev, ...data] : data));
         setLoading(false);
       })
       .catch((err) => {
         console.error("Error fetching payments:", err);
         setLoading(false);
       });
+  };
+
+  useEffect(() => {
+    fetchPage(null);
   }, []);
 
   if (loading) {
@@ -48,7 +56,7 @@ function PaymentsList() {
           <thead>
             <tr>
               <th>ID</th>
-              <th>Client</th>
+              <th>Plan</th>
               <th>Amount</th>
               <th>Date</th>
               <th>Status</th>
@@ -58,9 +66,9 @@ function PaymentsList() {
             {payments.map((p) => (
               <tr key={p.id}>
                 <td>{p.id}</td>
-                <td>{p.client_id}</td>
+                <td>{p.plan}</td>
                 <td>KES {p.amount}</td>
-                <td>{p.date}</td>
+                <td>{new Date(p.created_at).toLocaleDateString()}</td>
                 <td>
                   <span
                     className={`status ${
@@ -79,6 +87,13 @@ function PaymentsList() {
           </tbody>
         </table>
       )}
+      {nextCursor && (
+        <button type="button"
+          className="btn btn-secondary"
+          onClick={() => fetchPage(nextCursor)}>
+            Load more
+        </button>
+      )}
       <button type="button" 
         className="btn btn-secondary"
         onClick={() => navigate('/dashboard/client')}>